@@ -0,0 +1,352 @@
+"""
+Микробенчмарки функций db/crud.py на SQLite в памяти и файловой SQLite в WAL.
+
+Для каждого размера (--sizes, строк в scores) база заполняется заново:
+--scores-per-user оценок на пользователя по трём выбранным предметам, с
+пересчитанными score_rollups. Каждый вызов идёт в своей сессии, как в
+обработчике; результат - медиана, p95 и среднее на вызов. Пишущие случаи
+меняют данные по ходу прогона (add_score добавляет строки, переключение
+предмета туда-обратно), на фоне размера базы это не заметно.
+
+Результаты сохраняются в JSON (--output). Сравнение медиан с прошлым
+прогоном: --baseline old.json сразу после прогона или --compare old.json new.json
+без прогона; случай, медиана которого выросла больше чем на --threshold,
+считается регрессией, и процесс завершается с кодом 1.
+
+Запуск: python -m benchmarks.bench_crud [--backends memory,wal] [--sizes 1000,10000,100000]
+        [--cases add_score,get_scores_page] [--iterations 200] [--output results.json]
+        [--baseline old.json] [--threshold 0.15]
+        python -m benchmarks.bench_crud --compare old.json new.json [--threshold 0.15]
+Миллион строк: --sizes 1000000 (заполнение - около полуминуты на бэкенд).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable
+
+os.environ.setdefault("BOT_TOKEN", "bench:token")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+BACKENDS = ("memory", "wal")
+SUBJECTS_PER_USER = 3
+SEED_CHUNK = 20000
+SEED_STARTED_AT = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Dataset:
+    """What the seeded database contains, for picking arguments of each call."""
+
+    def __init__(self, rows: int, users: int, subjects: list, rng: random.Random):
+        self.rows = rows
+        self.users = users
+        self.subjects = subjects
+        self.rng = rng
+
+    def user_id(self) -> int:
+        return self.rng.randint(1, self.users)
+
+    def subject(self):
+        return self.rng.choice(self.subjects)
+
+    def user_subject(self, user_id: int):
+        """One of the subjects the user was seeded with."""
+        return self.subjects[(user_id + self.rng.randrange(SUBJECTS_PER_USER)) % len(self.subjects)]
+
+
+BenchCase = Callable[["AsyncSession", Dataset], Awaitable[object]]
+CASES: dict[str, BenchCase] = {}
+
+
+def bench_case(name: str):
+    def register(func: BenchCase) -> BenchCase:
+        CASES[name] = func
+        return func
+    return register
+
+
+@bench_case("upsert_user")
+async def _upsert_user(db, data: Dataset):
+    from db import crud
+    user_id = data.user_id()
+    return await crud.upsert_user(db, id=user_id, username=f"user{user_id}", first_name=f"User {user_id}", last_name=None)
+
+
+@bench_case("create_or_update_user")
+async def _create_or_update_user(db, data: Dataset):
+    from db import crud
+    user_id = data.user_id()
+    return await crud.create_or_update_user(db, id=user_id, username=f"user{user_id}", first_name=f"User {user_id}", last_name=None)
+
+
+@bench_case("add_score")
+async def _add_score(db, data: Dataset):
+    from db import crud
+    user_id = data.user_id()
+    subject = data.user_subject(user_id)
+    return await crud.add_score(db, user_id, subject.id, data.rng.randint(0, 100), subject_name=subject.name)
+
+
+@bench_case("add_scores_bulk")
+async def _add_scores_bulk(db, data: Dataset):
+    from db import crud
+    user_id = data.user_id()
+    scores = []
+    for _ in range(10):
+        subject = data.user_subject(user_id)
+        scores.append({"subject_id": subject.id, "subject_name": subject.name, "score": data.rng.randint(0, 100)})
+    return await crud.add_scores_bulk(db, user_id, scores)
+
+
+@bench_case("edit_existing_score")
+async def _edit_existing_score(db, data: Dataset):
+    from db import crud
+    return await crud.edit_existing_score(db, data.rng.randint(1, data.rows), data.rng.randint(0, 100))
+
+
+@bench_case("get_all_scores_for_user")
+async def _get_all_scores_for_user(db, data: Dataset):
+    from db import crud
+    return await crud.get_all_scores_for_user(db, id=data.user_id(), subject_id=None)
+
+
+@bench_case("get_scores_page")
+async def _get_scores_page(db, data: Dataset):
+    from db import crud
+    return await crud.get_scores_page(db, data.user_id())
+
+
+@bench_case("stream_scores")
+async def _stream_scores(db, data: Dataset):
+    from db import crud
+    return [partition async for partition in crud.stream_scores(db, user_id=data.user_id())]
+
+
+@bench_case("get_score_rollup")
+async def _get_score_rollup(db, data: Dataset):
+    from db import crud
+    user_id = data.user_id()
+    return await crud.get_score_rollup(db, user_id, data.user_subject(user_id).id)
+
+
+@bench_case("get_user_subject_summary")
+async def _get_user_subject_summary(db, data: Dataset):
+    from db import crud
+    return await crud.get_user_subject_summary(db, data.user_id())
+
+
+@bench_case("get_user_subjects")
+async def _get_user_subjects(db, data: Dataset):
+    from db import crud
+    return await crud.get_user_subjects(db, data.user_id())
+
+
+@bench_case("get_user_goals")
+async def _get_user_goals(db, data: Dataset):
+    from db import crud
+    return await crud.get_user_goals(db, data.user_id())
+
+
+@bench_case("switch_subject_for_user")
+async def _switch_subject_for_user(db, data: Dataset):
+    from db import crud
+    return await crud.switch_subject_for_user(db, data.user_id(), data.subject().id)
+
+
+@bench_case("set_desired_score")
+async def _set_desired_score(db, data: Dataset):
+    from db import crud
+    user_id = data.user_id()
+    return await crud.set_desired_score(db, user_id, data.user_subject(user_id).id, data.rng.randint(0, 100))
+
+
+def _create_engine(backend: str, workdir: str):
+    from sqlalchemy.pool import StaticPool
+    from db.engine_profiles import create_engine_for_profile, get_engine_profile
+    if backend == "memory":
+        # Одно соединение на все сессии: у каждого нового соединения была бы своя пустая база
+        return create_engine_for_profile("sqlite+aiosqlite://", get_engine_profile("default"), poolclass=StaticPool)
+    path = os.path.join(workdir, f"bench-{time.monotonic_ns()}.db")
+    return create_engine_for_profile(f"sqlite+aiosqlite:///{path}", get_engine_profile("sqlite-wal"))
+
+
+async def _seed(engine, sessionmaker, rows: int, scores_per_user: int, seed: int) -> Dataset:
+    from sqlalchemy import insert
+    from db import crud
+    from db.database import Base
+    from db.models import User, Scores, UserSubjectAssociation
+    from utils.subjects import subject_registry
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessionmaker() as db:
+        await crud.load_subject_registry(db)
+    subjects = list(subject_registry)
+
+    rng = random.Random(seed)
+    users = max(1, rows // scores_per_user)
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"id": user_id, "username": f"user{user_id}", "first_name": f"User {user_id}"}
+            for user_id in range(1, users + 1)
+        ])
+        await conn.execute(insert(UserSubjectAssociation), [
+            {"user_id": user_id, "subject_id": subjects[(user_id + offset) % len(subjects)].id}
+            for user_id in range(1, users + 1) for offset in range(SUBJECTS_PER_USER)
+        ])
+        for start in range(0, rows, SEED_CHUNK):
+            chunk = []
+            for index in range(start, min(rows, start + SEED_CHUNK)):
+                user_id = index % users + 1
+                subject = subjects[(user_id + index % SUBJECTS_PER_USER) % len(subjects)]
+                chunk.append({
+                    "user_id": user_id,
+                    "subject_id": subject.id,
+                    "subject_name": subject.name,
+                    "score": rng.randint(0, 100),
+                    "created_at": SEED_STARTED_AT + datetime.timedelta(seconds=index),
+                })
+            await conn.execute(insert(Scores), chunk)
+    async with sessionmaker() as db:
+        await crud.rebuild_score_rollups(db)
+    return Dataset(rows, users, subjects, random.Random(seed + 1))
+
+
+async def _measure(sessionmaker, case: BenchCase, data: Dataset, iterations: int, warmup: int) -> dict:
+    from db.exceptions import NotFoundError
+    timings = []
+    for i in range(warmup + iterations):
+        started = time.perf_counter()
+        async with sessionmaker() as db:
+            try:
+                await case(db, data)
+            except NotFoundError:
+                pass  # например, ScoreNotFoundError для пользователя без оценок - тоже полноценный вызов
+        if i >= warmup:
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "mean": statistics.fmean(timings),
+        "ops_per_second": iterations / sum(timings),
+    }
+
+
+async def _run_all(args, cases: dict[str, BenchCase], results: list[dict], workdir: str) -> None:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from db.crud import user_identity_cache
+
+    for backend in args.backends:
+        for rows in args.sizes:
+            engine = _create_engine(backend, workdir)
+            sessionmaker = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+            started = time.perf_counter()
+            data = await _seed(engine, sessionmaker, rows, args.scores_per_user, args.seed)
+            print(f"--- {backend}, {rows} score rows, {data.users} users (seeded in {time.perf_counter() - started:.1f} s)")
+            for name, case in cases.items():
+                user_identity_cache.clear()
+                result = await _measure(sessionmaker, case, data, args.iterations, args.warmup)
+                results.append({"backend": backend, "rows": rows, "case": name, **result})
+                print(f"{name:<28} median {result['median'] * 1e6:10.1f} us  p95 {result['p95'] * 1e6:10.1f} us  "
+                      f"{result['ops_per_second']:10.0f} ops/s")
+            await engine.dispose()
+
+
+async def run(args) -> dict:
+    cases = {name: CASES[name] for name in args.cases}
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench-crud-")
+    try:
+        await _run_all(args, cases, results, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "scores_per_user": args.scores_per_user,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Print a median-by-median comparison; return the keys that regressed past `threshold`."""
+    def key(result: dict) -> str:
+        return f"{result['backend']}/{result['rows']}/{result['case']}"
+
+    old = {key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"{'case':<48}{'old us':>11}{'new us':>11}{'change':>9}")
+    for result in current["results"]:
+        name = key(result)
+        if name not in old:
+            print(f"{name:<48}{'-':>11}{result['median'] * 1e6:11.1f}{'new':>9}")
+            continue
+        change = result["median"] / old[name]["median"] - 1
+        marker = "  REGRESSION" if change > threshold else ""
+        if marker:
+            regressions.append(name)
+        print(f"{name:<48}{old[name]['median'] * 1e6:11.1f}{result['median'] * 1e6:11.1f}{change:+9.1%}{marker}")
+    print(f"{len(regressions)} regressions past {threshold:.0%}")
+    return regressions
+
+
+def _load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def _csv(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=_csv, default=list(BACKENDS))
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in _csv(value)], default=[1000, 10000, 100000])
+    parser.add_argument("--cases", type=_csv, default=list(CASES))
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scores-per-user", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="compare this run with an earlier results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), default=None, help="compare two results files, no run")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed median slowdown, 0.15 = 15%%")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (_load(path) for path in args.compare)
+    else:
+        unknown = [name for name in args.backends if name not in BACKENDS] + [name for name in args.cases if name not in CASES]
+        if unknown:
+            parser.error(f"unknown backends or cases: {', '.join(unknown)}")
+        current = asyncio.run(run(args))
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(current, file, indent=2)
+        baseline = _load(args.baseline) if args.baseline else None
+
+    if baseline is not None and compare(baseline, current, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
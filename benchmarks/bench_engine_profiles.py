@@ -0,0 +1,74 @@
+"""
+Пропускная способность конкурентной записи (crud.add_score) для каждого профиля движка.
+
+Запуск: python -m benchmarks.bench_engine_profiles [--writers 16] [--writes 200]
+        [--postgres-url postgresql+asyncpg://...]
+Для SQLite каждый профиль получает свой свежий файл базы.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "bench:token")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+
+async def _run_profile(url: str, profile_name: str, writers: int, writes: int) -> None:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from db import crud
+    from db.database import Base
+    from db.engine_profiles import create_engine_for_profile, get_engine_profile
+    import db.models  # noqa: F401 - регистрирует таблицы в Base.metadata
+
+    engine = create_engine_for_profile(url, get_engine_profile(profile_name))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+
+    async with sessionmaker() as db:
+        await crud.create_subjects(db)
+        for writer in range(writers):
+            await crud.upsert_user(db, id=writer + 1, first_name=f"Writer {writer}")
+
+    errors = 0
+
+    async def writer_task(user_id: int) -> None:
+        nonlocal errors
+        for i in range(writes):
+            async with sessionmaker() as db:
+                try:
+                    await crud.add_score(db, user_id, "physics", i % 100, subject_name="Физика")
+                except Exception:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer_task(writer + 1) for writer in range(writers)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    total = writers * writes
+    print(f"{profile_name:<16} {total / elapsed:10.1f} writes/s  ({total} writes, {writers} writers, {errors} errors)")
+
+
+async def run(args: argparse.Namespace) -> None:
+    for profile_name in ("default", "sqlite-wal"):
+        url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+        await _run_profile(url, profile_name, args.writers, args.writes)
+    if args.postgres_url:
+        for profile_name in ("default", "postgres-pooled"):
+            await _run_profile(args.postgres_url, profile_name, args.writers, args.writes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--postgres-url", default=None)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
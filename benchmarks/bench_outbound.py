@@ -0,0 +1,55 @@
+"""
+Отправка пачки сообщений в несколько чатов напрямую и через OutboundQueue
+против локальной заглушки Bot API с лимитами Telegram.
+
+Запуск: python -m benchmarks.bench_outbound [--messages 300] [--chats 20]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+async def _send_all(bot, messages: int, chats: int) -> tuple[int, int]:
+    async def send(i: int):
+        return await bot.send_message(1000 + i % chats, f"message {i}")
+
+    results = await asyncio.gather(*(send(i) for i in range(messages)), return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    return messages - failed, failed
+
+
+async def run(messages: int, chats: int, port: int) -> None:
+    from telebot.async_telebot import AsyncTeleBot
+    from benchmarks.fake_bot_api import FakeBotApi, use_fake_api
+    from utils.outbound import OutboundQueue, RateLimitedBot
+
+    for name in ("direct", "outbound queue"):
+        api = FakeBotApi()
+        use_fake_api(await api.start(port=port))
+        bot = AsyncTeleBot("1:bench")
+        if name == "outbound queue":
+            bot = RateLimitedBot(bot, OutboundQueue())
+
+        started = time.perf_counter()
+        ok, failed = await _send_all(bot, messages, chats)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<16} sent {ok:5} failed {failed:5} 429s {api.rate_limited:5} in {elapsed:6.2f} s")
+        await bot.close_session()
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    os.environ.setdefault("BOT_TOKEN", "1:bench")
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    asyncio.run(run(args.messages, args.chats, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Сравнение старого (INSERT -> IntegrityError -> SELECT -> UPDATE) и нового
+(INSERT ... ON CONFLICT DO UPDATE) пути для crud.create_or_update_user.
+
+Запуск: python -m benchmarks.bench_user_upsert [--iterations 2000] [--database-url ...]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def _prepare_env(database_url: str | None) -> str:
+    if database_url is None:
+        database_url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("BOT_TOKEN", "bench:token")
+    return database_url
+
+
+async def _legacy_create_or_update_user(db, **user_data):
+    from db import crud
+    from db.exceptions import UserAlreadyExistsError
+    try:
+        return await crud.create_user(db, **user_data)
+    except UserAlreadyExistsError:
+        # crud не откатывает транзакцию сам: до отката сессия отвечает PendingRollbackError
+        await db.rollback()
+        return await crud.update_user(db, **user_data)
+
+
+async def _measure(name: str, func, iterations: int, users: int, rename: bool) -> None:
+    from db.database import AsyncSessionLocal
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        user_id = i % users + 1
+        first_name = f"User {user_id}" + (f" v{i}" if rename else "")
+        async with AsyncSessionLocal() as db:
+            await func(db, id=user_id, username=f"user{user_id}", first_name=first_name, last_name=None)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<32} {elapsed / iterations * 1e6:10.1f} us/update  ({iterations} updates)")
+
+
+async def run(iterations: int, users: int) -> None:
+    from db import crud
+    from db.database import init_models, engine
+
+    await init_models(needs_reset=True)
+    for rename in (False, True):
+        scenario = "changed profile" if rename else "unchanged profile"
+        print(f"--- {scenario}")
+        await _measure("legacy create_or_update_user", _legacy_create_or_update_user, iterations, users, rename)
+        await _measure("upsert_user", crud.upsert_user, iterations, users, rename)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    _prepare_env(args.database_url)
+    asyncio.run(run(args.iterations, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Локальная заглушка Bot API для прогонов без Telegram.
+
+Отвечает на методы отправки правдоподобными объектами Message и, как настоящий
+Telegram, возвращает 429 с retry_after при превышении глобального лимита и лимита на чат.
+getUpdates отдаёт обновления, добавленные push_update (long polling, offset как в
+Telegram), а wait_reply ждёт следующего сообщения бота в чат - на этом построен
+benchmarks.loadtest.
+
+Запуск отдельным процессом: python -m benchmarks.fake_bot_api [--port 8081]
+В коде: await FakeBotApi().start(port=8081); use_fake_api("http://127.0.0.1:8081")
+Для процессов бота: TELEGRAM_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from utils.outbound import TokenBucket
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake bot", "username": "fake_bot"}
+TRUE_METHODS = {
+    "deletemessage", "deletemessages", "setmycommands", "setwebhook", "deletewebhook",
+    "answercallbackquery", "sendchataction", "setchatmenubutton",
+}
+LIMITED_PREFIXES = ("send", "edit", "forward", "copy", "delete")
+
+
+def use_fake_api(base_url: str) -> None:
+    """Point telebot's asyncio helper at the fake server."""
+    from telebot import asyncio_helper
+    asyncio_helper.API_URL = base_url.rstrip("/") + "/bot{0}/{1}"
+    asyncio_helper.FILE_URL = base_url.rstrip("/") + "/file/bot{0}/{1}"
+
+
+class FakeBotApi:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3, latency: float = 0.0):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.rate_limited = 0
+        self.sent_by_chat: dict[str, list[str]] = {}
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates: list[dict] = []
+        self._updates_added = asyncio.Event()
+        self._reply_waiters: dict[str, asyncio.Future] = {}
+        self._runner: web.AppRunner | None = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+    def _rate_limited(self, chat_id: str | None) -> float | None:
+        now = time.monotonic()
+        buckets = [self._global_bucket]
+        if chat_id is not None:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            buckets.append(bucket)
+        delay = max(bucket.delay(now) for bucket in buckets)
+        if delay > 0:
+            return delay
+        for bucket in buckets:
+            bucket.take(now)
+        return None
+
+    def push_update(self, update: dict) -> int:
+        """Queue an update for getUpdates; update_id is assigned here, in push order."""
+        update_id = next(self._update_ids)
+        self._updates.append(dict(update, update_id=update_id))
+        self._updates_added.set()
+        return update_id
+
+    def wait_reply(self, chat_id: int | str) -> asyncio.Future:
+        """Future resolved with the next message the bot sends or edits in `chat_id`."""
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters[str(chat_id)] = future
+        return future
+
+    async def _get_updates(self, params) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        if offset < 0:
+            # Как в Telegram: -N - последние N обновлений, более ранние считаются подтверждёнными
+            del self._updates[:offset]
+        elif offset:
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), min(float(params.get("timeout") or 0), 1.0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _message(self, chat_id: str | None, params) -> dict:
+        message_id = params.get("message_id")
+        message = {
+            "message_id": int(message_id) if message_id else next(self._message_ids),
+            "from": BOT_USER,
+            "chat": {"id": int(chat_id) if chat_id and chat_id.lstrip("-").isdigit() else 0, "type": "private"},
+            "date": int(time.time()),
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if "caption" in params:
+            message["caption"] = params["caption"]
+        if "reply_markup" in params:
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        if request.method in request.POST_METHODS:
+            params = dict(await request.post())
+        elif request.can_read_body:
+            # telebot шлёт getUpdates GET-запросом с телом формы, request.post() его не читает
+            params = dict(parse_qsl(await request.text()))
+        else:
+            params = {}
+        params.update(request.query)
+        chat_id = params.get("chat_id")
+        chat_id = str(chat_id) if chat_id is not None else None
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.startswith(LIMITED_PREFIXES) or method == "answercallbackquery":
+            delay = self._rate_limited(chat_id if method != "answercallbackquery" else None)
+            if delay is not None:
+                self.rate_limited += 1
+                retry_after = max(1, round(delay))
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                })
+            if chat_id is not None and method.startswith("send"):
+                self.sent_by_chat.setdefault(chat_id, []).append(str(params.get("text", method)))
+
+        if method == "getme":
+            result = BOT_USER
+        elif method == "getupdates":
+            result = await self._get_updates(params)
+        elif method in TRUE_METHODS:
+            result = True
+        elif method.startswith(("send", "edit", "forward", "copy")):
+            result = self._message(chat_id, params)
+            waiter = self._reply_waiters.pop(chat_id, None) if chat_id is not None else None
+            if waiter is not None and not waiter.done():
+                waiter.set_result(result)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def stats(self) -> dict:
+        return {"calls": sum(self.calls.values()), "rate_limited": self.rate_limited, "by_method": dict(self.calls)}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(host: str, port: int, global_rate: float, chat_rate: float) -> None:
+    api = FakeBotApi(global_rate=global_rate, chat_rate=chat_rate)
+    url = await api.start(host, port)
+    print(f"Fake Bot API on {url}, set asyncio_helper.API_URL = {url}/bot{{0}}/{{1}}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(api.stats())
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port, args.global_rate, args.chat_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Нагрузочный прогон бота целиком, без Telegram.
+
+Поднимает заглушку Bot API (benchmarks.fake_bot_api), запускает настоящий
+main.py (или supervisor.py с --workers) отдельным процессом в режиме polling
+против неё и гоняет синтетических пользователей по сценарию
+/start -> /subjects (переключение предметов) -> /add_score (предмет, балл) -> /profile -> /stats.
+Пользователь отправляет следующее обновление только после ответа бота на
+предыдущее; задержка шага - от появления обновления в getUpdates до первого
+сообщения бота в этот чат (отправка или правка).
+
+--record сохраняет сгенерированные обновления, а UPDATE_LOG_PATH у бота -
+настоящие (utils.update_log). --replay прогоняет такой файл вместо сценария:
+обновления каждого чата идут по порядку, каждое после ответа на предыдущее
+(или --reply-timeout), update_id перенумеровываются, база каждый раз новая.
+--speed 1 выдерживает записанные интервалы, 0 - без пауз.
+
+По умолчанию лимиты отправки у бота и у заглушки сняты, чтобы мерить сам бот;
+--telegram-limits оставляет настоящие (1 сообщение в секунду на чат).
+Профиль движка по умолчанию - sqlite-wal, как для файловой SQLite в работе.
+
+Что показывает прогон (1 CPU, свежая SQLite, 10 пользователей, --flows 1):
+- профиль default: /start p95 ~1.4 с, до переноса графиков из цикла событий ~3.9 с.
+  INSERT/DELETE ждут блокировку записи SQLite в busy handler: он опрашивает её
+  со сна 1-100 мс без очереди, пока держатель блокировки стоит в цикле событий;
+- sqlite-wal (писатели процесса в очереди, см. db.engine_profiles): /start p95 ~0.12 с,
+  шаги с записью p95 < 0.4 с, медленных запросов и "database is locked" нет;
+- /stats p50 ~1.6 с при любом профиле: графики matplotlib рисуются по одному в
+  отдельном потоке (~150-300 мс CPU на график). С 30 пользователями они
+  занимают весь процессор, и p95 растёт до секунд на всех шагах - это предел
+  CPU, а не базы.
+
+Запуск: python -m benchmarks.loadtest [--users 50] [--flows 1] [--workers 0] [--engine-profile default]
+        [--record updates.jsonl | --replay updates.jsonl [--speed 0]] [--json results.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+os.environ.setdefault("BOT_TOKEN", "1:loadtest")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNLIMITED_RATE = "100000"
+FIRST_USER_ID = 100000
+
+
+def _percentiles(values: list[float]) -> tuple[float, float, float]:
+    values = sorted(values)
+    quantiles = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+def _buttons(message: dict | None) -> list[str]:
+    markup = (message or {}).get("reply_markup") or {}
+    return [button["callback_data"] for row in markup.get("inline_keyboard", []) for button in row if "callback_data" in button]
+
+
+def _chat_id(update: dict) -> int:
+    from utils.dispatcher import raw_update_key
+    for field in ("message", "edited_message"):
+        if field in update:
+            return update[field]["chat"]["id"]
+    query = update.get("callback_query")
+    if query and query.get("message"):
+        return query["message"]["chat"]["id"]
+    return raw_update_key(update)
+
+
+def _update_kind(update: dict) -> str:
+    """Step name for a replayed update: the command, "text", or the callback action."""
+    from utils.callbacks import parse_callback
+    message = update.get("message")
+    if message is not None:
+        text = message.get("text") or ""
+        return text.split()[0].split("@")[0] if text.startswith("/") else "text" if text else "other"
+    query = update.get("callback_query")
+    if query is not None:
+        parsed = parse_callback(query.get("data"))
+        return f"callback:{parsed.action.name}" if parsed else "callback"
+    return next((field for field in update if field != "update_id"), "other")
+
+
+class LoadDriver:
+    """Sends updates through the fake Bot API and waits for the bot's replies."""
+
+    def __init__(self, api, reply_timeout: float, recorder=None):
+        self.api = api
+        self.reply_timeout = reply_timeout
+        self.recorder = recorder
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.timeouts: dict[str, int] = defaultdict(int)
+        self._callback_ids = itertools.count(1)
+
+    async def step(self, name: str, chat_id: int, update: dict) -> dict | None:
+        """Push `update`, return the bot's reply message or None on timeout."""
+        reply = self.api.wait_reply(chat_id)
+        started = time.perf_counter()
+        update_id = self.api.push_update(update)
+        if self.recorder is not None:
+            self.recorder.record(dict(update, update_id=update_id))
+        try:
+            message = await asyncio.wait_for(reply, self.reply_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        return message
+
+    async def say(self, name: str, user_id: int, text: str) -> dict | None:
+        from benchmarks.webhook_client import make_update
+        return await self.step(name, user_id, make_update(0, user_id, text))
+
+    async def press(self, name: str, user_id: int, message: dict, data: str) -> dict | None:
+        """Press an inline button of `message`; returns the message as the bot left it."""
+        from benchmarks.webhook_client import make_user
+        query = {
+            "id": str(next(self._callback_ids)),
+            "from": make_user(user_id),
+            "message": message,
+            "chat_instance": str(user_id),
+            "data": data,
+        }
+        reply = await self.step(name, user_id, {"callback_query": query})
+        # Правка возвращает только изменённые поля, остальное у сообщения прежнее
+        return dict(message, **reply) if reply and reply["message_id"] == message["message_id"] else reply
+
+    def results(self, elapsed: float) -> dict:
+        answered = sum(len(values) for values in self.latencies.values())
+        steps = {}
+        for name in sorted(set(self.latencies) | set(self.timeouts)):
+            values = self.latencies.get(name, [])
+            p50, p95, p99 = _percentiles(values) if values else (None, None, None)
+            steps[name] = {"count": len(values), "timeouts": self.timeouts.get(name, 0), "p50": p50, "p95": p95, "p99": p99}
+        p50, p95, p99 = _percentiles([value for values in self.latencies.values() for value in values]) if answered else (None, None, None)
+        return {
+            "elapsed": elapsed,
+            "answered": answered,
+            "timeouts": sum(self.timeouts.values()),
+            "updates_per_second": answered / elapsed if elapsed else 0.0,
+            "p50": p50, "p95": p95, "p99": p99,
+            "steps": steps,
+            "api": self.api.stats(),
+        }
+
+
+async def user_flow(driver: LoadDriver, user_id: int, rng: random.Random, flows: int, think: float) -> None:
+    async def pause():
+        if think:
+            await asyncio.sleep(think)
+
+    await driver.say("/start", user_id, "/start")
+    for _ in range(flows):
+        await pause()
+        menu = await driver.say("/subjects", user_id, "/subjects")
+        buttons = _buttons(menu)
+        for data in rng.sample(buttons, min(len(buttons), rng.randint(1, 3))):
+            await pause()
+            menu = await driver.press("toggle_subject", user_id, menu, data)
+            if menu is None:
+                break
+
+        await pause()
+        choice = await driver.say("/add_score", user_id, "/add_score")
+        buttons = _buttons(choice)
+        if buttons:
+            await pause()
+            if await driver.press("add_score", user_id, choice, rng.choice(buttons)) is not None:
+                await pause()
+                await driver.say("score", user_id, str(rng.randint(40, 100)))
+
+        await pause()
+        await driver.say("/profile", user_id, "/profile")
+        await pause()
+        await driver.say("/stats", user_id, "/stats")
+
+
+async def replay_updates(driver: LoadDriver, entries: list[tuple[float, dict]], speed: float) -> None:
+    by_chat: dict[int, list[tuple[float, dict]]] = defaultdict(list)
+    for offset, update in entries:
+        by_chat[_chat_id(update)].append((offset, {key: value for key, value in update.items() if key != "update_id"}))
+    started = time.perf_counter()
+
+    async def run_chat(chat_id: int, items: list[tuple[float, dict]]) -> None:
+        for offset, update in items:
+            if speed:
+                await asyncio.sleep(max(0.0, started + offset / speed - time.perf_counter()))
+            await driver.step(_update_kind(update), chat_id, update)
+
+    await asyncio.gather(*(run_chat(chat_id, items) for chat_id, items in by_chat.items()))
+
+
+def _bot_env(args, api_url: str, workdir: str) -> dict:
+    env = dict(
+        os.environ,
+        BOT_TOKEN="1:loadtest",
+        BOT_MODE="polling",
+        TELEGRAM_API_URL=api_url,
+        DATABASE_URL=args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        UPDATE_LOG_PATH="",
+    )
+    if args.engine_profile:
+        env["DB_ENGINE_PROFILE"] = args.engine_profile
+    if not args.telegram_limits:
+        env.update(OUTBOUND_GLOBAL_RATE=UNLIMITED_RATE, OUTBOUND_CHAT_RATE=UNLIMITED_RATE, OUTBOUND_CHAT_BURST=UNLIMITED_RATE)
+    return env
+
+
+async def _wait_ready(api, process: subprocess.Popen, timeout: float) -> None:
+    """The bot is ready once it polls after skipping pending updates."""
+    deadline = time.monotonic() + timeout
+    while api.calls["getupdates"] < 2:
+        if process.poll() is not None:
+            raise RuntimeError(f"Bot exited with code {process.returncode} before polling")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Bot did not start polling in {timeout:.0f} s")
+        await asyncio.sleep(0.1)
+
+
+def _stop(process: subprocess.Popen, timeout: float = 30) -> None:
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _print_results(results: dict) -> None:
+    def ms(value):
+        return f"{value * 1e3:8.1f}" if value is not None else "       -"
+
+    print(f"updates:     {results['answered']} answered, {results['timeouts']} without reply in {results['elapsed']:.2f} s "
+          f"({results['updates_per_second']:.1f} updates/s)")
+    print(f"latency ms:  p50 {ms(results['p50'])}  p95 {ms(results['p95'])}  p99 {ms(results['p99'])}")
+    print(f"{'step':<28}{'count':>7}{'timeouts':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, step in results["steps"].items():
+        print(f"{name:<28}{step['count']:>7}{step['timeouts']:>9}{ms(step['p50'])}{ms(step['p95'])}{ms(step['p99'])}")
+    print(f"bot api:     {results['api']}")
+
+
+async def run(args) -> dict:
+    from benchmarks.fake_bot_api import FakeBotApi
+    from utils.update_log import UpdateRecorder, read_update_log
+
+    entries = list(read_update_log(args.replay)) if args.replay else None
+    if args.telegram_limits:
+        api = FakeBotApi()
+    else:
+        api = FakeBotApi(global_rate=float(UNLIMITED_RATE), chat_rate=float(UNLIMITED_RATE), chat_burst=float(UNLIMITED_RATE))
+    api_url = await api.start(port=args.port)
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    command = [sys.executable, "supervisor.py", "--workers", str(args.workers)] if args.workers else [sys.executable, "main.py"]
+    log_path = os.path.join(workdir, "bot.log")
+    print(f"Bot: {' '.join(command[1:])}, log {log_path}")
+    recorder = UpdateRecorder(args.record) if args.record else None
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, cwd=REPO_ROOT, env=_bot_env(args, api_url, workdir), stdout=log, stderr=subprocess.STDOUT)
+        try:
+            await _wait_ready(api, process, args.start_timeout)
+            driver = LoadDriver(api, args.reply_timeout, recorder)
+            started = time.perf_counter()
+            if entries is not None:
+                await replay_updates(driver, entries, args.speed)
+            else:
+                await asyncio.gather(*(
+                    user_flow(driver, user_id, random.Random(args.seed * 1_000_003 + user_id), args.flows, args.think)
+                    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+                ))
+            results = driver.results(time.perf_counter() - started)
+        finally:
+            _stop(process)
+            if recorder is not None:
+                recorder.close()
+            await api.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--flows", type=int, default=1, help="scenario repetitions per user after /start")
+    parser.add_argument("--think", type=float, default=0.0, help="pause between a user's steps, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=0, help="run supervisor.py with N workers instead of main.py")
+    parser.add_argument("--database-url", default=None, help="default: a fresh SQLite file per run")
+    parser.add_argument("--engine-profile", default="sqlite-wal", help="DB_ENGINE_PROFILE for the bot")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--telegram-limits", action="store_true")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--start-timeout", type=float, default=60.0)
+    parser.add_argument("--record", default=None, help="save the generated updates to this JSONL file")
+    parser.add_argument("--replay", default=None, help="replay updates from this JSONL file instead of the scenario")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed, 1 = recorded timing, 0 = no pauses")
+    parser.add_argument("--json", default=None, help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    _print_results(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Локальная замена Redis для проверки RedisStateStorage без установленного сервера.
+
+Поддерживает PING, AUTH (пароль задаётся в RespServer), SELECT, GET, SET [EX|PX], DEL, EXISTS, EXPIRE, TTL, DBSIZE, FLUSHDB.
+Просроченные ключи удаляются как в Redis: лениво при обращении и фоновыми
+пачками - каждые 100 мс проверяется выборка ключей с TTL, и проверка повторяется,
+пока в выборке больше четверти просроченных.
+
+Запуск: python -m benchmarks.resp_server [--port 6379]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from utils.resp import RespError, read_reply
+
+EXPIRY_INTERVAL = 0.1
+EXPIRY_SAMPLE_SIZE = 20
+
+
+def _encode_reply(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, bool):
+        return b"+OK\r\n" if value else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespServer:
+    """
+    `password` включает проверку AUTH (без неё команды отвечают NOAUTH), SELECT принимает
+    номера баз от 0 до `databases` - 1, но пространство ключей у всех баз общее.
+    """
+
+    def __init__(self, password: str | None = None, databases: int = 16):
+        self.password = password
+        self.databases = databases
+        self.data: dict[bytes, bytes] = {}
+        self.expires: dict[bytes, float] = {}
+        self.expired = 0
+        self._server: asyncio.Server | None = None
+        self._expiry_task: asyncio.Task | None = None
+
+    def _alive(self, key: bytes) -> bool:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expired += 1
+        return key in self.data
+
+    def _remove(self, key: bytes) -> bool:
+        self.expires.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+    def expire_batch(self) -> int:
+        """One round of active expiry; returns the number of keys removed."""
+        removed = 0
+        while self.expires:
+            sample = random.sample(list(self.expires), min(EXPIRY_SAMPLE_SIZE, len(self.expires)))
+            now = time.monotonic()
+            expired = [key for key in sample if self.expires[key] <= now]
+            for key in expired:
+                self._remove(key)
+            removed += len(expired)
+            if len(expired) * 4 <= len(sample):
+                break
+        self.expired += removed
+        return removed
+
+    def execute(self, command: list[bytes]):
+        name, args = command[0].upper(), command[1:]
+        if name == b"PING":
+            return "PONG"
+        if name == b"SELECT":
+            try:
+                index = int(args[0])
+            except ValueError:
+                return RespError("ERR value is not an integer or out of range")
+            if not 0 <= index < self.databases:
+                return RespError("ERR DB index is out of range")
+            return "OK"
+        if name == b"GET":
+            return self.data[args[0]] if self._alive(args[0]) else None
+        if name == b"SET":
+            key, value = args[0], args[1]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            options = [arg.upper() for arg in args[2:]]
+            if b"EX" in options:
+                self.expires[key] = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                self.expires[key] = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            return "OK"
+        if name == b"DEL":
+            return sum(self._alive(key) and self._remove(key) for key in args)
+        if name == b"EXISTS":
+            return sum(self._alive(key) for key in args)
+        if name == b"EXPIRE":
+            if not self._alive(args[0]):
+                return 0
+            self.expires[args[0]] = time.monotonic() + int(args[1])
+            return 1
+        if name == b"TTL":
+            if not self._alive(args[0]):
+                return -2
+            expires_at = self.expires.get(args[0])
+            return -1 if expires_at is None else max(0, round(expires_at - time.monotonic()))
+        if name == b"DBSIZE":
+            return len(self.data)
+        if name == b"FLUSHDB":
+            self.data.clear()
+            self.expires.clear()
+            return "OK"
+        return RespError(f"ERR unknown command '{name.decode()}'")
+
+    def _authenticate(self, command: list[bytes]):
+        if self.password is None or command[-1] == self.password.encode("utf-8"):
+            return "OK"
+        return RespError("WRONGPASS invalid username-password pair or user is disabled.")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(_encode_reply(RespError("ERR protocol error")))
+                    continue
+                if command[0].upper() == b"AUTH":
+                    reply = self._authenticate(command)
+                    authenticated = reply == "OK"
+                elif not authenticated:
+                    reply = RespError("NOAUTH Authentication required.")
+                else:
+                    reply = self.execute(command)
+                writer.write(_encode_reply(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _expire_forever(self) -> None:
+        while True:
+            await asyncio.sleep(EXPIRY_INTERVAL)
+            self.expire_batch()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 6379) -> str:
+        """Start serving and return the URL; port=0 picks a free port."""
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        self._expiry_task = asyncio.create_task(self._expire_forever())
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://{host}:{port}/0"
+
+    async def stop(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+async def _serve(host: str, port: int, password: str | None) -> None:
+    server = RespServer(password=password)
+    url = await server.start(host, port)
+    if password:
+        url = url.replace("redis://", f"redis://:{password}@", 1)
+    print(f"RESP stand-in on {url} (REDIS_URL={url})")
+    while True:
+        await asyncio.sleep(3600)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default=None)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port, args.password))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Локальный клиент, который отправляет синтетические обновления на webhook бота
+(как это делает Telegram) и измеряет пропускную способность приёма.
+
+Бот должен быть запущен с BOT_MODE=webhook и тем же WEBHOOK_SECRET.
+Ответы бота уходят в Bot API, поэтому для прогонов без сети направьте его на заглушку.
+
+Запуск: python -m benchmarks.webhook_client [--url http://127.0.0.1:8080/webhook] [--updates 5000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import aiohttp
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def make_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    user = make_user(user_id)
+    message = {
+        "message_id": update_id,
+        "from": user,
+        "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+        "date": int(time.time()),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+async def run(url: str, secret: str, updates: int, concurrency: int, users: int, text: str) -> None:
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for update_id in range(1, updates + 1):
+        queue.put_nowait(update_id)
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            update_id = queue.get_nowait()
+            payload = make_update(update_id, update_id % users + 1, text)
+            started = time.perf_counter()
+            async with session.post(url, json=payload, headers={SECRET_TOKEN_HEADER: secret}) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"updates:     {len(latencies)} in {elapsed:.2f} s ({len(latencies) / elapsed:.0f} updates/s)")
+    print(f"statuses:    {dict(sorted(statuses.items()))}")
+    print(f"latency ms:  p50 {quantiles[49] * 1e3:.2f}  p95 {quantiles[94] * 1e3:.2f}  p99 {quantiles[98] * 1e3:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--text", default="/help")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.secret, args.updates, args.concurrency, args.users, args.text))
+
+
+if __name__ == "__main__":
+    main()
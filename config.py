@@ -1,5 +1,6 @@
 import dotenv
 import os
+import secrets
 
 dotenv.load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -7,4 +8,64 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN is not set in environment variables")
 if not DATABASE_URL:
-    raise ValueError("DATABASE_URL is not set in environment variables")
\ No newline at end of file
+    raise ValueError("DATABASE_URL is not set in environment variables")
+
+# Адрес Bot API, если он не api.telegram.org (локальный сервер Bot API или заглушка из benchmarks)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "3600"))
+
+ADMIN_IDS = {int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip()}
+
+DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "default")
+
+DB_UNIT_OF_WORK = os.getenv("DB_UNIT_OF_WORK", "1") == "1"
+
+# Профилировщик SQL (db.profiler), включается SQL_PROFILER=1: медленные запросы
+# и одна форма запроса столько раз за обновление (N+1)
+SQL_PROFILER = os.getenv("SQL_PROFILER", "0") == "1"
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "3"))
+
+# "polling" или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError(f"Unknown BOT_MODE: {BOT_MODE}")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL is not set in environment variables")
+
+# Файл JSONL, куда пишутся все входящие обновления (utils.update_log); пусто - не писать
+UPDATE_LOG_PATH = os.getenv("UPDATE_LOG_PATH", "")
+
+# Эндпоинт Prometheus /metrics; 0 - выключен. Воркеры супервизора слушают METRICS_PORT + 1 + номер
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Сколько обновлений обрабатываются одновременно и сколько может ждать в очередях
+DISPATCH_CONCURRENCY = int(os.getenv("DISPATCH_CONCURRENCY", "16"))
+DISPATCH_MAX_PENDING = int(os.getenv("DISPATCH_MAX_PENDING", "1000"))
+
+# Лимиты исходящих запросов к Bot API (сообщений в секунду)
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Хранилище FSM-состояний: "memory" (один процесс), "db" (таблица conversation_states) или "redis"
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+# Через сколько секунд бездействия незавершённый диалог забывается
+STATE_TTL = int(os.getenv("STATE_TTL", "86400"))
+STATE_EXPIRY_INTERVAL = float(os.getenv("STATE_EXPIRY_INTERVAL", "60"))
+if STATE_BACKEND not in ("memory", "db", "redis"):
+    raise ValueError(f"Unknown STATE_BACKEND: {STATE_BACKEND}")
+
+# supervisor.py: число процессов-воркеров и период сбора их метрик (секунды)
+SUPERVISOR_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+SUPERVISOR_METRICS_INTERVAL = float(os.getenv("SUPERVISOR_METRICS_INTERVAL", "30"))
@@ -1,32 +1,59 @@
-from typing import Optional
-from db.models import User, Subject, Scores, Exams, UserSubjectAssociation
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Sequence
+from logging import Logger
+from db.models import User, Subject, Scores, Exams, UserSubjectAssociation, ScoreRollup
 from db.exceptions import *
+from db.database import commit_or_flush, after_commit
 
-from utils.validators import validate_user_data_create, validate_user_data_update
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from utils.cache import LRUTTLCache
+from utils.subjects import SubjectInfo, subject_registry
+from utils.validators import validate_user_data_create, validate_user_data_update, user_fingerprint
 
 from sqlalchemy import func
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, insert, update, delete, or_, and_, case, exists, tuple_, Row
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, aliased
+
+# user id -> (fingerprint of Telegram profile, User detached after its session is closed)
+user_identity_cache = LRUTTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def _dialect_insert(db: AsyncSession, model):
+    """
+    Return dialect-specific INSERT construct that supports ON CONFLICT clauses.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise CrudError(f"ON CONFLICT statements are not supported for dialect {dialect}")
 
 async def create_user(db: AsyncSession, **user_data) -> User:
     user_data = validate_user_data_create(user_data)
     new_user = User(**user_data)
     db.add(new_user)
     try:
-        await db.commit()
+        await commit_or_flush(db)
         await db.refresh(new_user)
         return new_user
     except IntegrityError as e:
-        await db.rollback()
         raise UserAlreadyExistsError(id=user_data.get("id")) from e
 
 
-async def get_user_by_id(db: AsyncSession, id: int) -> User | None:
+async def get_user_by_id(db: AsyncSession, id: int, with_subject_associations: bool = False) -> User:
+    """
+    Relationships are never loaded implicitly; pass with_subject_associations=True
+    when the caller needs user.subject_associations (e.g. desired scores).
+    """
     query = select(User).where(User.id == id)
+    if with_subject_associations:
+        query = query.options(selectinload(User.subject_associations)).execution_options(populate_existing=True)
     result = await db.execute(query)
-    user = result.one_or_none()
+    user = result.scalar_one_or_none()
 
     if user is None:
         raise UserNotFoundError(id=id)
@@ -43,32 +70,77 @@ async def update_user(db: AsyncSession, **update_data) -> User:
         raise e
     
     id = update_data.get("id")  # ИСПРАВЛЕНО: добавлен .get()
+    user_identity_cache.pop(id)
     user_data = validate_user_data_update(update_data)
     query = update(User).where(User.id == id).values(**user_data).returning(User)
     try:
         result = await db.execute(query)
         updated_user = result.scalar_one_or_none()
         if updated_user is None:
-            await db.rollback()
             raise UserNotFoundError(id=id)
-        await db.commit()
+        await commit_or_flush(db)
         await db.refresh(updated_user)
         return updated_user
     except SQLAlchemyError as e:
-        await db.rollback()
         raise CrudError("Failed to update user") from e
 
 
 
-async def create_or_update_user(db: AsyncSession, **user_data) -> User:
+async def upsert_user(db: AsyncSession, **user_data) -> User:
+    """
+    Create user or update his profile in a single INSERT ... ON CONFLICT DO UPDATE.
+    The row is rewritten only when username, first_name or last_name actually changed.
+    """
+    fingerprint = user_fingerprint(user_data)
+    user_data = validate_user_data_create(user_data)
+    insert_query = _dialect_insert(db, User).values(**user_data)
+    excluded = insert_query.excluded
+    query = insert_query.on_conflict_do_update(
+        index_elements=[User.id],
+        set_={
+            "username": excluded.username,
+            "first_name": excluded.first_name,
+            "last_name": excluded.last_name,
+        },
+        where=or_(
+            User.username.is_distinct_from(excluded.username),
+            User.first_name.is_distinct_from(excluded.first_name),
+            User.last_name.is_distinct_from(excluded.last_name),
+        ),
+    ).returning(User).execution_options(populate_existing=True)
     try:
-        user = await create_user(db, **user_data)
-        return user
-    except UserAlreadyExistsError:
-        if "id" not in user_data:
-            raise ValueError("id is required for update")
-        user = await update_user(db, **user_data)
-        return user
+        result = await db.execute(query)
+        user = result.scalar_one_or_none()
+        if user is None:
+            # Профиль не изменился - ON CONFLICT ничего не вернул
+            user = await db.get(User, user_data["id"])
+        if user is None:
+            raise UserNotFoundError(id=user_data["id"])
+        # В кэш попадает только то, что действительно закоммичено
+        after_commit(db, lambda: user_identity_cache.set(user.id, (fingerprint, user)))
+        await commit_or_flush(db)
+    except UserNotFoundError:
+        raise
+    except SQLAlchemyError as e:
+        raise CrudError("Failed to upsert user") from e
+
+    return user
+
+
+async def create_or_update_user(db: AsyncSession, **user_data) -> User:
+    """
+    Called on every update. If the Telegram profile matches the cached fingerprint,
+    validation and the DB round trip are skipped and the cached User is returned.
+    """
+    if "id" not in user_data:
+        raise ValueError("id is required for update")
+
+    fingerprint = user_fingerprint(user_data)
+    cached = user_identity_cache.get(user_data["id"], check=lambda entry: entry[0] == fingerprint)
+    if cached is not None:
+        return cached[1]
+
+    return await upsert_user(db, **user_data)
 
 
 async def delete_user(db: AsyncSession, id: int) -> None:
@@ -77,27 +149,124 @@ async def delete_user(db: AsyncSession, id: int) -> None:
     except UserNotFoundError:
         raise
 
+    user_identity_cache.pop(id)
     query = delete(User).where(User.id == id)
     try:
         await db.execute(query)
-        await db.commit()
+        await commit_or_flush(db)
     except SQLAlchemyError as e:
-        await db.rollback()
         raise CrudError("Failed to delete user") from e
     
 
 
-async def get_score_by_id(db: AsyncSession, score_id: int) -> Scores:
+async def get_score_by_id(db: AsyncSession, score_id: int, user_id: Optional[int] = None) -> Scores:
+    """
+    Pass user_id to make sure the score belongs to that user.
+    """
     query = select(Scores).where(Scores.id == score_id)
+    if user_id is not None:
+        query = query.where(Scores.user_id == user_id)
     result = await db.execute(query)
     score = result.scalar_one_or_none()
     if score is None:
         raise ScoreNotFoundError(score_id=score_id)
     return score
 
+def _last_score_subquery(user_id, subject_id):
+    latest = aliased(Scores)
+    return (
+        select(latest.score)
+        .where(latest.user_id == user_id, latest.subject_id == subject_id)
+        .order_by(latest.created_at.desc(), latest.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _rollup_insert_from_scores(db: AsyncSession, *where):
+    """
+    INSERT INTO score_rollups SELECT <aggregates> FROM scores WHERE ... GROUP BY user_id, subject_id
+    """
+    aggregated = (
+        select(
+            Scores.user_id,
+            Scores.subject_id,
+            func.count(Scores.id),
+            func.sum(Scores.score),
+            func.max(Scores.score),
+            func.min(Scores.score),
+            _last_score_subquery(Scores.user_id, Scores.subject_id),
+            func.max(Scores.created_at),
+        )
+        .where(*where)
+        .group_by(Scores.user_id, Scores.subject_id)
+    )
+    columns = ["user_id", "subject_id", "count", "sum", "max", "min", "last_score", "last_at"]
+    return _dialect_insert(db, ScoreRollup).from_select(columns, aggregated)
+
+
+async def _increment_score_rollup(db: AsyncSession, user_id: int, subject_id: str, score: int) -> None:
+    insert_query = _dialect_insert(db, ScoreRollup).values(
+        user_id=user_id, subject_id=subject_id, count=1, sum=score,
+        max=score, min=score, last_score=score, last_at=func.now(),
+    )
+    excluded = insert_query.excluded
+    query = insert_query.on_conflict_do_update(
+        index_elements=[ScoreRollup.user_id, ScoreRollup.subject_id],
+        set_={
+            "count": ScoreRollup.count + 1,
+            "sum": ScoreRollup.sum + excluded.sum,
+            "max": case((ScoreRollup.max.is_(None), excluded.max), (excluded.max > ScoreRollup.max, excluded.max), else_=ScoreRollup.max),
+            "min": case((ScoreRollup.min.is_(None), excluded.min), (excluded.min < ScoreRollup.min, excluded.min), else_=ScoreRollup.min),
+            "last_score": excluded.last_score,
+            "last_at": excluded.last_at,
+        },
+    )
+    await db.execute(query)
+
+
+async def _recalculate_score_rollup(db: AsyncSession, user_id: int, subject_id: str) -> None:
+    """
+    Recompute one rollup row from scores, used when an edit or delete can change min/max/last.
+    """
+    insert_query = _rollup_insert_from_scores(db, Scores.user_id == user_id, Scores.subject_id == subject_id)
+    excluded = insert_query.excluded
+    query = insert_query.on_conflict_do_update(
+        index_elements=[ScoreRollup.user_id, ScoreRollup.subject_id],
+        set_={column: getattr(excluded, column) for column in ("count", "sum", "max", "min", "last_score", "last_at")},
+    )
+    await db.execute(query)
+    await db.execute(
+        delete(ScoreRollup).where(
+            ScoreRollup.user_id == user_id,
+            ScoreRollup.subject_id == subject_id,
+            ~exists().where(Scores.user_id == user_id, Scores.subject_id == subject_id),
+        )
+    )
+
+
+async def rebuild_score_rollups(db: AsyncSession) -> int:
+    """
+    Recompute score_rollups from scores from scratch. Returns the number of rollup rows.
+    """
+    try:
+        await db.execute(delete(ScoreRollup))
+        await db.execute(_rollup_insert_from_scores(db, Scores.user_id.is_not(None)))
+        count = await db.scalar(select(func.count()).select_from(ScoreRollup))
+        await commit_or_flush(db)
+        return count
+    except SQLAlchemyError as e:
+        raise CrudError("Failed to rebuild score rollups") from e
+
+
+async def get_score_rollup(db: AsyncSession, user_id: int, subject_id: str) -> ScoreRollup | None:
+    return await db.get(ScoreRollup, (user_id, subject_id), populate_existing=True)
+
+
 async def add_score(db: AsyncSession, user_id: int, subject_id: str, score: int, subject_name: str = None):
+    # Предмет проверяем всегда: тогда IntegrityError ниже может означать только отсутствие пользователя
+    subject = await get_subject_by_id(db, subject_id)
     if subject_name is None:
-        subject = await get_subject_by_id(db, subject_id)
         subject_name = subject.name
     
     new_score = Scores(
@@ -107,41 +276,120 @@ async def add_score(db: AsyncSession, user_id: int, subject_id: str, score: int,
         score=score
     )
     db.add(new_score)
-    await db.commit()
-    await db.refresh(new_score)
-    return new_score
+    try:
+        await db.flush()
+        await _increment_score_rollup(db, user_id, subject_id, score)
+        await commit_or_flush(db)
+        await db.refresh(new_score)
+        return new_score
+    except IntegrityError as e:
+        # Предмет проверен по subject_registry выше, значит нарушен FK на users
+        raise UserNotFoundError(id=user_id) from e
+    except SQLAlchemyError as e:
+        raise CrudError("Failed to add score") from e
+
+
+async def add_scores_bulk(db: AsyncSession, user_id: int, scores: list[dict]) -> int:
+    """
+    Insert many scores of one user with a single executemany and refresh the affected rollups
+    in the same transaction. Every item needs subject_id, subject_name and score, exam_date is optional.
+    """
+    if not scores:
+        return 0
+    rows = [
+        {
+            "user_id": user_id,
+            "subject_id": item["subject_id"],
+            "subject_name": item["subject_name"],
+            "score": item["score"],
+            "exam_date": item.get("exam_date"),
+        }
+        for item in scores
+    ]
+    try:
+        await db.execute(insert(Scores), rows)
+        for subject_id in {row["subject_id"] for row in rows}:
+            await _recalculate_score_rollup(db, user_id, subject_id)
+        await commit_or_flush(db)
+        return len(rows)
+    except SQLAlchemyError as e:
+        raise CrudError("Failed to import scores") from e
 
 
-async def edit_existing_score(db: AsyncSession, score_id: int, new_score_value: int):
-    query = update(Scores).where(Scores.id == score_id).values(score=new_score_value).returning(Scores)
+async def edit_existing_score(db: AsyncSession, score_id: int, new_score_value: int, user_id: Optional[int] = None):
+    query = update(Scores).where(Scores.id == score_id)
+    if user_id is not None:
+        query = query.where(Scores.user_id == user_id)
+    query = query.values(score=new_score_value).returning(Scores)
     try:
         result = await db.execute(query)
         updated_score = result.scalar_one_or_none()
         if updated_score is None:
-            await db.rollback()
             raise ScoreNotFoundError(score_id=score_id)
-        await db.commit()
+        await _recalculate_score_rollup(db, updated_score.user_id, updated_score.subject_id)
+        await commit_or_flush(db)
         await db.refresh(updated_score)
         return updated_score
+    except ScoreNotFoundError:
+        raise
     except SQLAlchemyError as e:
-        await db.rollback()
         raise CrudError("Failed to update score") from e
 
 
-async def delete_score_by_id(db: AsyncSession, score_id: int) -> None:
+async def delete_score_by_id(db: AsyncSession, score_id: int, user_id: Optional[int] = None) -> None:
     try:
-        score = await get_score_by_id(db, score_id)
+        score = await get_score_by_id(db, score_id, user_id=user_id)
     except ScoreNotFoundError as e:
         raise e
     try:
         query = delete(Scores).where(Scores.id == score_id)
         await db.execute(query)
-        await db.commit()
+        await _recalculate_score_rollup(db, score.user_id, score.subject_id)
+        await commit_or_flush(db)
     except SQLAlchemyError as e:
-        await db.rollback()
         raise CrudError("Failed to delete score") from e
 
 
+async def get_scores_page(
+    db: AsyncSession,
+    user_id: int,
+    anchor_id: Optional[int] = None,
+    newer: bool = False,
+    limit: int = 10,
+) -> tuple[list[Scores], bool]:
+    """
+    One page of user's scores, newest first, via keyset pagination over (created_at, id).
+    anchor_id is the id of the score the page starts after: older than it by default,
+    newer than it with newer=True. The anchor's created_at is resolved by primary key inside
+    the same statement, so every page is a single indexed LIMIT query.
+    Returns the page and whether there are more scores further in the requested direction.
+    """
+    query = select(Scores).where(Scores.user_id == user_id)
+    if anchor_id is not None:
+        anchor_score = aliased(Scores)
+        anchor_created_at = (
+            select(anchor_score.created_at)
+            .where(anchor_score.id == anchor_id, anchor_score.user_id == user_id)
+            .scalar_subquery()
+        )
+        key = tuple_(Scores.created_at, Scores.id)
+        anchor = tuple_(anchor_created_at, anchor_id)
+        query = query.where(key > anchor if newer else key < anchor)
+
+    if newer and anchor_id is not None:
+        query = query.order_by(Scores.created_at.asc(), Scores.id.asc())
+    else:
+        query = query.order_by(Scores.created_at.desc(), Scores.id.desc())
+
+    result = await db.execute(query.limit(limit + 1))
+    scores = list(result.scalars().all())
+    has_more = len(scores) > limit
+    scores = scores[:limit]
+    if newer and anchor_id is not None:
+        scores.reverse()
+    return scores, has_more
+
+
 async def get_all_scores_for_user(db: AsyncSession, id: int, subject_id: Optional[str]) -> list[Scores]:
     """
     Retrieve all scores for a specific user, optionally filtered by subject.
@@ -160,65 +408,189 @@ async def get_all_scores_for_user(db: AsyncSession, id: int, subject_id: Optiona
         raise ScoreNotFoundError()
     return scores
 
-async def create_subjects(db: AsyncSession) -> list[Subject]:
-    from utils.subjects import EGE_SUBJECTS_DICT
-    subjects = []
-    for subject_id, name in EGE_SUBJECTS_DICT.items():
-        new_subject = Subject(id=subject_id, name=name)
-        db.add(new_subject)
-        subjects.append(new_subject)
-    
+@dataclass(frozen=True)
+class SubjectSummary:
+    subject_id: str
+    is_selected: bool
+    count: int
+    total: int
+    avg: float
+    max: int | None
+    last_score: int | None
+    desired_score: int | None
+
+
+async def get_user_subject_summary(db: AsyncSession, user_id: int) -> list[SubjectSummary]:
+    """
+    Per-subject statistics for the profile screen in a single JOIN over score_rollups.
+    Returns subjects that are selected by the user or have at least one score,
+    in subject_registry order.
+    """
+    query = (
+        select(
+            Subject.id,
+            UserSubjectAssociation.user_id.is_not(None),
+            UserSubjectAssociation.desired_score,
+            ScoreRollup.count,
+            ScoreRollup.sum,
+            ScoreRollup.max,
+            ScoreRollup.last_score,
+        )
+        .select_from(Subject)
+        .outerjoin(
+            UserSubjectAssociation,
+            and_(UserSubjectAssociation.subject_id == Subject.id, UserSubjectAssociation.user_id == user_id),
+        )
+        .outerjoin(
+            ScoreRollup,
+            and_(ScoreRollup.subject_id == Subject.id, ScoreRollup.user_id == user_id),
+        )
+        .where(or_(UserSubjectAssociation.user_id.is_not(None), ScoreRollup.user_id.is_not(None)))
+    )
+    result = await db.execute(query)
+    summaries = {
+        subject_id: SubjectSummary(
+            subject_id=subject_id,
+            is_selected=bool(is_selected),
+            count=count or 0,
+            total=total or 0,
+            avg=total / count if count else 0.0,
+            max=max_score,
+            last_score=last,
+            desired_score=desired_score,
+        )
+        for subject_id, is_selected, desired_score, count, total, max_score, last in result.all()
+    }
+    ordered = [summaries.pop(subject.id) for subject in subject_registry if subject.id in summaries]
+    return ordered + list(summaries.values())
+
+
+async def stream_scores(db: AsyncSession, user_id: Optional[int] = None, chunk_size: int = 1000) -> AsyncIterator[Sequence[Row]]:
+    """
+    Yield score rows in chunks of `chunk_size` through a server-side cursor (yield_per),
+    so memory stays bounded regardless of table size. user_id=None streams the whole table.
+    Rows are plain tuples: id, user_id, subject_id, subject_name, score, exam_date, created_at.
+    """
+    query = select(
+        Scores.id, Scores.user_id, Scores.subject_id, Scores.subject_name,
+        Scores.score, Scores.exam_date, Scores.created_at,
+    ).order_by(Scores.id)
+    if user_id is not None:
+        query = query.where(Scores.user_id == user_id)
+
+    result = await db.stream(query.execution_options(yield_per=chunk_size))
+    try:
+        async for partition in result.partitions():
+            yield partition
+    finally:
+        await result.close()
+
+
+async def get_user_goals(db: AsyncSession, user_id: int) -> list[UserSubjectAssociation]:
+    query = select(UserSubjectAssociation).where(
+        UserSubjectAssociation.user_id == user_id,
+        UserSubjectAssociation.desired_score.is_not(None)
+    )
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+async def create_subjects(db: AsyncSession) -> list[SubjectInfo]:
+    """
+    Seed missing subjects from the static catalog with one idempotent bulk INSERT.
+    """
+    from utils.subjects import SubjectRegistry
+    subjects = list(SubjectRegistry.from_static())
+    query = _dialect_insert(db, Subject).values([
+        {"id": subject.id, "name": subject.name, "max_score": subject.max_score}
+        for subject in subjects
+    ]).on_conflict_do_nothing(index_elements=[Subject.id])
     try:
-        await db.commit()
-        for subject in subjects:
-            await db.refresh(subject)
+        await db.execute(query)
+        await commit_or_flush(db)
         return subjects
-    except IntegrityError as e:
-        await db.rollback()
+    except SQLAlchemyError as e:
         raise CrudError("Failed to create subjects") from e
 
 
-async def get_subject_by_id(db: AsyncSession, subject_id: str) -> Subject:
-    query = select(Subject).where(Subject.id == subject_id)
-    result = await db.execute(query)
-    subject = result.scalar_one_or_none()
+async def load_subject_registry(db: AsyncSession, logger: Logger = None) -> None:
+    """
+    Seed the subjects table, verify it against the static catalog and load it into
+    subject_registry. Called once at startup, after that subjects are served from memory.
+    """
+    static_subjects = {subject.id: subject for subject in await create_subjects(db)}
+    result = await db.execute(select(Subject.id, Subject.name, Subject.max_score))
+
+    subjects = []
+    for subject_id, name, max_score in result.all():
+        static_subject = static_subjects.get(subject_id)
+        if static_subject is None:
+            if logger:
+                logger.warning(f"Subject {subject_id!r} exists only in the database")
+            subjects.append(SubjectInfo(id=subject_id, name=name, max_score=max_score))
+            continue
+        if logger and (static_subject.name, static_subject.max_score) != (name, max_score):
+            logger.warning(f"Subject {subject_id!r} differs from the static catalog, using database values")
+        subjects.append(SubjectInfo(id=subject_id, name=name, max_score=max_score, color=static_subject.color))
+
+    position = {subject_id: i for i, subject_id in enumerate(static_subjects)}
+    subjects.sort(key=lambda subject: position.get(subject.id, len(position)))
+    subject_registry.load(subjects)
+    if logger:
+        logger.info(f"Subject registry loaded: {len(subjects)} subjects")
+
+
+async def get_subject_by_id(db: AsyncSession, subject_id: str) -> SubjectInfo:
+    """
+    Served from subject_registry, no DB round trip.
+    """
+    subject = subject_registry.get(subject_id)
     if subject is None:
         raise SubjectNotFoundError(subject_id=subject_id)
     return subject
 
 
-async def add_subject_to_user(db: AsyncSession, user_id: int, subject_id: str) -> UserSubjectAssociation:
+async def _insert_user_subject(db: AsyncSession, user_id: int, subject_id: str) -> UserSubjectAssociation | None:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING. None means the association already exists,
+    a missing user is reported by the users FK as UserNotFoundError.
+    """
+    query = _dialect_insert(db, UserSubjectAssociation).values(
+        user_id=user_id, subject_id=subject_id
+    ).on_conflict_do_nothing(
+        index_elements=[UserSubjectAssociation.user_id, UserSubjectAssociation.subject_id]
+    ).returning(UserSubjectAssociation)
     try:
-        user = await get_user_by_id(db, user_id)
-    except UserNotFoundError as e:
-        raise e
+        result = await db.execute(query)
+    except IntegrityError as e:
+        # Предмет проверен по subject_registry выше, значит нарушен FK на users
+        raise UserNotFoundError(id=user_id) from e
+    return result.scalar_one_or_none()
 
+
+async def add_subject_to_user(db: AsyncSession, user_id: int, subject_id: str) -> UserSubjectAssociation:
+    await get_subject_by_id(db, subject_id)
+
+    association = await _insert_user_subject(db, user_id, subject_id)
+    if association is None:
+        raise CrudError("Failed to add subject to user")
     try:
-        subject = await get_subject_by_id(db, subject_id)
-    except SubjectNotFoundError as e:
-        raise e
-    
-    association = UserSubjectAssociation(user_id=user_id, subject_id=subject_id)
-    db.add(association)
-    try:
-        await db.commit()
-        await db.refresh(association)
+        await commit_or_flush(db)
         return association
-    except IntegrityError as e:
-        await db.rollback()
+    except SQLAlchemyError as e:
         raise CrudError("Failed to add subject to user") from e
 
 
-async def get_user_subjects(db: AsyncSession, user_id: int) -> list[Subject]:
+async def get_user_subjects(db: AsyncSession, user_id: int) -> list[SubjectInfo]:
     try:
         user = await get_user_by_id(db, user_id)
     except UserNotFoundError as e:
         raise e
     
-    query = select(Subject).join(UserSubjectAssociation, Subject.id == UserSubjectAssociation.subject_id).where(UserSubjectAssociation.user_id == user_id)
+    query = select(UserSubjectAssociation.subject_id).where(UserSubjectAssociation.user_id == user_id)
     result = await db.execute(query)
-    subjects = result.scalars().all()
-    return subjects
+    selected_ids = set(result.scalars().all())
+    return [subject for subject in subject_registry if subject.id in selected_ids]
     
 
 async def get_user_subjects_ids(db: AsyncSession, user_id: int) -> list[str]:
@@ -227,71 +599,68 @@ async def get_user_subjects_ids(db: AsyncSession, user_id: int) -> list[str]:
     return subject_ids
 
 async def remove_subject_from_user(db: AsyncSession, user_id: int, subject_id: str) -> None:
-    try:
-        user = await get_user_by_id(db, user_id)
-    except UserNotFoundError as e:
-        raise e
-
-    try:
-        subject = await get_subject_by_id(db, subject_id)
-    except SubjectNotFoundError as e:
-        raise e
+    await get_subject_by_id(db, subject_id)
 
     query = delete(UserSubjectAssociation).where(
         UserSubjectAssociation.user_id == user_id,
         UserSubjectAssociation.subject_id == subject_id
-    )
+    ).returning(UserSubjectAssociation.subject_id)
     try:
-        await db.execute(query)
-        await db.commit()
+        result = await db.execute(query)
+        removed = result.first()
+        if removed is None:
+            # Удалять было нечего - различаем "предмет не выбран" и "нет такого пользователя"
+            await get_user_by_id(db, user_id)
+        await commit_or_flush(db)
+    except UserNotFoundError:
+        raise
     except SQLAlchemyError as e:
-        await db.rollback()
         raise CrudError("Failed to remove subject from user") from e
 
 
 async def switch_subject_for_user(db: AsyncSession, user_id: int, subject_id: str) -> None:
-    user_subjects_ids = await get_user_subjects_ids(db, user_id)
-    if subject_id in user_subjects_ids:
-        await remove_subject_from_user(db, user_id, subject_id)
-    else:
-        await add_subject_to_user(db, user_id, subject_id)
+    """
+    Toggle a subject: conditional DELETE ... RETURNING, and INSERT only if nothing was deleted.
+    """
+    await get_subject_by_id(db, subject_id)
+
+    query = delete(UserSubjectAssociation).where(
+        UserSubjectAssociation.user_id == user_id,
+        UserSubjectAssociation.subject_id == subject_id
+    ).returning(UserSubjectAssociation.subject_id)
+    try:
+        result = await db.execute(query)
+        if result.first() is None:
+            await _insert_user_subject(db, user_id, subject_id)
+        await commit_or_flush(db)
+    except UserNotFoundError:
+        raise
+    except SQLAlchemyError as e:
+        raise CrudError("Failed to switch subject for user") from e
 
 
 async def set_desired_score(db: AsyncSession, user_id: int, subject_id: str, desired_score: int) -> UserSubjectAssociation:
-    try:
-        await get_user_by_id(db, user_id)
-    except UserNotFoundError as e:
-        raise e
+    """
+    Upsert the goal with INSERT ... ON CONFLICT DO UPDATE, selecting the subject if needed.
+    """
+    await get_subject_by_id(db, subject_id)
 
-    try:
-        await get_subject_by_id(db, subject_id)
-    except SubjectNotFoundError as e:
-        raise e
-    
-    query = select(UserSubjectAssociation).where(
-        UserSubjectAssociation.user_id == user_id,
-        UserSubjectAssociation.subject_id == subject_id
+    insert_query = _dialect_insert(db, UserSubjectAssociation).values(
+        user_id=user_id,
+        subject_id=subject_id,
+        desired_score=desired_score
     )
-    result = await db.execute(query)
-    association = result.scalar_one_or_none()
-    
-    if not association:
-        association = UserSubjectAssociation(
-            user_id=user_id, 
-            subject_id=subject_id, 
-            desired_score=desired_score
-        )
-        db.add(association)
-    else:
-        association.desired_score = desired_score
-    
+    query = insert_query.on_conflict_do_update(
+        index_elements=[UserSubjectAssociation.user_id, UserSubjectAssociation.subject_id],
+        set_={"desired_score": insert_query.excluded.desired_score},
+    ).returning(UserSubjectAssociation).execution_options(populate_existing=True)
+
     try:
-        await db.commit()
-        await db.refresh(association)
+        result = await db.execute(query)
+        association = result.scalar_one()
+        await commit_or_flush(db)
         return association
     except IntegrityError as e:
-        await db.rollback()
-        raise CrudError("Failed to set desired score") from e
+        raise UserNotFoundError(id=user_id) from e
     except SQLAlchemyError as e:
-        await db.rollback()
-        raise CrudError("Failed to set desired score") from e
\ No newline at end of file
+        raise CrudError("Failed to set desired score") from e
@@ -1,13 +1,20 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import declarative_base, Session
+from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text
-from config import DATABASE_URL
-from typing import AsyncGenerator
+from config import DATABASE_URL, DB_ENGINE_PROFILE, SQL_PROFILER
+from db.engine_profiles import create_engine_for_profile, get_engine_profile
+from db.profiler import query_profiler
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from logging import Logger
 import asyncio
 
-engine = create_async_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine_for_profile(DATABASE_URL, get_engine_profile(DB_ENGINE_PROFILE))
+if SQL_PROFILER:
+    query_profiler.install(engine)
 AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
@@ -24,13 +31,111 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
+UNIT_OF_WORK_KEY = "unit_of_work"
+AFTER_COMMIT_KEY = "after_commit_callbacks"
+AFTER_UNIT_OF_WORK_KEY = "after_unit_of_work_callbacks"
+
+# Сессия текущего unit of work, чтобы код вне crud (например, хранилище состояний) писал в ту же транзакцию
+current_unit_of_work: ContextVar[AsyncSession | None] = ContextVar("current_unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """
+    Одна транзакция на весь обработчик: crud-функции внутри только делают flush,
+    коммит выполняется один раз при выходе, и только если транзакция вообще началась.
+    Соединение из пула берётся сессией при первом запросе, так что обработчик
+    без обращений к БД соединение не занимает.
+    crud-функции при ошибке не откатывают транзакцию сами: откат делает владелец сессии.
+    Отложенные через after_unit_of_work вызовы выполняются после коммита и закрытия сессии.
+    """
+    deferred: list[Callable[[], Awaitable[Any]]] = []
+    async with AsyncSessionLocal() as session:
+        session.info[UNIT_OF_WORK_KEY] = True
+        session.info[AFTER_UNIT_OF_WORK_KEY] = deferred
+        token = current_unit_of_work.set(session)
+        try:
+            yield session
+            await _end_transaction(session)
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            current_unit_of_work.reset(token)
+    # Соединение уже вернулось в пул, блокировка записи снята - теперь можно ждать сеть
+    for callback in deferred:
+        await callback()
+
+
+async def _end_transaction(session: AsyncSession) -> None:
+    if session.in_transaction():
+        if session.sync_session.get_transaction().is_active:
+            await session.commit()
+        else:
+            # flush упал, а обработчик обработал ошибку сам - фиксировать нечего
+            await session.rollback()
+
+
+async def commit_unit_of_work(db: AsyncSession) -> None:
+    """
+    Досрочно зафиксировать транзакцию unit of work перед долгой работой без БД
+    (скачивание файла, отрисовка графика, выгрузка) или между пачками импорта.
+    Соединение возвращается в пул, блокировка записи SQLite снимается; следующий
+    запрос начинает новую транзакцию. Вне unit of work ничего не делает.
+    """
+    if db.info.get(UNIT_OF_WORK_KEY):
+        await _end_transaction(db)
+
+
+async def after_unit_of_work(callback: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Отложить callback до успешного выхода из текущего unit of work (и вернуть None),
+    а без unit of work - выполнить сразу и вернуть результат.
+    Если обработчик завершился ошибкой, отложенные вызовы отбрасываются.
+    """
+    session = current_unit_of_work.get()
+    if session is None:
+        return await callback()
+    session.info[AFTER_UNIT_OF_WORK_KEY].append(callback)
+    return None
+
+
+async def commit_or_flush(db: AsyncSession) -> None:
+    """
+    Коммит, а внутри unit of work - только flush: коммитит владелец
+    """
+    if db.info.get(UNIT_OF_WORK_KEY):
+        await db.flush()
+    else:
+        await db.commit()
+
+
+def after_commit(db: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Вызвать callback после ближайшего успешного коммита сессии, при откате он отбрасывается
+    """
+    db.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session: Session) -> None:
+    for callback in session.info.pop(AFTER_COMMIT_KEY, []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit_callbacks(session: Session) -> None:
+    session.info.pop(AFTER_COMMIT_KEY, None)
+
+
 async def init_models(needs_reset: bool = False, logger: Logger = None):
     """
     Инициализация моделей базы данных - через ORM
     """
     try:
-        from db.models import User, Subject, Scores, Exams, UserSubjectAssociation
-        from db.crud import create_subjects
+        from db.models import User, Subject, Scores, Exams, UserSubjectAssociation, ConversationState
+        from db.crud import load_subject_registry
+        from db.migrations import apply_migrations
         
         async with engine.begin() as conn:
             if needs_reset:
@@ -43,12 +148,11 @@ async def init_models(needs_reset: bool = False, logger: Logger = None):
         if logger:
             logger.info("Database tables created successfully")
 
-        if needs_reset:
+        async with AsyncSessionLocal() as session:
+            version = await apply_migrations(session, logger=logger)
             if logger:
-                logger.info("Creating default subjects...")
-            async with AsyncSessionLocal() as session:
-                await create_subjects(session)
-
+                logger.info(f"Database schema version: {version}")
+            await load_subject_registry(session, logger=logger)
             
     except Exception as e:
         if logger:
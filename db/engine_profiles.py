@@ -0,0 +1,143 @@
+"""
+Именованные профили движка БД. Профиль выбирается переменной окружения DB_ENGINE_PROFILE
+и задаёт параметры пула и PRAGMA, которые выполняются при каждом новом подключении к SQLite
+(foreign_keys=ON включается для SQLite всегда).
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.util import await_only
+
+
+@dataclass(frozen=True)
+class EngineProfile:
+    name: str
+    pool_pre_ping: bool = True
+    pool_size: int | None = None
+    max_overflow: int | None = None
+    pool_recycle: int | None = None
+    pool_timeout: float | None = None
+    sqlite_pragmas: dict[str, Any] = field(default_factory=dict)
+    # SQLite: пишущие транзакции процесса идут по очереди (_serialize_sqlite_writes),
+    # место в очереди ждём не дольше стольких секунд; None - без очереди
+    write_lock_timeout: float | None = None
+
+    def engine_kwargs(self) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {"pool_pre_ping": self.pool_pre_ping}
+        for option in ("pool_size", "max_overflow", "pool_recycle", "pool_timeout"):
+            value = getattr(self, option)
+            if value is not None:
+                kwargs[option] = value
+        return kwargs
+
+
+ENGINE_PROFILES: dict[str, EngineProfile] = {
+    # Поведение до появления профилей: SELECT 1 на каждую выдачу соединения из пула
+    "default": EngineProfile(name="default"),
+    # Файловая SQLite: WAL позволяет читать во время записи, synchronous=NORMAL в WAL не теряет
+    # консистентность и убирает fsync на каждый коммит, busy_timeout вместо мгновенного "database is locked",
+    # писатели одного процесса ждут в очереди, а не в busy handler
+    "sqlite-wal": EngineProfile(
+        name="sqlite-wal",
+        pool_pre_ping=False,
+        pool_size=5,
+        max_overflow=5,
+        sqlite_pragmas={
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "busy_timeout": 5000,
+        },
+        write_lock_timeout=5.0,
+    ),
+    # PostgreSQL за пулом: вместо pre-ping соединения просто пересоздаются раз в 30 минут
+    "postgres-pooled": EngineProfile(
+        name="postgres-pooled",
+        pool_pre_ping=False,
+        pool_size=10,
+        max_overflow=20,
+        pool_recycle=1800,
+        pool_timeout=10,
+    ),
+}
+
+
+def get_engine_profile(name: str) -> EngineProfile:
+    try:
+        return ENGINE_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown DB_ENGINE_PROFILE {name!r}, expected one of {sorted(ENGINE_PROFILES)}") from None
+
+
+def create_engine_for_profile(url: str, profile: EngineProfile, **engine_kwargs) -> AsyncEngine:
+    """engine_kwargs are passed to create_async_engine on top of the profile (e.g. poolclass)."""
+    engine = create_async_engine(url, **{**profile.engine_kwargs(), **engine_kwargs})
+
+    if engine.dialect.name == "sqlite":
+        # Без foreign_keys=ON SQLite не проверяет внешние ключи, а crud на них опирается
+        pragmas = {"foreign_keys": "ON", **profile.sqlite_pragmas}
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            cursor.close()
+
+        if profile.write_lock_timeout is not None:
+            _serialize_sqlite_writes(engine, profile.write_lock_timeout)
+
+    return engine
+
+
+WRITE_LOCK_KEY = "sqlite_write_lock"
+
+
+def _serialize_sqlite_writes(engine: AsyncEngine, timeout: float) -> None:
+    """
+    В SQLite один писатель на базу. Соединение, которому запись не досталась, ждёт в
+    busy handler: опрашивает блокировку со сна от 1 до 100 мс, так что очередь не
+    соблюдается и запись под нагрузкой ждёт секундами. Здесь первый INSERT/UPDATE/DELETE
+    транзакции сначала берёт asyncio.Lock движка и держит его, пока соединение не
+    вернётся в пул (сессия возвращает его сразу после коммита или отката): писатели
+    процесса ждут по очереди, не опрашивая базу. Между процессами (supervisor)
+    по-прежнему работает только busy_timeout.
+    """
+    locks: dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+    def _lock() -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = locks.get(loop)
+        if lock is None:
+            for closed in [other for other in locks if other.is_closed()]:
+                del locks[closed]
+            lock = locks[loop] = asyncio.Lock()
+        return lock
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _acquire(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get(WRITE_LOCK_KEY) is not None or context is None:
+            return
+        if not (context.isinsert or context.isupdate or context.isdelete):
+            return
+        lock = _lock()
+        try:
+            await_only(asyncio.wait_for(lock.acquire(), timeout))
+        except asyncio.TimeoutError:
+            raise exc.TimeoutError(f"SQLite write lock not acquired in {timeout:g} s") from None
+        conn.info[WRITE_LOCK_KEY] = lock
+
+    # Отпускаем, когда соединение вернулось в пул: к этому времени коммит или откат
+    # транзакции уже выполнен, и следующий писатель не столкнётся с ним в busy handler
+    @event.listens_for(engine.sync_engine, "checkin")
+    def _release(dbapi_connection, connection_record):
+        lock = connection_record.info.pop(WRITE_LOCK_KEY, None)
+        if lock is not None:
+            lock.release()
+
+    @event.listens_for(engine.sync_engine, "invalidate")
+    def _release_invalidated(dbapi_connection, connection_record, exception):
+        _release(dbapi_connection, connection_record)
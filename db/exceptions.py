@@ -2,8 +2,9 @@ from sqlalchemy.exc import SQLAlchemyError
 
 class CrudError(SQLAlchemyError):
     def __init__(self, message: str = "An error occurred during a CRUD operation"):
-        self._message = message
-        super().__init__(self._message)
+        # Не _message: в SQLAlchemy 2.x это метод, которым str(exception) собирает текст ошибки
+        self.message = message
+        super().__init__(self.message)
 
 class NotFoundError(CrudError):
     def __init__(self, entity: str = "Entity", identifier: object = None):
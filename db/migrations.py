@@ -0,0 +1,76 @@
+"""
+Версионированные миграции схемы. Применяются по порядку при старте (init_models),
+номер каждой применённой миграции записывается в таблицу schema_version.
+
+Новая миграция - это функция `async def upgrade(db: AsyncSession)` и запись в MIGRATIONS
+со следующим по порядку номером. Миграции должны быть идемпотентными: на свежей базе
+create_all уже создаёт всё, что объявлено в моделях.
+"""
+from dataclasses import dataclass
+from logging import Logger
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.exceptions import CrudError
+from db.models import SchemaVersion, Scores
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[AsyncSession], Awaitable[None]]
+
+
+def _create_index(table, name: str):
+    index = next(index for index in table.indexes if index.name == name)
+
+    async def upgrade(db: AsyncSession) -> None:
+        connection = await db.connection()
+        await connection.run_sync(index.create, checkfirst=True)
+
+    return upgrade
+
+
+async def _backfill_score_rollups(db: AsyncSession) -> None:
+    from db.crud import rebuild_score_rollups
+    await rebuild_score_rollups(db)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "scores(user_id, subject_id, created_at) index",
+              _create_index(Scores.__table__, "ix_scores_user_subject_created")),
+    Migration(2, "backfill score_rollups from scores", _backfill_score_rollups),
+    Migration(3, "scores(user_id, created_at, id) index for history pages",
+              _create_index(Scores.__table__, "ix_scores_user_created")),
+]
+
+
+async def get_schema_version(db: AsyncSession) -> int:
+    versions = await db.scalars(select(SchemaVersion.version))
+    return max(versions, default=0)
+
+
+async def apply_migrations(db: AsyncSession, logger: Logger = None) -> int:
+    """
+    Apply pending migrations in order, each one in its own transaction.
+    Returns the resulting schema version.
+    """
+    current = await get_schema_version(db)
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version <= current:
+            continue
+        if logger:
+            logger.info(f"Applying migration {migration.version}: {migration.description}")
+        try:
+            await migration.upgrade(db)
+            db.add(SchemaVersion(version=migration.version, description=migration.description))
+            await db.commit()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise CrudError(f"Migration {migration.version} failed") from e
+        current = migration.version
+    return current
@@ -3,7 +3,7 @@ import datetime
 from db.database import Base
 from sqlalchemy.orm import mapped_column, relationship, Mapped
 from sqlalchemy.sql import func
-from sqlalchemy import Integer, String, Boolean, DateTime, Date, ForeignKey
+from sqlalchemy import Integer, String, Boolean, DateTime, Date, Float, JSON, ForeignKey, Index
 
 
 class User(Base):
@@ -15,17 +15,21 @@ class User(Base):
     last_name: Mapped[str | None] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+    # Коллекции не грузятся неявно: нужные запросы подключают selectinload() сами
     scores: Mapped[list["Scores"]] = relationship(
         "Scores", 
         back_populates="user", 
         cascade="all, delete-orphan", 
-        lazy="selectin"
+        passive_deletes=True,
+        lazy="raise"
     )
     
     subject_associations: Mapped[list["UserSubjectAssociation"]] = relationship(
         "UserSubjectAssociation",
         back_populates="user",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise"
     )
 
     def __repr__(self):
@@ -57,12 +61,13 @@ class Subject(Base):
         "Scores", 
         back_populates="subject", 
         cascade="all, delete-orphan", 
-        lazy="selectin"
+        lazy="raise"
     )
     
     user_associations: Mapped[list["UserSubjectAssociation"]] = relationship(
         "UserSubjectAssociation",
-        back_populates="subject"
+        back_populates="subject",
+        lazy="raise"
     )
 
     def __repr__(self):
@@ -71,6 +76,10 @@ class Subject(Base):
 
 class Scores(Base):
     __tablename__ = "scores"
+    __table_args__ = (
+        Index("ix_scores_user_subject_created", "user_id", "subject_id", "created_at"),
+        Index("ix_scores_user_created", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -88,6 +97,30 @@ class Scores(Base):
         return f"<Scores(id={self.id}, user_id={self.user_id}, subject={self.subject_name}, score={self.score})>"
 
 
+class ScoreRollup(Base):
+    """
+    Агрегаты по баллам пользователя в предмете. Поддерживаются в той же транзакции
+    функциями crud.add_score / edit_existing_score / delete_score_by_id.
+    """
+    __tablename__ = "score_rollups"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    subject_id: Mapped[str] = mapped_column(String, ForeignKey("subjects.id"), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sum: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    min: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_score: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_at: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return f"<ScoreRollup(user_id={self.user_id}, subject_id={self.subject_id}, count={self.count})>"
+
+
 class Exams(Base):
     __tablename__ = "exams"
 
@@ -100,4 +133,32 @@ class Exams(Base):
     subject: Mapped["Subject"] = relationship("Subject")
 
     def __repr__(self):
-        return f"<Exams(subject={self.subject_name}, exam_date={self.exam_date})>"
\ No newline at end of file
+        return f"<Exams(subject={self.subject_name}, exam_date={self.exam_date})>"
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    description: Mapped[str] = mapped_column(String, nullable=False)
+    applied_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<SchemaVersion(version={self.version}, description={self.description})>"
+
+
+class ConversationState(Base):
+    """
+    FSM-состояние диалога и его данные (DatabaseStateStorage).
+    Ключ строится как в telebot: prefix:bot_id:chat_id:user_id.
+    """
+    __tablename__ = "conversation_states"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    state: Mapped[str | None] = mapped_column(String, nullable=True)
+    data: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    # Unix time; просроченные записи не читаются и удаляются фоновой очисткой пачками
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ConversationState(key={self.key}, state={self.state})>"
@@ -0,0 +1,197 @@
+"""
+Профилировщик SQL-запросов по обновлениям.
+
+События движка считают запросы и время и пишут их в профиль текущего
+обработчика (contextvar, его открывает make_registered_handler). Строки
+INSERT/UPDATE/DELETE (и с RETURNING) считаются по rowcount, строки выборок - по
+результату Session.execute (потоковые выборки, stream/yield_per, не считаются).
+Запросы сводятся к "форме" - тексту с параметрами, где списки IN (?, ?, ...) схлопнуты;
+одна форма, выполненная за обновление SQL_REPEAT_THRESHOLD раз и больше,
+помечается как возможный N+1. Запросы дольше SQL_SLOW_QUERY_MS пишутся в лог сразу.
+
+assert_query_budget ограничивает число запросов в блоке кода (для проверок и бенчмарков).
+"""
+from __future__ import annotations
+
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from config import SQL_SLOW_QUERY_MS, SQL_REPEAT_THRESHOLD
+
+_PLACEHOLDER = r"\s*(?:\?|%\(\w+\)s|\$\d+(?:::\w+)?|:\w+)\s*"
+# Только списки после IN: VALUES (?, ?, ...) - это столбцы одной строки, а не длина списка
+_IN_LIST = re.compile(rf"\bIN\s*\((?:{_PLACEHOLDER},)+{_PLACEHOLDER}\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+SHAPE_CACHE_SIZE = 1024
+
+
+class UpdateProfile:
+    """Statements executed while handling one update."""
+    __slots__ = ("name", "parent", "statements", "rows", "elapsed", "shapes", "slow")
+
+    def __init__(self, name: str, parent: UpdateProfile | None = None):
+        self.name = name
+        self.parent = parent
+        self.statements = 0
+        self.rows = 0
+        self.elapsed = 0.0
+        # форма запроса -> [сколько раз, суммарное время]
+        self.shapes: dict[str, list] = {}
+        self.slow: list[tuple[str, float]] = []
+
+    def record(self, shape: str, rows: int, elapsed: float, slow: bool) -> None:
+        self.statements += 1
+        self.rows += rows
+        self.elapsed += elapsed
+        stats = self.shapes.get(shape)
+        if stats is None:
+            self.shapes[shape] = [1, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+        if slow:
+            self.slow.append((shape, elapsed))
+
+    def add_rows(self, rows: int) -> None:
+        self.rows += rows
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times (N+1 candidates)."""
+        return [(shape, stats[0]) for shape, stats in self.shapes.items() if stats[0] >= threshold]
+
+    def format(self) -> str:
+        lines = [f"{self.name}: {self.statements} statements, {self.rows} rows, {self.elapsed * 1000:.1f} ms"]
+        for shape, (count, elapsed) in sorted(self.shapes.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {count}x {elapsed * 1000:.1f} ms  {shape}")
+        return "\n".join(lines)
+
+
+current_profile: ContextVar[UpdateProfile | None] = ContextVar("current_profile", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryProfiler:
+    def __init__(self, slow_threshold: float = SQL_SLOW_QUERY_MS / 1000, repeat_threshold: int = SQL_REPEAT_THRESHOLD,
+                 logger: logging.Logger = None):
+        self.slow_threshold = slow_threshold
+        self.repeat_threshold = repeat_threshold
+        self.logger = logger or logging.getLogger(__name__)
+        self._shapes: dict[str, str] = {}
+        self._engines: set[int] = set()
+
+    def shape(self, statement: str) -> str:
+        shape = self._shapes.get(statement)
+        if shape is None:
+            shape = _SPACES.sub(" ", _IN_LIST.sub("IN (...)", statement)).strip()
+            if len(self._shapes) >= SHAPE_CACHE_SIZE:
+                self._shapes.clear()
+            self._shapes[statement] = shape
+        return shape
+
+    def install(self, engine: AsyncEngine) -> None:
+        if id(engine.sync_engine) in self._engines:
+            return
+        self._engines.add(id(engine.sync_engine))
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["profiler_started"].pop()
+            profile = current_profile.get()
+            slow = elapsed >= self.slow_threshold
+            if profile is None and not slow:
+                return
+            shape = self.shape(statement)
+            if slow:
+                where = f" in {profile.name}" if profile is not None else ""
+                self.logger.warning(f"Slow query{where}: {elapsed * 1000:.0f} ms {shape}")
+            # INSERT/UPDATE/DELETE (в том числе с RETURNING) считаются по rowcount,
+            # строки выборок досчитывает _count_result_rows, когда результат уже получен
+            dml = cursor.description is None or context.isinsert or context.isupdate or context.isdelete
+            rows = max(cursor.rowcount, 0) if dml else 0
+            while profile is not None:
+                profile.record(shape, rows, elapsed, slow)
+                profile = profile.parent
+
+        @event.listens_for(engine.sync_engine, "handle_error")
+        def _error(context):
+            started = context.connection.info.get("profiler_started") if context.connection is not None else None
+            if started:
+                started.pop()
+
+        if not event.contains(Session, "do_orm_execute", _count_result_rows):
+            event.listen(Session, "do_orm_execute", _count_result_rows)
+
+    @contextmanager
+    def profile(self, name: str, report: bool = True) -> Iterator[UpdateProfile]:
+        """Collect statements executed inside the block; nested profiles also count into outer ones."""
+        profile = UpdateProfile(name, parent=current_profile.get())
+        token = current_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            current_profile.reset(token)
+            if report:
+                self.report(profile)
+
+    def report(self, profile: UpdateProfile) -> None:
+        for shape, count in profile.repeated(self.repeat_threshold):
+            self.logger.warning(f"Possible N+1 in {profile.name}: {count}x {shape}")
+        if self.logger.isEnabledFor(logging.DEBUG) and profile.statements:
+            self.logger.debug(profile.format())
+
+
+def _count_result_rows(orm_execute_state: ORMExecuteState):
+    """
+    Buffer the result of a Session.execute to count its rows. The async session buffers
+    results anyway, so this costs one extra list; streamed results are left alone.
+    """
+    profile = current_profile.get()
+    if profile is None or orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        return None
+    options = orm_execute_state.execution_options
+    if options.get("stream_results") or options.get("yield_per"):
+        return None
+    result = orm_execute_state.invoke_statement()
+    if getattr(result, "returns_rows", True) is False:
+        return result
+    frozen = result.freeze()
+    rows = len(frozen.data)
+    while profile is not None:
+        profile.add_rows(rows)
+        profile = profile.parent
+    return frozen()
+
+
+query_profiler = QueryProfiler()
+
+
+@contextmanager
+def assert_query_budget(max_statements: int, allow_repeated: bool = True) -> Iterator[UpdateProfile]:
+    """
+    Fail with QueryBudgetExceeded if the block runs more than `max_statements` statements
+    (or, with allow_repeated=False, any N+1 candidate).
+
+        with assert_query_budget(3):
+            await handler(update)
+    """
+    with query_profiler.profile("query budget", report=False) as profile:
+        yield profile
+    if profile.statements > max_statements:
+        raise QueryBudgetExceeded(f"{profile.statements} statements, budget {max_statements}\n{profile.format()}")
+    if not allow_repeated and profile.repeated(query_profiler.repeat_threshold):
+        raise QueryBudgetExceeded(f"Repeated statements\n{profile.format()}")
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from logging import Logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import ADMIN_IDS
+from utils.obertka import make_registered_handler
+from utils.metrics import metrics
+
+
+def register_handlers(bot: AsyncTeleBot, logger: Logger = None):
+    if logger:
+        logger.info("Registering admin handlers")
+
+    handler_metrics = make_registered_handler(metrics_handler, bot=bot, logger=logger)
+    bot.register_message_handler(
+        handler_metrics,
+        commands=["metrics"],
+        func=lambda message: message.from_user.id in ADMIN_IDS
+    )
+
+
+async def metrics_handler(message: types.Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    """Сводка метрик процесса, только для ADMIN_IDS"""
+    await bot.send_message(message.chat.id, f"📈 Метрики\n\n{metrics.summary()}")
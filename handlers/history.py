@@ -0,0 +1,179 @@
+from __future__ import annotations
+from telebot.types import Message
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from logging import Logger
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import crud
+from db.exceptions import ScoreNotFoundError
+
+from utils.obertka import make_registered_handler
+from utils.states import SpecialStates
+from utils.subjects import subject_registry
+from utils.bot_utils import respond, set_state_with_data, get_state_data
+from utils.validators import TelegramEvent
+from utils.callbacks import get_callback_router, parse_callback, HISTORY_PAGE, HISTORY_DELETE, HISTORY_EDIT
+from utils.responses import PreparedMarkup
+
+HISTORY_PAGE_SIZE = 5
+
+# Курсор страницы в callback_data (utils.callbacks.HISTORY_PAGE)
+FIRST_PAGE = "f"
+
+BACK_TO_HISTORY = PreparedMarkup.from_rows([[HISTORY_PAGE.button("📜 К истории", FIRST_PAGE)]])
+
+
+def register_handlers(bot: AsyncTeleBot, logger: Logger = None):
+    if logger:
+        logger.info("Registering history handlers")
+
+    handler_history = make_registered_handler(history_handler, bot=bot, logger=logger)
+    bot.register_message_handler(handler_history, commands=["history", "история"])
+    router = get_callback_router(bot)
+    router.route(HISTORY_PAGE, handler_history)
+    router.route(HISTORY_DELETE, handler_history)
+
+    handler_edit_callback = make_registered_handler(history_edit_callback_handler, bot=bot, logger=logger)
+    router.route(HISTORY_EDIT, handler_edit_callback)
+
+    handler_edit_input = make_registered_handler(history_edit_input_handler, bot=bot, logger=logger)
+    bot.register_message_handler(
+        handler_edit_input,
+        state=SpecialStates.WAITING_FOR_SCORE_EDIT
+    )
+
+
+def _parse_cursor(cursor: str) -> tuple[int | None, bool]:
+    """Returns (anchor_id, newer)"""
+    if cursor[:1] in ("o", "n") and cursor[1:].isdigit():
+        return int(cursor[1:]), cursor[0] == "n"
+    return None, False
+
+
+def _format_score(score) -> str:
+    date = score.exam_date or score.created_at
+    date_text = date.strftime('%d.%m.%Y') if date else "—"
+    return f"{date_text} · {subject_registry.name(score.subject_id) or score.subject_name} — {score.score}"
+
+
+async def _send_history_page(bot: AsyncTeleBot, db: AsyncSession, event: Message | types.CallbackQuery,
+                             user_id: int, cursor: str):
+    anchor_id, newer = _parse_cursor(cursor)
+    scores, has_more = await crud.get_scores_page(db, user_id, anchor_id=anchor_id, newer=newer, limit=HISTORY_PAGE_SIZE)
+
+    if not scores and anchor_id is not None:
+        # Якорная запись удалена или страница опустела - начинаем сначала
+        cursor = FIRST_PAGE
+        anchor_id, newer = None, False
+        scores, has_more = await crud.get_scores_page(db, user_id, limit=HISTORY_PAGE_SIZE)
+
+    if not scores:
+        await respond(bot, event, "📭 У вас пока нет сохранённых результатов.\nДобавьте первые баллы через /add_score")
+        return
+
+    has_newer = anchor_id is not None and (has_more if newer else True)
+    has_older = has_more if not newer else True
+
+    message_text = "📜 *История результатов*\n\n"
+    message_text += "\n".join(f"• {_format_score(score)}" for score in scores)
+
+    markup = types.InlineKeyboardMarkup()
+    for score in scores:
+        markup.row(
+            HISTORY_EDIT.button(f"✏️ {_format_score(score)}", score.id),
+            HISTORY_DELETE.button("🗑", score.id, cursor),
+        )
+
+    navigation = []
+    if has_newer:
+        navigation.append(HISTORY_PAGE.button("⬅️ Новее", f"n{scores[0].id}"))
+    if has_older:
+        navigation.append(HISTORY_PAGE.button("Старше ➡️", f"o{scores[-1].id}"))
+    if navigation:
+        markup.row(*navigation)
+
+    await respond(bot, event, message_text, reply_markup=markup, parse_mode="Markdown")
+
+
+async def history_handler(event: Message | types.CallbackQuery, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    telegram_event = TelegramEvent(event)
+
+    user = await crud.create_or_update_user(db, **telegram_event.from_user.__dict__)
+    user_id = user.id
+
+    cursor = FIRST_PAGE
+    callback = parse_callback(telegram_event.text) if telegram_event.is_callback else None
+    if callback and callback.action is HISTORY_PAGE:
+        cursor, = callback.values
+    elif callback and callback.action is HISTORY_DELETE:
+        score_id, cursor = callback.values
+        try:
+            await crud.delete_score_by_id(db, score_id, user_id=user_id)
+            if logger:
+                logger.info(f"User {user_id} deleted score {score_id}")
+        except ScoreNotFoundError:
+            pass
+
+    await _send_history_page(bot, db, event, user_id, cursor or FIRST_PAGE)
+
+
+async def history_edit_callback_handler(call: types.CallbackQuery, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    """Обработчик выбора записи для исправления балла (только callback)"""
+    user = await crud.create_or_update_user(db, **call.from_user.__dict__)
+    user_id = user.id
+
+    score_id, = parse_callback(call.data).values
+    try:
+        score = await crud.get_score_by_id(db, score_id, user_id=user_id)
+    except ScoreNotFoundError:
+        await respond(bot, call, "Запись не найдена. Откройте /history ещё раз")
+        return
+
+    await set_state_with_data(bot, user_id, call.message.chat.id, SpecialStates.WAITING_FOR_SCORE_EDIT, score_id=score.id)
+
+    subject = subject_registry.get(score.subject_id)
+    max_score = subject.max_score if subject else 100
+    message_text = f"Запись: {_format_score(score)}\n\nВведите исправленный балл (от 0 до {max_score}):"
+    await respond(bot, call, message_text)
+
+
+async def history_edit_input_handler(message: types.Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    user = await crud.create_or_update_user(db, **message.from_user.__dict__)
+    user_id = user.id
+
+    try:
+        new_value = int(message.text)
+    except (TypeError, ValueError):
+        await bot.send_message(message.chat.id, "Пожалуйста, введите корректное число")
+        return
+
+    score_id = (await get_state_data(bot, user_id, message.chat.id)).get("score_id")
+    if not score_id:
+        await bot.send_message(message.chat.id, "Что-то пошло не так. Пожалуйста, выберите запись заново в /history")
+        await bot.delete_state(user_id, chat_id=message.chat.id)
+        return
+
+    try:
+        score = await crud.get_score_by_id(db, score_id, user_id=user_id)
+    except ScoreNotFoundError:
+        score = None
+
+    if score is None:
+        await bot.delete_state(user_id, chat_id=message.chat.id)
+        await bot.send_message(message.chat.id, "Запись уже удалена")
+        return
+
+    subject = subject_registry.get(score.subject_id)
+    max_score = subject.max_score if subject else 100
+    if not 0 <= new_value <= max_score:
+        await bot.send_message(message.chat.id, f"Пожалуйста, введите число от 0 до {max_score}")
+        return
+
+    await bot.delete_state(user_id, chat_id=message.chat.id)
+
+    updated = await crud.edit_existing_score(db, score_id, new_value, user_id=user_id)
+
+    await bot.send_message(message.chat.id, f"✅ Балл исправлен: {_format_score(updated)}", reply_markup=BACK_TO_HISTORY)
+
+    if logger:
+        logger.info(f"User {user_id} edited score {score_id} -> {new_value}")
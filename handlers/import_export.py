@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+import io
+import tempfile
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from logging import Logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import ADMIN_IDS
+from db import crud
+from db.database import after_unit_of_work, commit_unit_of_work
+from utils.obertka import make_registered_handler
+from utils.states import SpecialStates
+from utils.score_import import iter_score_rows, RejectedRow
+from utils.score_export import parse_export_format, write_scores_export
+
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024  # Bot API не отдаёт файлы больше 20 МБ
+MAX_REPORTED_ERRORS = 10
+# Выгрузка держится в памяти до этого размера, дальше уходит во временный файл на диске
+EXPORT_SPOOL_SIZE = 4 * 1024 * 1024
+
+IMPORT_HELP_TEXT = (
+    "📥 Пришлите CSV или TSV файл с результатами.\n\n"
+    "Колонки: предмет, балл, дата (необязательно).\n"
+    "Первая строка может быть заголовком: subject,score,exam_date\n"
+    "Предмет — код (physics) или название (Физика), дата — 2024-05-30 или 30.05.2024."
+)
+
+
+def register_handlers(bot: AsyncTeleBot, logger: Logger = None):
+    if logger:
+        logger.info("Registering import and export handlers")
+
+    handler_import = make_registered_handler(import_command_handler, bot=bot, logger=logger)
+    bot.register_message_handler(handler_import, commands=["import"])
+
+    handler_import_file = make_registered_handler(import_file_handler, bot=bot, logger=logger)
+    bot.register_message_handler(
+        handler_import_file,
+        content_types=["document"],
+        func=lambda message: (message.caption or "").startswith("/import")
+    )
+    bot.register_message_handler(
+        handler_import_file,
+        content_types=["document"],
+        state=SpecialStates.AWAITING_IMPORT_FILE
+    )
+
+    handler_export = make_registered_handler(export_handler, bot=bot, logger=logger)
+    bot.register_message_handler(handler_export, commands=["export"])
+
+    handler_export_all = make_registered_handler(export_all_handler, bot=bot, logger=logger)
+    bot.register_message_handler(
+        handler_export_all,
+        commands=["export_all"],
+        func=lambda message: message.from_user.id in ADMIN_IDS
+    )
+
+
+async def import_command_handler(message: types.Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    user = await crud.create_or_update_user(db, **message.from_user.__dict__)
+    await bot.set_state(user.id, SpecialStates.AWAITING_IMPORT_FILE, message.chat.id)
+    await bot.send_message(message.chat.id, IMPORT_HELP_TEXT)
+
+
+def _detect_encoding(content: bytes) -> str:
+    # Excel в русской локали сохраняет CSV в cp1251
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(content[:65536], final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+async def import_file_handler(message: types.Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    user = await crud.create_or_update_user(db, **message.from_user.__dict__)
+    user_id = user.id
+    await bot.delete_state(user_id, chat_id=message.chat.id)
+    # Скачивание и разбор файла идут вне транзакции, каждая пачка фиксируется отдельно
+    await commit_unit_of_work(db)
+
+    document = message.document
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+        await bot.send_message(message.chat.id, "Файл слишком большой, максимум 20 МБ")
+        return
+
+    file_info = await bot.get_file(document.file_id)
+    content = await bot.download_file(file_info.file_path)
+    lines = io.TextIOWrapper(io.BytesIO(content), encoding=_detect_encoding(content), errors="replace", newline="")
+
+    accepted = 0
+    rejected = 0
+    errors: list[RejectedRow] = []
+    batch: list[dict] = []
+    for row in iter_score_rows(lines):
+        if isinstance(row, RejectedRow):
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(row)
+            continue
+
+        batch.append({
+            "subject_id": row.subject_id,
+            "subject_name": row.subject_name,
+            "score": row.score,
+            "exam_date": row.exam_date,
+        })
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            accepted += await crud.add_scores_bulk(db, user_id, batch)
+            await commit_unit_of_work(db)
+            batch = []
+            # Отдаём управление циклу событий, чтобы большой файл не задерживал других пользователей
+            await asyncio.sleep(0)
+
+    if batch:
+        accepted += await crud.add_scores_bulk(db, user_id, batch)
+
+    message_text = f"📥 Импорт завершён\n\n✅ Принято: {accepted}\n❌ Отклонено: {rejected}"
+    if errors:
+        message_text += "\n\nОшибки:\n" + "\n".join(f"• строка {error.line}: {error.reason}" for error in errors)
+        if rejected > len(errors):
+            message_text += f"\n• … и ещё {rejected - len(errors)}"
+
+    await bot.send_message(message.chat.id, message_text)
+
+    if logger:
+        logger.info(f"User {user_id} imported {accepted} scores, rejected {rejected}")
+
+
+async def _send_export(bot: AsyncTeleBot, chat_id: int, out, **kwargs) -> None:
+    """
+    Send the spooled export and close it. Inside a unit of work the send runs after the commit,
+    so the file has to outlive the handler instead of being closed by a with block.
+    """
+    async def send():
+        with out:
+            out.seek(0)
+            await bot.send_document(chat_id, out, **kwargs)
+
+    await after_unit_of_work(send)
+
+
+async def export_handler(message: types.Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    user = await crud.create_or_update_user(db, **message.from_user.__dict__)
+    export_format = parse_export_format(message.text)
+    goals = await crud.get_user_goals(db, user.id)
+    # Выгрузка только читает: запись пользователя фиксируем до неё
+    await commit_unit_of_work(db)
+
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        count = await write_scores_export(out, export_format, crud.stream_scores(db, user_id=user.id), goals=goals)
+    except BaseException:
+        out.close()
+        raise
+    if count == 0 and not goals:
+        out.close()
+        await bot.send_message(message.chat.id, "📭 У вас пока нет сохранённых результатов и целей")
+        return
+    await _send_export(
+        bot,
+        message.chat.id,
+        out,
+        visible_file_name=f"ege_scores_{user.id}.{export_format}",
+        caption=f"📤 Результатов: {count}, целей: {len(goals)}"
+    )
+
+
+async def export_all_handler(message: types.Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
+    """Выгрузка всей таблицы scores, только для ADMIN_IDS"""
+    export_format = parse_export_format(message.text)
+
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        count = await write_scores_export(out, export_format, crud.stream_scores(db), include_user_id=True)
+    except BaseException:
+        out.close()
+        raise
+    await _send_export(
+        bot,
+        message.chat.id,
+        out,
+        visible_file_name=f"ege_scores_all.{export_format}",
+        caption=f"📤 Всего результатов: {count}"
+    )
+
+    if logger:
+        logger.info(f"Admin {message.from_user.id} exported {count} scores")
@@ -7,9 +7,15 @@ async def register_all_handlers(bot: AsyncTeleBot, logger: Logger = None):
     from handlers.goals_and_subjects import register_handlers as _register_goals
     from handlers.profile import register_handlers as _register_profile
     from handlers.simple_stats import register_handlers as _register_stats
+    from handlers.import_export import register_handlers as _register_import_export
+    from handlers.history import register_handlers as _register_history
+    from handlers.admin import register_handlers as _register_admin
 
     _register_start(bot, logger=logger)
     _register_goals(bot, logger=logger)
     _register_profile(bot, logger=logger)
     _register_stats(bot, logger=logger)
+    _register_import_export(bot, logger=logger)
+    _register_history(bot, logger=logger)
+    _register_admin(bot, logger=logger)
     
\ No newline at end of file
@@ -3,18 +3,16 @@ from telebot.async_telebot import AsyncTeleBot
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from utils.obertka import make_registered_handler
+from utils.callbacks import get_callback_router, SHOW_STATS
 from utils.stats import prepare_simple_chart_data, get_simple_stats
-from utils.simple_charts import generate_simple_progress_chart
+from utils.simple_charts import render_simple_progress_chart
 from db import crud
+from db.database import commit_unit_of_work
 
 def register_handlers(bot: AsyncTeleBot, logger=None):
     handler = make_registered_handler(stats_handler, bot=bot, logger=logger)
     bot.register_message_handler(handler, commands=["stats", "график"])
-    
-    bot.register_callback_query_handler(
-        handler,
-        func=lambda call: call.data == "show_stats"
-    )
+    get_callback_router(bot).route(SHOW_STATS, handler)
 
 async def stats_handler(message: types.Message, db: AsyncSession, logger, bot: AsyncTeleBot):
     user = await crud.create_or_update_user(db, **message.from_user.__dict__)
@@ -29,11 +27,14 @@ async def stats_handler(message: types.Message, db: AsyncSession, logger, bot: A
         )
         return
     
+    # Дальше база не нужна: отрисовка не должна держать транзакцию и блокировку записи
+    await commit_unit_of_work(db)
+
     # Подготавливаем данные для графика
     chart_data = prepare_simple_chart_data(scores)
     
     # Генерируем график
-    chart_buffer = generate_simple_progress_chart(chart_data)
+    chart_buffer = await render_simple_progress_chart(chart_data)
     
     # Генерируем текст статистики для подписи
     stats_text = get_simple_stats(scores)
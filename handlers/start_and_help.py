@@ -10,6 +10,42 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from db import crud
 from utils.obertka import make_registered_handler
+from utils.responses import MAIN_MENU
+
+
+# Тексты собираются один раз при импорте, в ответ подставляется только имя
+START_TEXT = (
+    "📚 **Это бот для учёта баллов ЕГЭ**\n\n"
+    "✨ **Что можно делать:**\n"
+    "• 📝 Сохранять результаты пробных тестов\n"
+    "• 🎯 Ставить цели по предметам\n"
+    "• 📊 Отслеживать прогресс подготовки\n"
+    "• 📈 Анализировать статистику\n"
+    "• 🏆 Достигать учебных целей\n\n"
+    "🚀 **Начни с выбора предметов** или используй кнопки ниже!\n"
+    "ℹ️ Подробнее — /help"
+)
+
+HELP_TEXT = (
+    "📚 **Помощь по боту для подготовки к ЕГЭ**\n\n"
+    "🎯 **Основные команды:**\n"
+    "`/start` — Начало работы, главное меню\n"
+    "`/profile` — Ваш профиль и статистика\n\n"
+    "📖 **Работа с предметами:**\n"
+    "`/subjects` — Выбрать предметы для сдачи\n"
+    "`/set_subjects` — То же самое\n\n"
+    "🏆 **Цели и результаты:**\n"
+    "`/set_desired_score` — Установить желаемый балл\n"
+    "`/add_score` — Добавить результат теста\n"
+    "`/history` — История результатов, исправление и удаление\n"
+    "`/import` — Загрузить результаты из CSV/TSV файла\n"
+    "`/export` — Выгрузить результаты и цели (`/export jsonl` — в JSONL)\n\n"
+    "🔄 **Рабочий процесс:**\n"
+    "1️⃣ **Выбери предметы** → `/subjects`\n"
+    "2️⃣ **Добавь первый результат** → `/add_score`\n"
+    "3️⃣ **Поставь цели** → `/set_desired_score`\n"
+    "4️⃣ **Следи за прогрессом** → `/profile`\n\n"
+)
 
 
 def register_handlers(bot: AsyncTeleBot, logger: Logger = None):
@@ -26,30 +62,10 @@ def register_handlers(bot: AsyncTeleBot, logger: Logger = None):
 async def handle_start(message: Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
     await crud.create_or_update_user(db, **message.from_user.__dict__)
     
-    markup = types.InlineKeyboardMarkup(row_width=2)
-    buttons = [
-        types.InlineKeyboardButton("📚 Выбрать предметы", callback_data="subjects"),
-        types.InlineKeyboardButton("➕ Добавить балл", callback_data="add_score"),
-        types.InlineKeyboardButton("🎯 Установить цель", callback_data="set_desired_score"),
-        types.InlineKeyboardButton("📊 Профиль", callback_data="profile"),
-    ]
-    markup.add(*buttons)
-    
-    message_text = f"👋 Привет, {message.from_user.first_name}!\n\n"
-    message_text += f"📚 **Это бот для учёта баллов ЕГЭ**\n\n"
-    message_text += f"✨ **Что можно делать:**\n"
-    message_text += f"• 📝 Сохранять результаты пробных тестов\n"
-    message_text += f"• 🎯 Ставить цели по предметам\n"
-    message_text += f"• 📊 Отслеживать прогресс подготовки\n"
-    message_text += f"• 📈 Анализировать статистику\n"
-    message_text += f"• 🏆 Достигать учебных целей\n\n"
-    message_text += f"🚀 **Начни с выбора предметов** или используй кнопки ниже!\n"
-    message_text += f"ℹ️ Подробнее — /help"
-    
     await bot.send_message(
         chat_id=message.chat.id, 
-        text=message_text, 
-        reply_markup=markup,
+        text=f"👋 Привет, {message.from_user.first_name}!\n\n" + START_TEXT, 
+        reply_markup=MAIN_MENU,
         parse_mode="Markdown"
     )
 
@@ -57,38 +73,9 @@ async def handle_start(message: Message, db: AsyncSession, logger: Logger, bot:
 async def handle_help(message: Message, db: AsyncSession, logger: Logger, bot: AsyncTeleBot):
     await crud.create_or_update_user(db, **message.from_user.__dict__)
     
-    help_text = f"📚 **Помощь по боту для подготовки к ЕГЭ**\n\n"
-    
-    help_text += f"🎯 **Основные команды:**\n"
-    help_text += f"`/start` — Начало работы, главное меню\n"
-    help_text += f"`/profile` — Ваш профиль и статистика\n\n"
-    
-    help_text += f"📖 **Работа с предметами:**\n"
-    help_text += f"`/subjects` — Выбрать предметы для сдачи\n"
-    help_text += f"`/set_subjects` — То же самое\n\n"
-    
-    help_text += f"🏆 **Цели и результаты:**\n"
-    help_text += f"`/set_desired_score` — Установить желаемый балл\n"
-    help_text += f"`/add_score` — Добавить результат теста\n\n"
-    
-    help_text += f"🔄 **Рабочий процесс:**\n"
-    help_text += f"1️⃣ **Выбери предметы** → `/subjects`\n"
-    help_text += f"2️⃣ **Добавь первый результат** → `/add_score`\n"
-    help_text += f"3️⃣ **Поставь цели** → `/set_desired_score`\n"
-    help_text += f"4️⃣ **Следи за прогрессом** → `/profile`\n\n"
-        
-    markup = types.InlineKeyboardMarkup(row_width=2)
-    buttons = [
-        types.InlineKeyboardButton("📚 Выбрать предметы", callback_data="subjects"),
-        types.InlineKeyboardButton("➕ Добавить балл", callback_data="add_score"),
-        types.InlineKeyboardButton("🎯 Установить цель", callback_data="set_desired_score"),
-        types.InlineKeyboardButton("📊 Профиль", callback_data="profile"),
-    ]
-    markup.add(*buttons)
-    
     await bot.send_message(
         chat_id=message.chat.id, 
-        text=help_text, 
-        reply_markup=markup,
+        text=HELP_TEXT, 
+        reply_markup=MAIN_MENU,
         parse_mode="Markdown"
-    )
\ No newline at end of file
+    )
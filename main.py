@@ -1,25 +1,61 @@
 import logging
 import asyncio 
 import sys
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 from telebot.async_telebot import AsyncTeleBot
+from telebot import asyncio_helper
 from telebot.asyncio_helper import ApiTelegramException
-from telebot.asyncio_storage.memory_storage import StateMemoryStorage
 from telebot.asyncio_filters import StateFilter
+from telebot.asyncio_storage.base_storage import StateStorageBase
 
 
-from config import BOT_TOKEN, DATABASE_URL
+from config import BOT_TOKEN, DATABASE_URL, BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, OUTBOUND_GLOBAL_RATE, TELEGRAM_API_URL, METRICS_HOST, METRICS_PORT, UPDATE_LOG_PATH
+
+if TYPE_CHECKING:
+    from utils.dispatcher import UpdateDispatcher
+    from utils.outbound import OutboundQueue
+    from utils.metrics import MetricsServer
+    from utils.update_log import UpdateRecorder
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', stream=sys.stdout)
 logger = logging.getLogger(__name__)
 
 
+def apply_api_url() -> None:
+    """Use a local Bot API server (or a stand-in) instead of api.telegram.org if configured."""
+    if TELEGRAM_API_URL:
+        asyncio_helper.API_URL = TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+        asyncio_helper.FILE_URL = TELEGRAM_API_URL.rstrip("/") + "/file/bot{0}/{1}"
+
+
 async def initiate_bot() -> AsyncTeleBot:
-    bot = AsyncTeleBot(BOT_TOKEN, state_storage=StateMemoryStorage(), colorful_logs=True)
+    apply_api_url()
+    from utils.state_storage import create_state_storage
+    bot = AsyncTeleBot(BOT_TOKEN, state_storage=create_state_storage(logger=logger), colorful_logs=True)
     logger.info("Bot initialized")
     return bot
 
 
+async def close_bot_session(bot: AsyncTeleBot) -> None:
+    # Сессия aiohttp создаётся при первом запросе к Bot API, её может и не быть
+    if asyncio_helper.session_manager.session is not None:
+        await bot.close_session()
+
+
+def open_update_log() -> "UpdateRecorder | None":
+    """Start recording incoming updates to UPDATE_LOG_PATH if it is set."""
+    if not UPDATE_LOG_PATH:
+        return None
+    from utils.update_log import UpdateRecorder, record_polled_updates
+    recorder = UpdateRecorder(UPDATE_LOG_PATH)
+    if BOT_MODE == "polling":
+        record_polled_updates(recorder)
+    logger.info(f"Recording updates to {UPDATE_LOG_PATH}")
+    return recorder
+
+
 async def on_startup():
     logger.info("Bot started successfully.")
 
@@ -34,31 +70,120 @@ async def initiate_database(needs_reset: bool = False, logger: logging.Logger =
     await init_models(needs_reset=needs_reset, logger=logger)
 
 
-
-
-async def main():
+async def load_reference_data(logger: logging.Logger = logger):
+    from db.database import AsyncSessionLocal
+    from db.crud import load_subject_registry
+    async with AsyncSessionLocal() as session:
+        await load_subject_registry(session, logger=logger)
+
+
+@dataclass
+class BotApp:
+    """Бот с зарегистрированными обработчиками и его фоновыми компонентами."""
+    bot: AsyncTeleBot
+    dispatcher: "UpdateDispatcher"
+    outbound: "OutboundQueue"
+    state_storage: StateStorageBase
+    metrics_server: "MetricsServer | None" = None
+
+    def stats(self) -> dict:
+        from db.crud import user_identity_cache
+        return {
+            "dispatcher": self.dispatcher.stats(),
+            "outbound": self.outbound.stats(),
+            "user_cache": user_identity_cache.stats(),
+        }
+
+    async def shutdown(self) -> None:
+        from utils.state_storage import KeyValueStateStorage
+        await self.dispatcher.drain()
+        await self.outbound.drain()
+        if isinstance(self.state_storage, KeyValueStateStorage):
+            await self.state_storage.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await close_bot_session(self.bot)
+
+
+async def build_bot(
+    init_database: bool = True,
+    outbound_rate: float = OUTBOUND_GLOBAL_RATE,
+    metrics_port: int = METRICS_PORT,
+    logger: logging.Logger = logger,
+) -> BotApp:
+    """
+    Create the bot with filters, state storage, outbound queue, handlers and dispatcher.
+    With init_database=False the schema is assumed to be ready (supervisor workers)
+    and only the subject registry is loaded. metrics_port=0 disables the metrics endpoint.
+    """
     bot = await initiate_bot()
     logging.info("Registering filters...")
     bot.add_custom_filter(StateFilter(bot))
-    
-    await initiate_database(needs_reset=False, logger=logger)
-    
-    from utils.bot_utils import register_bot_commands
-    await register_bot_commands(bot)
+
+    if init_database:
+        await initiate_database(needs_reset=False, logger=logger)
+    else:
+        await load_reference_data(logger=logger)
+
+    from utils.state_storage import KeyValueStateStorage
+    state_storage = bot.current_states
+    if isinstance(state_storage, KeyValueStateStorage):
+        state_storage.start()
+
+    from utils.outbound import OutboundQueue, RateLimitedBot
+    outbound = OutboundQueue(global_rate=outbound_rate, logger=logger)
 
     from handlers.register_all_handlers import register_all_handlers
-    await register_all_handlers(bot, logger=logger)
+    await register_all_handlers(RateLimitedBot(bot, outbound), logger=logger)
+
+    from utils.dispatcher import UpdateDispatcher
+    dispatcher = UpdateDispatcher(bot, logger=logger)
+    dispatcher.install(bot)
+
+    app = BotApp(bot=bot, dispatcher=dispatcher, outbound=outbound, state_storage=state_storage)
+
+    from db.database import engine
+    from utils.metrics import metrics, MetricsServer
+    metrics.install_db(engine)
+    metrics.install_api()
+    metrics.add_collector("bot", app.stats)
+    if metrics_port:
+        app.metrics_server = MetricsServer(logger=logger)
+        await app.metrics_server.start(METRICS_HOST, metrics_port)
+
+    return app
+
+
+async def main():
+    app = await build_bot()
+    bot = app.bot
+
+    from utils.bot_utils import register_bot_commands
+    await register_bot_commands(bot)
+    recorder = open_update_log()
 
     try:
         await on_startup()
-        logging.info("Polling started...")
-        await bot.infinity_polling(allowed_updates=[], skip_pending=True, request_timeout=30, logger_level=logging.DEBUG)
+        if BOT_MODE == "webhook":
+            from utils.webhook import run_webhook
+            logging.info("Webhook mode started...")
+            await run_webhook(
+                bot, WEBHOOK_URL, WEBHOOK_SECRET,
+                host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, dispatcher=app.dispatcher,
+                recorder=recorder, logger=logger
+            )
+        else:
+            logging.info("Polling started...")
+            await bot.infinity_polling(allowed_updates=[], skip_pending=True, request_timeout=30, logger_level=logging.DEBUG)
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
+        await app.shutdown()
+        if recorder is not None:
+            recorder.close()
         await on_shutdown()
         logger.info("Bot has been shut down.")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
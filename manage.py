@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_rollups(args: argparse.Namespace) -> None:
+    from db.database import AsyncSessionLocal, engine, init_models
+    from db.crud import rebuild_score_rollups
+
+    await init_models(needs_reset=False, logger=logger)
+    async with AsyncSessionLocal() as session:
+        count = await rebuild_score_rollups(session)
+    logger.info(f"Score rollups rebuilt: {count} rows")
+    await engine.dispose()
+
+
+async def migrate(args: argparse.Namespace) -> None:
+    from db.database import engine, init_models
+
+    await init_models(needs_reset=False, logger=logger)
+    await engine.dispose()
+
+
+async def export_scores(args: argparse.Namespace) -> None:
+    from db.database import AsyncSessionLocal, engine
+    from db.crud import stream_scores
+    from utils.score_export import write_scores_export
+
+    async with AsyncSessionLocal() as session:
+        with open(args.output, "wb") as out:
+            count = await write_scores_export(out, args.format, stream_scores(session), include_user_id=True)
+    logger.info(f"Exported {count} scores to {args.output}")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Служебные команды бота")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Создать таблицы и применить миграции схемы")
+    migrate_parser.set_defaults(handler=migrate)
+
+    rebuild_parser = subparsers.add_parser("rebuild-rollups", help="Пересчитать score_rollups по таблице scores")
+    rebuild_parser.set_defaults(handler=rebuild_rollups)
+
+    export_parser = subparsers.add_parser("export-scores", help="Выгрузить всю таблицу scores в файл")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    export_parser.set_defaults(handler=export_scores)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
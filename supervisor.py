@@ -0,0 +1,332 @@
+"""
+Запуск бота в нескольких процессах.
+
+Супервизор один принимает обновления (polling или webhook, как в main.py) и
+раскладывает их сырыми JSON-словарями по очередям воркеров: user_id % N.
+Все обновления одного пользователя попадают в один процесс и там идут по
+порядку через UpdateDispatcher, разные пользователи обрабатываются параллельно
+на разных ядрах. У каждого воркера свой пул соединений с БД и свои кэши.
+
+Упавший воркер перезапускается с новой очередью: убитый внутри get() процесс
+оставляет блокировку чтения старой захваченной. Что удаётся прочитать из
+старой очереди, переносится, остальное пишется в лог как потерянное. Метрики воркеров собираются и раз в SUPERVISOR_METRICS_INTERVAL
+пишутся в лог суммой.
+
+Состояния диалогов при перезапуске воркера сохраняются только с
+STATE_BACKEND=db или redis. SQLite у всех воркеров одна с одной блокировкой
+записи: при всплеске новых пользователей отдельные запросы ловят
+"database is locked", для нескольких воркеров лучше PostgreSQL (postgres-pooled).
+
+Запуск: python supervisor.py [--workers N]
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+from multiprocessing.process import BaseProcess
+
+from telebot import types
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+
+from config import (
+    BOT_TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+    DISPATCH_MAX_PENDING, OUTBOUND_GLOBAL_RATE, SUPERVISOR_WORKERS, SUPERVISOR_METRICS_INTERVAL,
+    METRICS_HOST, METRICS_PORT,
+)
+from main import (
+    logger, apply_api_url, build_bot, close_bot_session, initiate_database, open_update_log, on_startup, on_shutdown,
+)
+from utils.dispatcher import raw_update_key
+
+# Сколько обновлений воркер забирает из очереди за один переход в поток
+WORKER_BATCH_SIZE = 100
+RESTART_BACKOFF_MAX = 30.0
+# Воркер, проработавший дольше этого, считается стабильным и следующий перезапуск идёт без задержки
+STABLE_UPTIME = 60.0
+
+
+def _get_batch(updates: multiprocessing.Queue) -> list:
+    batch = [updates.get()]
+    while len(batch) < WORKER_BATCH_SIZE and batch[-1] is not None:
+        try:
+            batch.append(updates.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+async def _run_worker(index: int, workers: int, updates: multiprocessing.Queue, metrics: multiprocessing.Queue,
+                      metrics_interval: float) -> None:
+    worker_logger = logging.getLogger(f"worker-{index}")
+    # Глобальный лимит Bot API делится между процессами
+    app = await build_bot(
+        init_database=False,
+        outbound_rate=OUTBOUND_GLOBAL_RATE / workers,
+        # У каждого воркера свой эндпоинт: гистограммы обработчиков живут в его процессе
+        metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0,
+        logger=worker_logger,
+    )
+
+    async def report_metrics():
+        while True:
+            await asyncio.sleep(metrics_interval)
+            metrics.put({"worker": index, **app.stats()})
+
+    reporter = asyncio.create_task(report_metrics())
+    loop = asyncio.get_running_loop()
+    worker_logger.info(f"Worker {index} started")
+    try:
+        while True:
+            batch = await loop.run_in_executor(None, _get_batch, updates)
+            for raw_update in batch:
+                if raw_update is None:
+                    return
+                await app.dispatcher.submit(types.Update.de_json(raw_update))
+    finally:
+        reporter.cancel()
+        await app.shutdown()
+        metrics.put({"worker": index, **app.stats()})
+        worker_logger.info(f"Worker {index} stopped")
+
+
+def worker_main(index: int, workers: int, updates: multiprocessing.Queue, metrics: multiprocessing.Queue,
+                metrics_interval: float) -> None:
+    # Ctrl+C получает вся группа процессов; воркер останавливает супервизор через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, workers, updates, metrics, metrics_interval))
+
+
+def _sum_stats(stats: list[dict]) -> dict:
+    """Sum counters across workers; *_max fields take the maximum, averages, rates and ratios are dropped."""
+    total: dict = {}
+    for worker_stats in stats:
+        for key, value in worker_stats.items():
+            if isinstance(value, dict):
+                total[key] = _sum_stats([total.get(key, {}), value])
+            elif not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            elif key.endswith("_max"):
+                total[key] = max(total.get(key, value), value)
+            elif not key.endswith(("_avg", "_rate", "_ratio")):
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+class Supervisor:
+    def __init__(self, workers: int, metrics_interval: float = SUPERVISOR_METRICS_INTERVAL):
+        self.workers = workers
+        self.metrics_interval = metrics_interval
+        self._context = multiprocessing.get_context("spawn")
+        self.queues = [self._context.Queue(maxsize=DISPATCH_MAX_PENDING) for _ in range(workers)]
+        self.metrics = self._context.Queue()
+        self.processes: list[BaseProcess | None] = [None] * workers
+        self.started_at = [0.0] * workers
+        self.restarts = [0] * workers
+        self.routed = [0] * workers
+        self.worker_stats: dict[int, dict] = {}
+        self._stopping = False
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self.workers, self.queues[index], self.metrics, self.metrics_interval),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def _replace_queue(self, index: int) -> None:
+        old_queue = self.queues[index]
+        self.queues[index] = self._context.Queue(maxsize=DISPATCH_MAX_PENDING)
+        moved = 0
+        while True:
+            try:
+                self.queues[index].put_nowait(old_queue.get_nowait())
+                moved += 1
+            except (queue.Empty, queue.Full):
+                break
+        try:
+            lost = old_queue.qsize()
+        except NotImplementedError:  # macOS
+            lost = None
+        old_queue.cancel_join_thread()
+        old_queue.close()
+        logger.info(f"Worker {index} queue replaced: {moved} updates moved, {lost} lost")
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._spawn(index)
+
+    async def route(self, update: dict) -> None:
+        """Put a raw update into its worker queue; waits while the queue is full."""
+        index = raw_update_key(update) % self.workers
+        try:
+            self.queues[index].put_nowait(update)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self.queues[index].put, update)
+        self.routed[index] += 1
+
+    async def watch(self) -> None:
+        """Restart dead workers, with exponential backoff for ones that keep crashing."""
+        next_restart = [0.0] * self.workers
+        while not self._stopping:
+            now = time.monotonic()
+            for index, process in enumerate(self.processes):
+                if process is None or process.is_alive():
+                    continue
+                if next_restart[index] == 0.0:
+                    uptime = now - self.started_at[index]
+                    backoff = 0.0 if uptime > STABLE_UPTIME else min(RESTART_BACKOFF_MAX, 2.0 ** self.restarts[index])
+                    logger.error(
+                        f"Worker {index} exited with code {process.exitcode} after {uptime:.0f} s, "
+                        f"restarting in {backoff:.0f} s"
+                    )
+                    next_restart[index] = now + backoff
+                if now >= next_restart[index]:
+                    next_restart[index] = 0.0
+                    self.restarts[index] += 1
+                    self._replace_queue(index)
+                    self._spawn(index)
+            await asyncio.sleep(1)
+
+    def collect_metrics(self) -> None:
+        while True:
+            try:
+                worker_stats = self.metrics.get_nowait()
+            except queue.Empty:
+                return
+            self.worker_stats[worker_stats.pop("worker")] = worker_stats
+
+    def stats(self) -> dict:
+        self.collect_metrics()
+        queue_depth = []
+        for updates in self.queues:
+            try:
+                queue_depth.append(updates.qsize())
+            except NotImplementedError:  # macOS
+                queue_depth.append(None)
+        return {
+            "workers": self.workers,
+            "alive": sum(process is not None and process.is_alive() for process in self.processes),
+            "restarts": sum(self.restarts),
+            "routed": list(self.routed),
+            "queue_depth": queue_depth,
+            "total": _sum_stats(list(self.worker_stats.values())),
+        }
+
+    async def report(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.metrics_interval)
+            logger.info(f"Supervisor stats: {self.stats()}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self._stopping = True
+        loop = asyncio.get_running_loop()
+        for updates in self.queues:
+            try:
+                await loop.run_in_executor(None, updates.put, None, True, timeout)
+            except queue.Full:
+                pass  # воркер не разбирает очередь, ниже он будет остановлен terminate()
+        for process in self.processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        self.collect_metrics()
+        logger.info(f"Final stats: {_sum_stats(list(self.worker_stats.values()))}")
+
+
+async def poll_updates(supervisor: Supervisor, token: str = BOT_TOKEN, timeout: int = 20) -> None:
+    """Long polling loop of the front process; updates are routed without parsing."""
+    # Как skip_pending=True в main.py: накопившиеся обновления пропускаются
+    pending = await asyncio_helper.get_updates(token, offset=-1, request_timeout=30)
+    offset = pending[-1]["update_id"] + 1 if pending else None
+
+    error_interval = 0.25
+    while True:
+        try:
+            updates = await asyncio_helper.get_updates(token, offset=offset, timeout=timeout, request_timeout=timeout + 10)
+            error_interval = 0.25
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Polling error: {e}")
+            await asyncio.sleep(error_interval)
+            error_interval = min(error_interval * 2, 30)
+            continue
+        for update in updates:
+            await supervisor.route(update)
+            offset = update["update_id"] + 1
+
+
+async def run_supervisor(workers: int) -> None:
+    # Схему и миграции готовит супервизор, воркеры только загружают справочники
+    await initiate_database(needs_reset=False, logger=logger)
+    from db.database import engine
+    await engine.dispose()
+
+    apply_api_url()
+    bot = AsyncTeleBot(BOT_TOKEN)
+    from utils.bot_utils import register_bot_commands
+    await register_bot_commands(bot)
+    recorder = open_update_log()
+
+    # SIGTERM (systemd, docker stop) останавливает так же, как Ctrl+C: с остановкой воркеров
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    supervisor = Supervisor(workers)
+    supervisor.start()
+    background = [asyncio.create_task(supervisor.watch()), asyncio.create_task(supervisor.report())]
+    metrics_server = None
+    if METRICS_PORT:
+        from utils.metrics import metrics, MetricsServer
+        metrics.add_collector("supervisor", supervisor.stats)
+        metrics_server = MetricsServer(logger=logger)
+        await metrics_server.start(METRICS_HOST, METRICS_PORT)
+    try:
+        await on_startup()
+        if BOT_MODE == "webhook":
+            from utils.webhook import run_webhook
+            logging.info(f"Webhook mode started with {workers} workers...")
+            await run_webhook(
+                bot, WEBHOOK_URL, WEBHOOK_SECRET,
+                host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, forward=supervisor.route,
+                recorder=recorder, logger=logger
+            )
+        else:
+            logging.info(f"Polling started with {workers} workers...")
+            await poll_updates(supervisor)
+    except Exception as e:
+        logger.error(f"Supervisor error: {e}")
+    finally:
+        for task in background:
+            task.cancel()
+        await supervisor.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        await close_bot_session(bot)
+        if recorder is not None:
+            recorder.close()
+        await on_shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=SUPERVISOR_WORKERS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_supervisor(args.workers))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Общие фикстуры: бот и база настраиваются переменными окружения до импорта config,
+база - SQLite в памяти (StaticPool, одно соединение на весь прогон), схема
+пересоздаётся для каждого теста.
+"""
+import asyncio
+import os
+
+import pytest
+
+os.environ["BOT_TOKEN"] = "1:test"
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite://"
+
+
+@pytest.fixture(scope="session")
+def loop():
+    # Одно соединение aiosqlite на все тесты, поэтому и цикл событий один
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def run(loop):
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def database(run):
+    from db.crud import user_identity_cache
+    from db.database import engine, init_models
+    from db.profiler import query_profiler
+
+    query_profiler.install(engine)
+    user_identity_cache.clear()
+    run(init_models(needs_reset=True))
+    yield engine
+    user_identity_cache.clear()
+
+
+@pytest.fixture
+def db(run, database):
+    from db.database import AsyncSessionLocal
+
+    session = AsyncSessionLocal()
+    yield session
+    run(session.close())
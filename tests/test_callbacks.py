@@ -0,0 +1,72 @@
+import pytest
+
+from utils.callbacks import (
+    CALLBACK_DATA_LIMIT, DESIRED_SCORE, DESIRED_SCORE_MENU, HISTORY_DELETE, HISTORY_EDIT, HISTORY_PAGE,
+    PROFILE, PROFILE_STATS, SUBJECTS, TOGGLE_SUBJECT, PrefixTrie, callback_action, parse_callback,
+)
+
+
+@pytest.mark.parametrize("action, values", [
+    (SUBJECTS, ()),
+    (TOGGLE_SUBJECT, ("physics",)),
+    (HISTORY_PAGE, ("o1234",)),
+    (HISTORY_DELETE, (1234, "n56")),
+    (HISTORY_DELETE, (0, "f")),
+    (HISTORY_EDIT, (36 ** 5,)),
+])
+def test_pack_unpack_round_trip(action, values):
+    data = action.pack(*values)
+    assert len(data.encode("utf-8")) <= CALLBACK_DATA_LIMIT
+    assert parse_callback(data) == (action, values)
+
+
+def test_ints_are_base36():
+    assert HISTORY_DELETE.pack(1234, "f") == "dya:f"
+
+
+def test_pack_rejects_bad_values():
+    with pytest.raises(ValueError):
+        TOGGLE_SUBJECT.pack("a:b")
+    with pytest.raises(ValueError):
+        TOGGLE_SUBJECT.pack("x" * CALLBACK_DATA_LIMIT)
+    with pytest.raises(ValueError):
+        HISTORY_DELETE.pack(1)
+
+
+def test_tags_are_unique():
+    with pytest.raises(ValueError, match="already used"):
+        callback_action(SUBJECTS.tag, "duplicate")
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("subjects", (SUBJECTS, ())),
+    ("set_subject_physics", (TOGGLE_SUBJECT, ("physics",))),
+    ("unset_subject_math_profile", (TOGGLE_SUBJECT, ("math_profile",))),
+    # Пересекающиеся префиксы: выигрывает самый длинный
+    ("set_desired_score", (DESIRED_SCORE_MENU, ())),
+    ("set_desired_score_menu_", (DESIRED_SCORE_MENU, ())),
+    ("set_desired_score_russian", (DESIRED_SCORE, ("russian",))),
+    ("profile", (PROFILE, ())),
+    ("profile_stats", (PROFILE_STATS, ())),
+    ("history_page_", (HISTORY_PAGE, ("f",))),
+    ("history_delete_42_o40", (HISTORY_DELETE, (42, "o40"))),
+    ("history_delete_42", (HISTORY_DELETE, (42, "f"))),
+    ("history_edit_7", (HISTORY_EDIT, (7,))),
+])
+def test_legacy_callback_data(data, expected):
+    assert parse_callback(data) == expected
+
+
+@pytest.mark.parametrize("data", [None, "", "profile_unknown", "history_edit_x", "unknown", "Sextra"])
+def test_unknown_or_malformed(data):
+    assert parse_callback(data) is None
+
+
+def test_trie_longest_match():
+    trie = PrefixTrie()
+    trie.insert("ab", 1)
+    trie.insert("abcd", 2)
+    assert trie.longest_match("abc") == (1, "c")
+    assert trie.longest_match("abcdef") == (2, "ef")
+    assert trie.longest_match("a") is None
+    assert trie.longest_match("x") is None
@@ -0,0 +1,124 @@
+"""
+Запросы и строки на путях crud, которыми пользуются обработчики. Рядом с пользователем
+лежат данные других пользователей: число выбранных строк не должно от них зависеть.
+"""
+import pytest
+
+from db import crud
+from db.exceptions import SubjectNotFoundError, UserNotFoundError
+from db.database import unit_of_work
+from db.profiler import assert_query_budget
+
+USER_ID = 1
+OTHER_USERS = 20
+SCORES_PER_USER = 10
+SUBJECTS = ("physics", "math_profile", "russian")
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "username": f"user{user_id}", "first_name": "Test", "last_name": None}
+
+
+def _scores(count: int) -> list[dict]:
+    return [
+        {"subject_id": SUBJECTS[i % len(SUBJECTS)], "subject_name": "", "score": 50 + i}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def seeded(run, db):
+    async def seed():
+        for user_id in range(USER_ID, USER_ID + OTHER_USERS + 1):
+            await crud.upsert_user(db, **_user(user_id))
+            await crud.add_scores_bulk(db, user_id, _scores(SCORES_PER_USER))
+            for subject_id in SUBJECTS[:2]:
+                await crud.add_subject_to_user(db, user_id, subject_id)
+        crud.user_identity_cache.clear()
+    run(seed())
+
+
+def _in_unit_of_work(run, call):
+    async def handler():
+        async with unit_of_work() as db:
+            return await call(db)
+    return run(handler())
+
+
+def test_create_or_update_user(run, seeded):
+    # Профиль не изменился, кэш пуст: upsert ничего не пишет, строка читается отдельно
+    with assert_query_budget(2) as profile:
+        _in_unit_of_work(run, lambda db: crud.create_or_update_user(db, **_user(USER_ID)))
+    assert profile.rows == 1
+
+    crud.user_identity_cache.clear()
+    renamed = dict(_user(USER_ID), first_name="Renamed")
+    with assert_query_budget(1) as profile:
+        user = _in_unit_of_work(run, lambda db: crud.create_or_update_user(db, **renamed))
+    assert user.first_name == "Renamed"
+    assert profile.rows == 1
+
+    # Профиль не изменился - ответ из кэша без запросов
+    with assert_query_budget(0):
+        _in_unit_of_work(run, lambda db: crud.create_or_update_user(db, **renamed))
+
+
+def test_get_subject_by_id_is_served_from_registry(run, seeded):
+    with assert_query_budget(0):
+        _in_unit_of_work(run, lambda db: crud.get_subject_by_id(db, "physics"))
+
+
+def test_get_user_subjects(run, seeded):
+    with assert_query_budget(2) as profile:
+        subjects = _in_unit_of_work(run, lambda db: crud.get_user_subjects(db, USER_ID))
+    assert {subject.id for subject in subjects} == set(SUBJECTS[:2])
+    assert profile.rows == 1 + 2
+
+
+def test_switch_subject_for_user(run, seeded):
+    with assert_query_budget(1):
+        _in_unit_of_work(run, lambda db: crud.switch_subject_for_user(db, USER_ID, "physics"))
+    with assert_query_budget(2):
+        _in_unit_of_work(run, lambda db: crud.switch_subject_for_user(db, USER_ID, "physics"))
+
+
+def test_add_score(run, seeded):
+    async def add(db):
+        await crud.add_score(db, USER_ID, "physics", 77, subject_name="Физика")
+        return await crud.get_score_rollup(db, USER_ID, "physics")
+
+    with assert_query_budget(4) as profile:
+        rollup = _in_unit_of_work(run, add)
+    assert rollup.count == 4 + 1
+    # По строке: INSERT, upsert score_rollups, refresh оценки и выборка rollup
+    assert profile.rows == 4
+
+
+def test_add_score_rejects_unknown_subject_and_user(run, seeded):
+    # Неизвестный предмет отсекается по subject_registry без запросов, даже с готовым subject_name
+    with assert_query_budget(0):
+        with pytest.raises(SubjectNotFoundError):
+            _in_unit_of_work(run, lambda db: crud.add_score(db, USER_ID, "astrology", 77, subject_name="Астрология"))
+    with pytest.raises(UserNotFoundError):
+        _in_unit_of_work(run, lambda db: crud.add_score(db, 10_000, "physics", 77, subject_name="Физика"))
+
+
+def test_profile_summary(run, seeded):
+    with assert_query_budget(1) as profile:
+        summary = _in_unit_of_work(run, lambda db: crud.get_user_subject_summary(db, USER_ID))
+    assert {item.subject_id for item in summary} == set(SUBJECTS)
+    assert profile.rows == len(SUBJECTS)
+
+
+def test_history_page(run, seeded):
+    with assert_query_budget(1) as profile:
+        page, has_more = _in_unit_of_work(run, lambda db: crud.get_scores_page(db, USER_ID, limit=5))
+    assert len(page) == 5 and has_more
+    assert profile.rows == 5 + 1
+
+
+def test_all_scores_for_user(run, seeded):
+    with assert_query_budget(2) as profile:
+        scores = _in_unit_of_work(run, lambda db: crud.get_all_scores_for_user(db, USER_ID, subject_id=None))
+    assert len(scores) == SCORES_PER_USER
+    assert profile.rows == 1 + SCORES_PER_USER
@@ -0,0 +1,79 @@
+import asyncio
+
+from telebot import types
+
+from utils.dispatcher import UpdateDispatcher
+
+CHATS = (101, 202, 303)
+
+
+def _message_update(update_id: int, chat_id: int, text: str) -> types.Update:
+    return types.Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+
+class SlowBot:
+    """process_new_updates that records the order of handled updates and the peak concurrency."""
+
+    def __init__(self):
+        self.handled: dict[int, list[str]] = {}
+        self.running = 0
+        self.max_running = 0
+
+    async def process_new_updates(self, updates):
+        update, = updates
+        message = update.message
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        # Первые сообщения чата обрабатываются дольше следующих: без очереди порядок бы перепутался
+        await asyncio.sleep(0.01 * (5 - int(message.text.split()[-1])))
+        self.handled.setdefault(message.chat.id, []).append(message.text)
+        self.running -= 1
+
+
+def _interleaved(chats, per_chat: int) -> list[types.Update]:
+    # Обновления чатов вперемешку: 101 #0, 202 #0, 101 #1, 202 #1, ...
+    return [
+        _message_update(len(chats) * i + n, chat_id, f"{chat_id} {i}")
+        for i in range(per_chat)
+        for n, chat_id in enumerate(chats)
+    ]
+
+
+def _dispatch(run, dispatcher: UpdateDispatcher, updates: list[types.Update]) -> None:
+    async def dispatch():
+        await dispatcher.process_new_updates(updates)
+        await dispatcher.drain()
+
+    run(dispatch())
+
+
+def test_updates_of_a_chat_are_handled_in_order(run):
+    bot = SlowBot()
+    # Свободных слотов больше, чем чатов: порядок держит только очередь чата
+    dispatcher = UpdateDispatcher(bot, max_concurrency=10, max_pending=100)
+    _dispatch(run, dispatcher, _interleaved(CHATS[:2], 5))
+
+    assert bot.handled == {chat_id: [f"{chat_id} {i}" for i in range(5)] for chat_id in CHATS[:2]}
+    # Чаты при этом обрабатываются параллельно, по одному обновлению на чат
+    assert bot.max_running == 2
+    assert dispatcher.stats()["processed"] == 10
+    assert dispatcher.stats()["pending"] == 0
+
+
+def test_concurrency_and_pending_limits(run):
+    bot = SlowBot()
+    dispatcher = UpdateDispatcher(bot, max_concurrency=2, max_pending=4)
+    _dispatch(run, dispatcher, _interleaved(CHATS, 5))
+
+    assert bot.handled == {chat_id: [f"{chat_id} {i}" for i in range(5)] for chat_id in CHATS}
+    assert bot.max_running == 2
+    assert dispatcher.max_pending_seen == 4
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, exc, func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from db.engine_profiles import EngineProfile, create_engine_for_profile, get_engine_profile
+
+items = Table("items", MetaData(), Column("id", Integer, primary_key=True))
+
+
+def _concurrent_writers(run, path, profile: EngineProfile) -> tuple[list[str], int]:
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{path}", profile)
+    events = []
+
+    async def writer(name: str, delay: float, hold: float):
+        await asyncio.sleep(delay)
+        async with engine.begin() as conn:
+            await conn.execute(insert(items))
+            events.append(f"{name} wrote")
+            await asyncio.sleep(hold)
+        events.append(f"{name} committed")
+
+    async def main():
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(items.create)
+            # Дожидаемся обоих писателей, прежде чем закрыть движок, и только потом поднимаем ошибку
+            results = await asyncio.gather(writer("first", 0, 0.2), writer("second", 0.05, 0), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+        finally:
+            async with engine.connect() as conn:
+                count = await conn.scalar(select(func.count()).select_from(items))
+            await engine.dispose()
+        return count
+
+    count = run(main())
+    return events, count
+
+
+def test_sqlite_wal_serializes_writers(run, tmp_path):
+    events, count = _concurrent_writers(run, tmp_path / "wal.db", get_engine_profile("sqlite-wal"))
+    # Второй писатель начал писать только после коммита первого
+    assert events == ["first wrote", "first committed", "second wrote", "second committed"]
+    assert count == 2
+
+
+def test_writer_gives_up_after_write_lock_timeout(run, tmp_path):
+    profile = replace(get_engine_profile("sqlite-wal"), write_lock_timeout=0.1)
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{tmp_path / 'timeout.db'}", profile)
+
+    async def first():
+        async with engine.begin() as conn:
+            await conn.execute(insert(items))
+            await asyncio.sleep(0.5)
+
+    async def second() -> float:
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(insert(items))
+        except exc.TimeoutError:
+            return time.perf_counter() - started
+        raise AssertionError("second writer was not queued")
+
+    async def main():
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(items.create)
+            _, waited = await asyncio.gather(first(), second())
+            # Очередь освободилась: следующий писатель проходит
+            async with engine.begin() as conn:
+                await conn.execute(insert(items))
+                return waited, await conn.scalar(select(func.count()).select_from(items))
+        finally:
+            await engine.dispose()
+
+    waited, count = run(main())
+    assert 0.1 <= waited < 0.4
+    assert count == 2
+
+
+def test_writers_wait_in_queue(run, tmp_path):
+    # busy_timeout=0: без очереди второй писатель сразу получил бы "database is locked"
+    profile = EngineProfile(name="test", sqlite_pragmas={"journal_mode": "WAL", "busy_timeout": 0}, write_lock_timeout=5.0)
+    events, count = _concurrent_writers(run, tmp_path / "queue.db", profile)
+    assert events == ["first wrote", "first committed", "second wrote", "second committed"]
+    assert count == 2
+
+
+def test_without_queue_busy_writer_fails(run, tmp_path):
+    profile = EngineProfile(name="test", sqlite_pragmas={"journal_mode": "WAL", "busy_timeout": 0})
+    with pytest.raises(OperationalError, match="database is locked"):
+        _concurrent_writers(run, tmp_path / "no-queue.db", profile)
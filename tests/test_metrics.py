@@ -0,0 +1,42 @@
+import pytest
+
+from utils.metrics import Histogram
+
+
+def test_observe_places_values_by_upper_bound():
+    histogram = Histogram((0.1, 0.5, 1.0))
+    for value in (0.0, 0.1, 0.10001, 0.5, 0.7, 1.0, 3.0):
+        histogram.observe(value)
+    # Граница входит в свою корзину (le), больше последней - в +Inf
+    assert histogram.counts == [2, 2, 2, 1]
+    assert histogram.count == 7
+    assert histogram.sum == pytest.approx(5.40001)
+
+
+def test_quantile_interpolates_inside_bucket():
+    histogram = Histogram((1.0, 2.0, 4.0))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+
+
+def test_quantile_in_inf_bucket_is_the_last_bound():
+    histogram = Histogram((1.0, 2.0))
+    histogram.observe(10.0)
+    assert histogram.quantile(0.99) == 2.0
+
+
+def test_render_is_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+    assert histogram.render("latency", 'handler="start"') == [
+        'latency_bucket{handler="start",le="0.1"} 1',
+        'latency_bucket{handler="start",le="1.0"} 3',
+        'latency_bucket{handler="start",le="+Inf"} 4',
+        'latency_sum{handler="start"} 6.250000',
+        'latency_count{handler="start"} 4',
+    ]
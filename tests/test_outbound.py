@@ -0,0 +1,77 @@
+import pytest
+
+from db import crud
+from db.database import AsyncSessionLocal, commit_unit_of_work, unit_of_work
+from db.models import User
+from utils.outbound import OutboundQueue, RateLimitedBot
+
+USER = {"id": 1, "username": "user", "first_name": "Test", "last_name": None}
+
+
+class CommitCheckingBot:
+    """send_message records whether the user row is already visible to another session."""
+
+    def __init__(self):
+        self.sent: list[tuple[str, bool]] = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        async with AsyncSessionLocal() as session:
+            committed = await session.get(User, USER["id"]) is not None
+        self.sent.append((text, committed))
+        return text
+
+
+def _bot() -> tuple[RateLimitedBot, CommitCheckingBot]:
+    telebot = CommitCheckingBot()
+    return RateLimitedBot(telebot, OutboundQueue()), telebot
+
+
+def test_send_outside_unit_of_work_returns_result(run, database):
+    bot, telebot = _bot()
+    assert run(bot.send_message(1, "hello")) == "hello"
+    assert telebot.sent == [("hello", False)]
+
+
+def test_sends_are_deferred_until_commit(run, database):
+    bot, telebot = _bot()
+
+    async def handler():
+        async with unit_of_work() as db:
+            await crud.upsert_user(db, **USER)
+            assert await bot.send_message(1, "saved") is None
+            assert telebot.sent == []
+            await bot.send_message(1, "second")
+
+    run(handler())
+    assert telebot.sent == [("saved", True), ("second", True)]
+
+
+def test_sends_are_dropped_when_the_handler_fails(run, database):
+    bot, telebot = _bot()
+
+    async def handler():
+        async with unit_of_work() as db:
+            await crud.upsert_user(db, **USER)
+            await bot.send_message(1, "saved")
+            raise RuntimeError("handler failed")
+
+    with pytest.raises(RuntimeError):
+        run(handler())
+    assert telebot.sent == []
+
+
+def test_commit_unit_of_work_commits_before_the_handler_ends(run, database):
+    bot, telebot = _bot()
+
+    async def handler():
+        async with unit_of_work() as db:
+            await crud.upsert_user(db, **USER)
+            await bot.send_message(1, "saved")
+            await commit_unit_of_work(db)
+            async with AsyncSessionLocal() as other:
+                assert await other.get(User, USER["id"]) is not None
+            # Отложенные отправки по-прежнему ждут конца обработчика
+            assert telebot.sent == []
+
+    run(handler())
+    assert telebot.sent == [("saved", True)]
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select
+
+from db import crud
+from db.models import User
+from db.profiler import QueryBudgetExceeded, QueryProfiler, assert_query_budget
+
+
+def test_shape_collapses_in_lists():
+    profiler = QueryProfiler()
+    assert profiler.shape("SELECT * FROM scores WHERE id IN (?, ?, ?)") == "SELECT * FROM scores WHERE id IN (...)"
+    assert profiler.shape("SELECT * FROM scores WHERE id IN ($1::INTEGER, $2::INTEGER)") == "SELECT * FROM scores WHERE id IN (...)"
+    assert profiler.shape("DELETE FROM scores WHERE id not in (%(id_1)s, %(id_2)s)") == "DELETE FROM scores WHERE id not IN (...)"
+
+
+def test_shape_keeps_values_lists():
+    statement = "INSERT INTO users (id, username) VALUES (?, ?)"
+    assert QueryProfiler().shape(statement) == statement
+
+
+def _add_users(run, db, count):
+    async def add():
+        for i in range(count):
+            await crud.upsert_user(db, id=i + 1, username=f"user{i}", first_name="Test", last_name=None)
+    run(add())
+
+
+def test_budget_counts_statements_and_rows(run, db):
+    _add_users(run, db, 3)
+    with assert_query_budget(1) as profile:
+        users = run(db.scalars(select(User)))
+    assert len(users.all()) == 3
+    assert profile.statements == 1
+    assert profile.rows == 3
+
+
+def test_budget_counts_dml_rows(run, db):
+    _add_users(run, db, 2)
+    with assert_query_budget(1) as profile:
+        run(crud.upsert_user(db, id=1, username="renamed", first_name="Test", last_name=None))
+    assert profile.statements == 1
+    assert profile.rows == 1
+
+
+def test_budget_exceeded(run, db):
+    with pytest.raises(QueryBudgetExceeded, match="2 statements, budget 1"):
+        with assert_query_budget(1):
+            run(db.scalar(select(User.id)))
+            run(db.scalar(select(User.id)))
+
+
+def test_budget_rejects_repeated_statements(run, db):
+    _add_users(run, db, 3)
+    with pytest.raises(QueryBudgetExceeded, match="Repeated statements"):
+        with assert_query_budget(10, allow_repeated=False):
+            for user_id in (1, 2, 3):
+                run(crud.get_user_by_id(db, user_id))
@@ -0,0 +1,69 @@
+"""
+EXPLAIN QUERY PLAN горячих запросов истории: они должны идти по составным
+индексам scores из миграций, а не сканировать таблицу.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from db import crud
+
+USER_ID = 1
+
+
+@contextmanager
+def _captured_statements(engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+def _query_plan(run, db, database, call) -> str:
+    """Plan of the last statement `call` executes."""
+    with _captured_statements(database) as statements:
+        run(call(db))
+    statement, parameters = statements[-1]
+
+    async def explain():
+        connection = await db.connection()
+        result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return "\n".join(row[-1] for row in result.all())
+    return run(explain())
+
+
+@pytest.fixture
+def scores(run, db):
+    async def seed():
+        await crud.upsert_user(db, id=USER_ID, username="user", first_name="Test", last_name=None)
+        return await crud.add_scores_bulk(db, USER_ID, [
+            {"subject_id": subject_id, "subject_name": "", "score": 60 + i}
+            for i, subject_id in enumerate(["physics", "russian"] * 5)
+        ])
+    run(seed())
+
+
+def test_history_page_uses_user_created_index(run, db, database, scores):
+    plan = _query_plan(run, db, database, lambda db: crud.get_scores_page(db, USER_ID, limit=5))
+    assert "ix_scores_user_created" in plan
+    # Порядок created_at DESC, id DESC берётся из индекса, без сортировки
+    assert "TEMP B-TREE" not in plan
+
+
+def test_history_next_page_uses_user_created_index(run, db, database, scores):
+    plan = _query_plan(run, db, database, lambda db: crud.get_scores_page(db, USER_ID, anchor_id=5, limit=5))
+    assert "ix_scores_user_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_subject_scores_use_user_subject_index(run, db, database, scores):
+    plan = _query_plan(run, db, database, lambda db: crud.get_all_scores_for_user(db, USER_ID, subject_id="physics"))
+    assert "ix_scores_user_subject_created" in plan
+    assert "SCAN scores" not in plan
@@ -0,0 +1,57 @@
+import pytest
+
+from benchmarks.resp_server import RespServer
+from utils.resp import RespClient, RespError
+
+
+@pytest.fixture
+def resp_server(run):
+    server = RespServer(password="secret", databases=2)
+    url = run(server.start(port=0))
+    yield server, url.replace("redis://", "redis://:secret@")
+    run(server.stop())
+
+
+def _set_twice(run, url) -> list[str]:
+    """Two SETs through one client; returns the error of each."""
+    async def call():
+        client = RespClient(url)
+        errors = []
+        try:
+            for _ in range(2):
+                try:
+                    await client.set("key", "value")
+                except RespError as e:
+                    errors.append(str(e))
+        finally:
+            await client.close()
+        return errors
+    return run(call())
+
+
+def test_auth_and_select_are_checked_on_connect(run, resp_server):
+    server, url = resp_server
+    assert _set_twice(run, url.replace("/0", "/1")) == []
+    server.data.clear()
+
+    # Каждая команда снова проходит AUTH/SELECT и не уходит в базу 0 без них
+    assert [error.split()[0] for error in _set_twice(run, url.replace(":secret@", ":wrong@"))] == ["WRONGPASS"] * 2
+    assert _set_twice(run, url.replace("/0", "/5")) == ["ERR DB index is out of range"] * 2
+    assert server.data == {}
+
+
+def test_client_reconnects_after_failed_handshake(run, resp_server):
+    server, url = resp_server
+
+    async def scenario():
+        client = RespClient(url.replace(":secret@", ":wrong@"))
+        with pytest.raises(RespError):
+            await client.get("key")
+        client.password = "secret"
+        try:
+            await client.set("key", "value")
+            return await client.get("key")
+        finally:
+            await client.close()
+
+    assert run(scenario()) == b"value"
@@ -0,0 +1,95 @@
+from telebot import types
+from telebot.asyncio_helper import ApiTelegramException
+
+from utils.bot_utils import respond
+
+CHAT_ID = 10
+
+
+class RecordingBot:
+    """Records bot API calls; `fail` maps a method name to the Telegram error description it raises."""
+
+    def __init__(self, fail: dict[str, str] | None = None):
+        self.calls: list[tuple[str, dict]] = []
+        self.fail = fail or {}
+
+    def __getattr__(self, name: str):
+        async def call(*args, **kwargs):
+            self.calls.append((name, kwargs))
+            if name in self.fail:
+                raise ApiTelegramException(name, None, {"error_code": 400, "description": self.fail[name]})
+
+        return call
+
+    @property
+    def methods(self) -> list[str]:
+        return [name for name, _ in self.calls]
+
+
+def _markup(*labels: str) -> types.InlineKeyboardMarkup:
+    markup = types.InlineKeyboardMarkup()
+    for label in labels:
+        markup.add(types.InlineKeyboardButton(label, callback_data=label))
+    return markup
+
+
+def _message(text: str = "menu", markup: types.InlineKeyboardMarkup | None = None, date: int = 1700000000) -> dict:
+    message = {"message_id": 5, "date": date, "chat": {"id": CHAT_ID, "type": "private"}, "text": text}
+    if markup is not None:
+        message["reply_markup"] = markup.to_dict()
+    return message
+
+
+def _callback(message: dict) -> types.CallbackQuery:
+    return types.CallbackQuery.de_json({
+        "id": "1",
+        "from": {"id": CHAT_ID, "is_bot": False, "first_name": "Test"},
+        "message": message,
+        "chat_instance": "1",
+        "data": "S",
+    })
+
+
+def test_message_gets_a_new_reply(run):
+    bot = RecordingBot()
+    run(respond(bot, types.Message.de_json(_message("/subjects")), "menu", reply_markup=_markup("a")))
+    assert bot.methods == ["send_message"]
+    assert bot.calls[0][1]["chat_id"] == CHAT_ID
+
+
+def test_callback_edits_in_place(run):
+    bot = RecordingBot()
+    run(respond(bot, _callback(_message("old", _markup("a"))), "new", reply_markup=_markup("b")))
+    assert bot.methods == ["edit_message_text"]
+    assert bot.calls[0][1]["message_id"] == 5 and bot.calls[0][1]["text"] == "new"
+
+
+def test_same_text_edits_only_the_markup(run):
+    bot = RecordingBot()
+    run(respond(bot, _callback(_message("menu", _markup("a"))), "menu", reply_markup=_markup("b")))
+    assert bot.methods == ["edit_message_reply_markup"]
+
+
+def test_unchanged_message_is_left_alone(run):
+    bot = RecordingBot()
+    run(respond(bot, _callback(_message("menu", _markup("a"))), "menu", reply_markup=_markup("a")))
+    assert bot.calls == []
+
+
+def test_inaccessible_message_is_resent(run):
+    bot = RecordingBot()
+    # date 0 - сообщение старше 48 часов, Telegram отдаёт его без текста
+    run(respond(bot, _callback(_message(date=0)), "menu"))
+    assert bot.methods == ["delete_message", "send_message"]
+
+
+def test_failed_edit_falls_back_to_send(run):
+    bot = RecordingBot(fail={"edit_message_text": "Bad Request: message can't be edited"})
+    run(respond(bot, _callback(_message("old")), "new"))
+    assert bot.methods == ["edit_message_text", "delete_message", "send_message"]
+
+
+def test_not_modified_is_not_an_error(run):
+    bot = RecordingBot(fail={"edit_message_text": "Bad Request: message is not modified"})
+    run(respond(bot, _callback(_message("old")), "new", parse_mode="HTML"))
+    assert bot.methods == ["edit_message_text"]
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from telebot import types
+
+from utils.callbacks import ADD_SCORE, DESIRED_SCORE, TOGGLE_SUBJECT
+from utils.responses import MAIN_MENU, PreparedMarkup, subject_choice, subjects_grid
+from utils.subjects import SubjectInfo, subject_registry
+
+
+@pytest.fixture
+def registry():
+    subjects = list(subject_registry)
+    yield subject_registry
+    subject_registry.load(subjects)
+
+
+def _buttons(markup: PreparedMarkup) -> list[tuple[str, str]]:
+    return [(button["text"], button["callback_data"]) for row in markup.to_dict()["inline_keyboard"] for button in row]
+
+
+def test_prepared_markup_matches_telebot_serialization():
+    markup = types.InlineKeyboardMarkup()
+    markup.row(types.InlineKeyboardButton("a", callback_data="S"))
+    prepared = PreparedMarkup(markup)
+    assert prepared.to_dict() == markup.to_dict()
+    assert json.loads(prepared.to_json()) == json.loads(markup.to_json())
+    assert MAIN_MENU.to_json() is MAIN_MENU.to_json()
+
+
+def test_subjects_grid_is_cached_by_mask():
+    first = subjects_grid(["physics", "russian"])
+    # Порядок и повторы id не меняют маску
+    assert subjects_grid(["russian", "physics", "physics"]) is first
+    assert subjects_grid(["physics"]) is not first
+
+
+def test_subjects_grid_marks_selected():
+    buttons = dict((callback_data, text) for text, callback_data in _buttons(subjects_grid(["physics"])))
+    assert len(buttons) == len(subject_registry.ids())
+    assert buttons[TOGGLE_SUBJECT.pack("physics")].startswith("✅")
+    assert not buttons[TOGGLE_SUBJECT.pack("russian")].startswith("✅")
+    assert all(len(row) <= 2 for row in subjects_grid([]).to_dict()["inline_keyboard"])
+
+
+def test_subject_choice_is_cached_per_action():
+    ids = ["physics", "russian"]
+    assert subject_choice(ADD_SCORE, ids) is subject_choice(ADD_SCORE, reversed(ids))
+    assert subject_choice(ADD_SCORE, ids) is not subject_choice(DESIRED_SCORE, ids)
+    assert [data for _, data in _buttons(subject_choice(ADD_SCORE, ids))] == [
+        ADD_SCORE.pack(subject_id) for subject_id in subject_registry.ids() if subject_id in ids
+    ]
+
+
+def test_registry_reload_invalidates_keyboards(registry):
+    before = subjects_grid(["physics"])
+    registry.load([*registry, SubjectInfo(id="astronomy", name="Астрономия")])
+    after = subjects_grid(["physics"])
+    assert after is not before
+    assert ("Астрономия", TOGGLE_SUBJECT.pack("astronomy")) in _buttons(after)
@@ -0,0 +1,73 @@
+"""
+Хранилища состояний на локальных заменах: DatabaseStateStorage - на SQLite в памяти,
+RedisStateStorage - на benchmarks.resp_server.
+"""
+import asyncio
+
+import pytest
+
+from benchmarks.resp_server import RespServer
+from utils.state_storage import DatabaseStateStorage, RedisStateStorage
+
+CHAT_ID = 10
+USER_ID = 20
+
+
+@pytest.fixture(params=["db", "redis"])
+def storage(request, run):
+    if request.param == "db":
+        request.getfixturevalue("database")
+        storage = DatabaseStateStorage(ttl=1)
+        yield storage
+        run(storage.close())
+        return
+    server = RespServer()
+    url = run(server.start(port=0))
+    storage = RedisStateStorage(url=url, ttl=1)
+    yield storage
+    run(storage.close())
+    run(server.stop())
+
+
+def test_get_set_delete(run, storage):
+    assert run(storage.get_state(CHAT_ID, USER_ID)) is None
+    assert run(storage.get_data(CHAT_ID, USER_ID)) == {}
+
+    run(storage.set_state(CHAT_ID, USER_ID, "waiting"))
+    run(storage.set_data(CHAT_ID, USER_ID, "subject_id", "physics"))
+    assert run(storage.get_state(CHAT_ID, USER_ID)) == "waiting"
+    assert run(storage.get_data(CHAT_ID, USER_ID)) == {"subject_id": "physics"}
+    # Другой пользователь в том же чате не видит чужое состояние
+    assert run(storage.get_state(CHAT_ID, USER_ID + 1)) is None
+
+    assert run(storage.delete_state(CHAT_ID, USER_ID)) is True
+    assert run(storage.get_state(CHAT_ID, USER_ID)) is None
+    assert run(storage.delete_state(CHAT_ID, USER_ID)) is False
+
+
+def test_set_state_with_data_replaces_the_record(run, storage):
+    run(storage.set_state(CHAT_ID, USER_ID, "old"))
+    run(storage.set_data(CHAT_ID, USER_ID, "stale", True))
+
+    run(storage.set_state_with_data(CHAT_ID, USER_ID, "waiting", {"subject_id": "math_profile"}))
+    assert run(storage.get_state(CHAT_ID, USER_ID)) == "waiting"
+    assert run(storage.get_data(CHAT_ID, USER_ID)) == {"subject_id": "math_profile"}
+
+
+def test_records_expire_after_ttl(run, storage):
+    run(storage.set_state_with_data(CHAT_ID, USER_ID, "waiting", {"subject_id": "physics"}))
+    run(asyncio.sleep(1.1))
+    assert run(storage.get_state(CHAT_ID, USER_ID)) is None
+    assert run(storage.get_data(CHAT_ID, USER_ID)) == {}
+
+
+def test_database_expiry_removes_records_in_batches(run, database):
+    storage = DatabaseStateStorage(ttl=1)
+    for user_id in range(5):
+        run(storage.set_state(CHAT_ID, user_id, "waiting"))
+    run(asyncio.sleep(1.1))
+    run(storage.set_state(CHAT_ID, 100, "fresh"))
+
+    assert run(storage.expire(batch_size=2)) == 5
+    assert run(storage.expire(batch_size=2)) == 0
+    assert run(storage.get_state(CHAT_ID, 100)) == "fresh"
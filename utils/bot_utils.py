@@ -1,5 +1,10 @@
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.states import State
+
+from db.database import after_unit_of_work
+from utils.state_storage import KeyValueStateStorage
 
 async def del_message_from_callback(bot: AsyncTeleBot, call: types.CallbackQuery) -> None:
     chat_id = call.message.chat.id
@@ -10,6 +15,76 @@ async def del_message_from_callback(bot: AsyncTeleBot, call: types.CallbackQuery
         pass
     return 
 
+def _same_markup(current: types.InlineKeyboardMarkup | None, new: types.InlineKeyboardMarkup | None) -> bool:
+    if current is None or new is None:
+        return current is new
+    return current.to_dict() == new.to_dict()
+
+
+async def respond(bot: AsyncTeleBot, event: types.Message | types.CallbackQuery, text: str,
+                  reply_markup: types.InlineKeyboardMarkup | None = None, parse_mode: str | None = None) -> None:
+    """
+    Answer an event: a callback from the bot's text message edits that message in place,
+    anything else (or a message that can no longer be edited) gets a new one.
+    """
+    if not isinstance(event, types.CallbackQuery):
+        await bot.send_message(chat_id=event.chat.id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        return
+    # Откат на новое сообщение зависит от ответа Telegram, поэтому внутри unit of work
+    # откладывается вся попытка редактирования целиком, а не отдельные запросы
+    await after_unit_of_work(lambda: _edit_or_send(bot, event, text, reply_markup, parse_mode))
+
+
+async def _edit_or_send(bot: AsyncTeleBot, event: types.CallbackQuery, text: str,
+                        reply_markup: types.InlineKeyboardMarkup | None, parse_mode: str | None) -> None:
+    message = event.message
+    # InaccessibleMessage (старше 48 часов) и сообщения с фото редактировать как текст нельзя
+    if not isinstance(message, types.Message) or message.content_type != "text":
+        await del_message_from_callback(bot, event)
+        await bot.send_message(chat_id=message.chat.id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        return
+
+    # С parse_mode текст сообщения уже без разметки, тогда сравнить его не выйдет и решит Telegram
+    same_text = parse_mode is None and message.text == text
+    try:
+        if same_text and _same_markup(message.reply_markup, reply_markup):
+            return
+        if same_text:
+            await bot.edit_message_reply_markup(
+                chat_id=message.chat.id, message_id=message.message_id, reply_markup=reply_markup
+            )
+        else:
+            await bot.edit_message_text(
+                text=text, chat_id=message.chat.id, message_id=message.message_id,
+                reply_markup=reply_markup, parse_mode=parse_mode,
+            )
+    except ApiTelegramException as e:
+        if "message is not modified" in e.description:
+            return
+        # Сообщение удалено или слишком старое для редактирования
+        await del_message_from_callback(bot, event)
+        await bot.send_message(chat_id=message.chat.id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+
+async def set_state_with_data(bot: AsyncTeleBot, user_id: int, chat_id: int, state: State, **data) -> None:
+    """
+    Set the FSM state and its data (e.g. the chosen subject) together; a single write for shared backends.
+    """
+    storage = bot.current_states
+    if isinstance(storage, KeyValueStateStorage):
+        await storage.set_state_with_data(chat_id, user_id, state, data, bot_id=bot.bot_id)
+        return
+    await bot.set_state(user_id, state, chat_id)
+    if data:
+        await bot.add_data(user_id, chat_id, **data)
+
+
+async def get_state_data(bot: AsyncTeleBot, user_id: int, chat_id: int) -> dict:
+    """
+    Read the state data without the write-back that bot.retrieve_data() does on exit.
+    """
+    return await bot.current_states.get_data(chat_id=chat_id, user_id=user_id, bot_id=bot.bot_id)
+
 BOT_COMMANDS = [
     types.BotCommand("start", "Начало работы"),
     types.BotCommand("help", "Помощь"),
@@ -17,6 +92,9 @@ BOT_COMMANDS = [
     types.BotCommand("set_desired_score", "Установить цель"),
     types.BotCommand("add_score", "Добавить результат"),
     types.BotCommand("profile", "Профиль"),
+    types.BotCommand("history", "История результатов"),
+    types.BotCommand("import", "Импорт результатов из файла"),
+    types.BotCommand("export", "Выгрузить результаты (csv или jsonl)"),
 ]
 
 async def register_bot_commands(bot: AsyncTeleBot) -> None:
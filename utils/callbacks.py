@@ -0,0 +1,237 @@
+"""
+Компактный callback_data и маршрутизация callback-запросов.
+
+callback_data = тег действия (один символ) + поля через ":" (целые в base36):
+"x" + "physics" -> "xphysics", "d" + (1234, "f") -> "dya:f". Маршрутизатор
+выбирает обработчик по первому символу одним поиском в словаре, так что
+пересекающиеся префиксы и порядок регистрации больше не важны, а размер
+данных проверяется при упаковке (лимит Telegram - 64 байта).
+
+Кнопки старого формата ("set_subject_physics", "history_page_f", ...) ещё
+живут в уже отправленных сообщениях; они разбираются по префиксному дереву
+(самый длинный совпавший префикс) и приводятся к тем же действиям.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+CALLBACK_DATA_LIMIT = 64
+FIELD_SEPARATOR = ":"
+
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _encode_int(value: int) -> str:
+    if value < 0:
+        return "-" + _encode_int(-value)
+    digits = []
+    while True:
+        value, digit = divmod(value, 36)
+        digits.append(_BASE36[digit])
+        if not value:
+            return "".join(reversed(digits))
+
+
+@dataclass(frozen=True)
+class CallbackAction:
+    tag: str
+    name: str
+    fields: tuple[type, ...] = ()
+
+    def pack(self, *values) -> str:
+        """Encode `values` into callback_data; raises ValueError if they do not fit."""
+        if len(values) != len(self.fields):
+            raise ValueError(f"{self.name}: expected {len(self.fields)} values, got {len(values)}")
+        parts = []
+        for field_type, value in zip(self.fields, values):
+            if field_type is int:
+                parts.append(_encode_int(int(value)))
+                continue
+            value = str(value)
+            if FIELD_SEPARATOR in value:
+                raise ValueError(f"{self.name}: {value!r} contains {FIELD_SEPARATOR!r}")
+            parts.append(value)
+        data = self.tag + FIELD_SEPARATOR.join(parts)
+        if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"{self.name}: callback_data {data!r} exceeds {CALLBACK_DATA_LIMIT} bytes")
+        return data
+
+    def unpack(self, payload: str) -> tuple:
+        """Decode the part of callback_data after the tag."""
+        if not self.fields:
+            if payload:
+                raise ValueError(f"{self.name}: unexpected payload {payload!r}")
+            return ()
+        parts = payload.split(FIELD_SEPARATOR, len(self.fields) - 1)
+        if len(parts) != len(self.fields):
+            raise ValueError(f"{self.name}: expected {len(self.fields)} values in {payload!r}")
+        return tuple(
+            int(part, 36) if field_type is int else part
+            for field_type, part in zip(self.fields, parts)
+        )
+
+    def button(self, text: str, *values) -> types.InlineKeyboardButton:
+        return types.InlineKeyboardButton(text, callback_data=self.pack(*values))
+
+
+class ParsedCallback(NamedTuple):
+    action: CallbackAction
+    values: tuple
+
+
+ACTIONS: dict[str, CallbackAction] = {}
+
+
+def callback_action(tag: str, name: str, *fields: type) -> CallbackAction:
+    if len(tag) != 1:
+        raise ValueError(f"Callback tag must be a single character, got {tag!r}")
+    if tag in ACTIONS:
+        raise ValueError(f"Callback tag {tag!r} is already used by {ACTIONS[tag].name}")
+    action = ACTIONS[tag] = CallbackAction(tag, name, fields)
+    return action
+
+
+# Теги не совпадают с первыми буквами старого формата (s, u, a, p, h), иначе старые кнопки
+# разбирались бы как новые
+SUBJECTS = callback_action("S", "subjects")
+TOGGLE_SUBJECT = callback_action("x", "toggle_subject", str)
+DESIRED_SCORE_MENU = callback_action("G", "desired_score_menu")
+DESIRED_SCORE = callback_action("g", "desired_score", str)
+ADD_SCORE_MENU = callback_action("A", "add_score_menu")
+ADD_SCORE = callback_action("b", "add_score", str)
+PROFILE = callback_action("P", "profile")
+PROFILE_STATS = callback_action("T", "profile_stats")
+PROFILE_ACHIEVEMENTS = callback_action("C", "profile_achievements")
+PROFILE_PROGRESS = callback_action("R", "profile_progress")
+SHOW_STATS = callback_action("t", "show_stats")
+# Курсор страницы истории: "f" - первая страница, "o<id>" - старше записи id, "n<id>" - новее записи id
+HISTORY_PAGE = callback_action("H", "history_page", str)
+HISTORY_DELETE = callback_action("d", "history_delete", int, str)
+HISTORY_EDIT = callback_action("e", "history_edit", int)
+
+
+class _TrieNode:
+    __slots__ = ("children", "value")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.value: Any = None
+
+
+class PrefixTrie:
+    def __init__(self):
+        self._root = _TrieNode()
+
+    def insert(self, prefix: str, value: Any) -> None:
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.value = value
+
+    def longest_match(self, text: str) -> tuple[Any, str] | None:
+        """Return (value, rest of text) for the longest inserted prefix of `text`."""
+        node, match = self._root, None
+        for index, char in enumerate(text):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.value is not None:
+                match = (node.value, text[index + 1:])
+        return match
+
+
+def _legacy_history_delete(rest: str) -> tuple:
+    score_id, _, cursor = rest.partition("_")
+    return int(score_id), cursor or "f"
+
+
+# Старый префикс -> (действие, разбор остатка в значения полей); без разбора - только точное совпадение
+_LEGACY = PrefixTrie()
+for _prefix, _action, _parse in (
+    ("subjects", SUBJECTS, None),
+    ("set_subject_", TOGGLE_SUBJECT, lambda rest: (rest,)),
+    ("unset_subject_", TOGGLE_SUBJECT, lambda rest: (rest,)),
+    ("set_desired_score", DESIRED_SCORE_MENU, None),
+    ("set_desired_score_menu_", DESIRED_SCORE_MENU, lambda rest: ()),
+    ("set_desired_score_", DESIRED_SCORE, lambda rest: (rest,)),
+    ("add_score", ADD_SCORE_MENU, None),
+    ("add_score_menu_", ADD_SCORE_MENU, lambda rest: ()),
+    ("add_score_", ADD_SCORE, lambda rest: (rest,)),
+    ("profile", PROFILE, None),
+    ("profile_stats", PROFILE_STATS, None),
+    ("profile_achievements", PROFILE_ACHIEVEMENTS, None),
+    ("profile_progress", PROFILE_PROGRESS, None),
+    ("show_stats", SHOW_STATS, None),
+    ("history_page_", HISTORY_PAGE, lambda rest: (rest or "f",)),
+    ("history_delete_", HISTORY_DELETE, _legacy_history_delete),
+    ("history_edit_", HISTORY_EDIT, lambda rest: (int(rest),)),
+):
+    _LEGACY.insert(_prefix, (_action, _parse))
+
+
+def _parse_legacy(data: str) -> ParsedCallback | None:
+    match = _LEGACY.longest_match(data)
+    if match is None:
+        return None
+    (action, parse), rest = match
+    if parse is None:
+        return ParsedCallback(action, ()) if not rest else None
+    try:
+        return ParsedCallback(action, parse(rest))
+    except ValueError:
+        return None
+
+
+def parse_callback(data: str | None) -> ParsedCallback | None:
+    """Decode callback_data of either format; None if it is not ours or malformed."""
+    if not data:
+        return None
+    action = ACTIONS.get(data[0])
+    if action is not None:
+        try:
+            return ParsedCallback(action, action.unpack(data[1:]))
+        except ValueError:
+            return None
+    return _parse_legacy(data)
+
+
+CallbackHandler = Callable[[types.CallbackQuery], Awaitable[Any]]
+
+
+class CallbackRouter:
+    """
+    A single callback_query handler that dispatches by action tag.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, CallbackHandler] = {}
+
+    def route(self, action: CallbackAction, handler: CallbackHandler) -> None:
+        if action.tag in self._handlers:
+            raise ValueError(f"Callback action {action.name} already has a handler")
+        self._handlers[action.tag] = handler
+
+    def resolve(self, call: types.CallbackQuery) -> CallbackHandler | None:
+        parsed = parse_callback(call.data)
+        return self._handlers.get(parsed.action.tag) if parsed else None
+
+    async def handle(self, call: types.CallbackQuery) -> None:
+        handler = self.resolve(call)
+        if handler is not None:
+            await handler(call)
+
+    def install(self, bot: AsyncTeleBot) -> None:
+        bot.register_callback_query_handler(self.handle, func=lambda call: self.resolve(call) is not None)
+
+
+def get_callback_router(bot: AsyncTeleBot) -> CallbackRouter:
+    """The router of `bot`, created and registered on first use."""
+    router = getattr(bot, "callback_router", None)
+    if router is None:
+        router = bot.callback_router = CallbackRouter()
+        router.install(bot)
+    return router
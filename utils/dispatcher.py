@@ -0,0 +1,167 @@
+"""
+Диспетчер обновлений между ботом и зарегистрированными обработчиками.
+
+- не больше max_concurrency обновлений обрабатываются одновременно (и держат сессии БД);
+- обновления одного пользователя выполняются строго по очереди (FIFO),
+  разные пользователи - параллельно;
+- когда в очередях max_pending обновлений, приём новых приостанавливается.
+"""
+import asyncio
+import time
+from collections import deque
+from logging import Logger
+
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from config import DISPATCH_CONCURRENCY, DISPATCH_MAX_PENDING
+
+UPDATE_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member",
+    "chat_join_request", "message_reaction",
+)
+
+
+def update_key(update: types.Update) -> int:
+    """
+    Ordering key: the sender's user id, else the chat id, else the update id (no ordering).
+    """
+    for field in UPDATE_FIELDS:
+        event = getattr(update, field, None)
+        if event is None:
+            continue
+        user = getattr(event, "from_user", None) or getattr(event, "user", None)
+        if user is not None:
+            return user.id
+        chat = getattr(event, "chat", None)
+        if chat is not None:
+            return chat.id
+    return -update.update_id
+
+
+def raw_update_key(update: dict) -> int:
+    """update_key() for a raw update dict as received from the Bot API."""
+    for field in UPDATE_FIELDS:
+        event = update.get(field)
+        if not event:
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat")
+        if chat:
+            return chat["id"]
+    return -update["update_id"]
+
+
+class UpdateDispatcher:
+    def __init__(
+        self,
+        bot: AsyncTeleBot,
+        max_concurrency: int = DISPATCH_CONCURRENCY,
+        max_pending: int = DISPATCH_MAX_PENDING,
+        logger: Logger = None,
+    ):
+        # Исходный process_new_updates, install() заменит его на экземпляре бота
+        self._handle = bot.process_new_updates
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.logger = logger
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._capacity = asyncio.Condition()
+        self._queues: dict[int, deque[tuple[types.Update, float]]] = {}
+        self._workers: set[asyncio.Task] = set()
+
+        self.pending = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_pending_seen = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def install(self, bot: AsyncTeleBot) -> None:
+        """
+        Route bot.process_new_updates through the dispatcher and make polling
+        wait for free capacity before fetching the next batch.
+        """
+        bot.process_new_updates = self.process_new_updates
+        get_updates = bot.get_updates
+
+        async def get_updates_with_backpressure(*args, **kwargs):
+            await self.wait_for_capacity()
+            return await get_updates(*args, **kwargs)
+
+        bot.get_updates = get_updates_with_backpressure
+
+    async def process_new_updates(self, updates: list[types.Update]) -> None:
+        for update in updates:
+            await self.submit(update)
+
+    async def wait_for_capacity(self) -> None:
+        if self.pending < self.max_pending:
+            return
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: self.pending < self.max_pending)
+
+    async def submit(self, update: types.Update) -> None:
+        """
+        Enqueue an update; returns once it is queued, not when it is handled.
+        """
+        await self.wait_for_capacity()
+        key = update_key(update)
+
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            worker = asyncio.create_task(self._run_queue(key, queue))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        queue.append((update, time.perf_counter()))
+
+    async def _run_queue(self, key: int, queue: deque) -> None:
+        try:
+            while queue:
+                update, enqueued_at = queue.popleft()
+                async with self._semaphore:
+                    wait_time = time.perf_counter() - enqueued_at
+                    self.wait_time_total += wait_time
+                    self.wait_time_max = max(self.wait_time_max, wait_time)
+                    self.in_flight += 1
+                    try:
+                        await self._handle([update])
+                    except Exception as e:
+                        self.failed += 1
+                        if self.logger:
+                            self.logger.error(f"Failed to process update {update.update_id}: {e}")
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+                self.pending -= 1
+                async with self._capacity:
+                    self._capacity.notify_all()
+        finally:
+            # Между проверкой пустой очереди и удалением нет await, submit не может вклиниться
+            del self._queues[key]
+
+    async def drain(self) -> None:
+        while self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "active_users": len(self._queues),
+            "max_user_queue_depth": max((len(queue) for queue in self._queues.values()), default=0),
+            "max_pending_seen": self.max_pending_seen,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_time_avg": self.wait_time_total / self.processed if self.processed else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
@@ -0,0 +1,271 @@
+"""
+Метрики обработчиков: задержка, ошибки, время в БД и в Bot API, число
+выполняющихся вызовов.
+
+Запись дешёвая: гистограммы с фиксированными границами держат счётчики в
+заранее выделенных списках, метрики обработчика создаются при регистрации,
+а время БД и API копится в объекте текущего вызова (contextvar) и попадает в
+гистограммы одним разом по завершении обработчика.
+
+Время БД меряется событиями SQLAlchemy вокруг каждого запроса, время API -
+в RateLimitedBot (вместе с ожиданием в очереди отправки) или, без него,
+вокруг HTTP-запроса telebot. Экспорт - текст Prometheus (render) через
+MetricsServer и команда /metrics для администраторов.
+"""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from logging import Logger
+from typing import Callable
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from telebot import asyncio_helper
+
+# Границы корзин в секундах, последняя корзина - +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class CallTiming:
+    """DB and API time accumulated by one handler call."""
+    __slots__ = ("db", "db_queries", "api", "api_calls")
+
+    def __init__(self):
+        self.db = 0.0
+        self.db_queries = 0
+        self.api = 0.0
+        self.api_calls = 0
+
+
+current_timing: ContextVar[CallTiming | None] = ContextVar("current_timing", default=None)
+
+
+class HandlerMetrics:
+    __slots__ = ("name", "latency", "db", "api", "calls", "errors", "in_flight")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = Histogram()
+        self.db = Histogram()
+        self.api = Histogram()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def observe(self, seconds: float, timing: CallTiming, failed: bool) -> None:
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.latency.observe(seconds)
+        self.db.observe(timing.db)
+        self.api.observe(timing.api)
+
+
+def _flatten(prefix: str, stats: dict, out: dict[str, float]) -> dict[str, float]:
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            _flatten(name, value, out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+class Metrics:
+    def __init__(self):
+        self.handlers: dict[str, HandlerMetrics] = {}
+        self.api_methods: dict[str, Histogram] = {}
+        self.api_errors = 0
+        self.db_queries = 0
+        self.started_at = time.time()
+        self._collectors: list[tuple[str, Callable[[], dict]]] = []
+        self._api_installed = False
+        self._db_engines: set[int] = set()
+
+    def handler(self, name: str) -> HandlerMetrics:
+        metrics = self.handlers.get(name)
+        if metrics is None:
+            metrics = self.handlers[name] = HandlerMetrics(name)
+        return metrics
+
+    def add_collector(self, prefix: str, collect: Callable[[], dict]) -> None:
+        """Export numbers from a stats() dict (dispatcher, outbound queue, ...) as gauges."""
+        self._collectors.append((prefix, collect))
+
+    def observe_api(self, method: str, seconds: float, failed: bool = False) -> None:
+        histogram = self.api_methods.get(method)
+        if histogram is None:
+            histogram = self.api_methods[method] = Histogram()
+        histogram.observe(seconds)
+        if failed:
+            self.api_errors += 1
+
+    def install_db(self, engine: AsyncEngine) -> None:
+        """Time every statement executed by `engine`."""
+        if id(engine.sync_engine) in self._db_engines:
+            return
+        self._db_engines.add(id(engine.sync_engine))
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine.sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            self.db_queries += 1
+            timing = current_timing.get()
+            if timing is not None:
+                timing.db += elapsed
+                timing.db_queries += 1
+
+        @event.listens_for(engine.sync_engine, "handle_error")
+        def _error(context):
+            started = context.connection.info.get("query_started") if context.connection is not None else None
+            if started:
+                started.pop()
+
+    def install_api(self) -> None:
+        """Time every Bot API request made through telebot's asyncio_helper."""
+        if self._api_installed:
+            return
+        self._api_installed = True
+        process_request = asyncio_helper._process_request
+
+        async def timed_process_request(token, url, *args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await process_request(token, url, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                self.observe_api(url, elapsed, failed)
+                # Вызов из самого обработчика; из очереди RateLimitedBot время учитывает он сам
+                timing = current_timing.get()
+                if timing is not None:
+                    timing.api += elapsed
+                    timing.api_calls += 1
+
+        asyncio_helper._process_request = timed_process_request
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for family, attr in (("latency", "latency"), ("db", "db"), ("api", "api")):
+            name = f"bot_handler_{family}_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for handler in self.handlers.values():
+                lines += getattr(handler, attr).render(name, f'handler="{handler.name}"')
+        for name, attr, kind in (("bot_handler_calls_total", "calls", "counter"),
+                                 ("bot_handler_errors_total", "errors", "counter"),
+                                 ("bot_handler_in_flight", "in_flight", "gauge")):
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [f'{name}{{handler="{handler.name}"}} {getattr(handler, attr)}' for handler in self.handlers.values()]
+
+        lines.append("# TYPE bot_api_request_seconds histogram")
+        for method, histogram in self.api_methods.items():
+            lines += histogram.render("bot_api_request_seconds", f'method="{method}"')
+        lines.append("# TYPE bot_api_errors_total counter")
+        lines.append(f"bot_api_errors_total {self.api_errors}")
+        lines.append("# TYPE bot_db_queries_total counter")
+        lines.append(f"bot_db_queries_total {self.db_queries}")
+        lines.append("# TYPE bot_uptime_seconds gauge")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started_at:.0f}")
+
+        for prefix, collect in self._collectors:
+            for name, value in _flatten(prefix, collect(), {}).items():
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Short plain-text report for the /metrics command."""
+        lines = [f"Uptime: {time.time() - self.started_at:.0f} s, DB queries: {self.db_queries}, "
+                 f"API errors: {self.api_errors}"]
+        for name, handler in sorted(self.handlers.items(), key=lambda item: -item[1].latency.sum):
+            if not handler.calls:
+                continue
+            p50, p95 = handler.latency.quantile(0.5), handler.latency.quantile(0.95)
+            lines.append(
+                f"{name}: {handler.calls} calls, {handler.errors} errors, {handler.in_flight} running, "
+                f"p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, "
+                f"db {handler.db.sum / handler.calls * 1000:.1f} ms, api {handler.api.sum / handler.calls * 1000:.1f} ms"
+            )
+        for prefix, collect in self._collectors:
+            numbers = _flatten(prefix, collect(), {})
+            lines.append(", ".join(f"{name}={value:g}" for name, value in numbers.items()))
+        return "\n".join(lines)
+
+
+metrics = Metrics()
+
+
+class MetricsServer:
+    def __init__(self, registry: Metrics = metrics, path: str = "/metrics", logger: Logger = None):
+        self.registry = registry
+        self.path = path
+        self.logger = logger
+        self._runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_get(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        if self.logger:
+            self.logger.info(f"Metrics endpoint listening on {host}:{port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
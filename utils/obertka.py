@@ -1,10 +1,15 @@
 from functools import wraps
 from typing import Optional, Callable, Any
-from db.database import get_async_db
+from config import DB_UNIT_OF_WORK
+from db.database import get_async_db, unit_of_work as db_unit_of_work
 from logging import Logger
 
 from typing import Coroutine
 import asyncio
+import time
+
+from db.profiler import query_profiler
+from utils.metrics import metrics, current_timing, CallTiming
 
 def db_handler(handler_func: Optional[Callable] = None, logger: Optional[Logger] = None):
     def _decorate(func: Callable):
@@ -30,15 +35,35 @@ def db_handler(handler_func: Optional[Callable] = None, logger: Optional[Logger]
     return _decorate
 
 
-def make_registered_handler(func: Callable, bot, logger: Optional[Logger] = None):
+def make_registered_handler(func: Callable, bot, logger: Optional[Logger] = None, unit_of_work: bool = DB_UNIT_OF_WORK):
     """Return an async wrapper that opens a DB session and calls `func` with
     signature like `func(update, db=..., logger=..., bot=...)`.
 
     The returned wrapper accepts a single positional argument (Message or CallbackQuery)
     so it can be registered directly with `bot.register_message_handler` or
     `bot.register_callback_query_handler`.
+
+    With `unit_of_work=True` (DB_UNIT_OF_WORK, on by default) the whole handler runs in
+    one transaction: crud functions only flush and the wrapper commits once on return.
+    A bot wrapped in RateLimitedBot defers outgoing requests until that commit (see
+    db.database.after_unit_of_work), so the transaction never waits on the network.
+    Handlers with slow work outside the DB (downloads, chart rendering, exports, batched
+    imports) end the transaction early with db.database.commit_unit_of_work.
+
+    Every call is recorded in utils.metrics and profiled by db.profiler under the name of `func`.
     """
-    async def _wrapper(update):
+    handler_metrics = metrics.handler(func.__name__)
+
+    async def _call(update):
+        if unit_of_work:
+            try:
+                async with db_unit_of_work() as session:
+                    return await func(update, db=session, logger=logger, bot=bot)
+            except Exception as e:
+                if logger:
+                    logger.error(f"Error in handler: {e}")
+                raise
+
         db_gen = get_async_db()
         session = await anext(db_gen)
         try:
@@ -52,4 +77,20 @@ def make_registered_handler(func: Callable, bot, logger: Optional[Logger] = None
         finally:
             await session.close()
 
+    async def _wrapper(update):
+        timing = CallTiming()
+        token = current_timing.set(timing)
+        handler_metrics.in_flight += 1
+        started = time.perf_counter()
+        failed = True
+        try:
+            with query_profiler.profile(func.__name__):
+                result = await _call(update)
+            failed = False
+            return result
+        finally:
+            handler_metrics.in_flight -= 1
+            handler_metrics.observe(time.perf_counter() - started, timing, failed)
+            current_timing.reset(token)
+
     return _wrapper
@@ -0,0 +1,295 @@
+"""
+Исходящая очередь запросов к Bot API.
+
+Telegram ограничивает бота примерно 30 сообщениями в секунду в сумме и около
+одного сообщения в секунду в один чат; при превышении приходит 429 с retry_after.
+Все отправки из обработчиков идут через OutboundQueue:
+
+- глобальный token bucket и по одному bucket на чат;
+- очередь с приоритетом: ответы пользователям (INTERACTIVE) раньше рассылок (BROADCAST);
+- запросы в один чат выполняются по порядку;
+- на 429 чат приостанавливается на retry_after, запрос повторяется;
+- внутри unit of work запрос ставится в очередь только после коммита транзакции обработчика.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from logging import Logger
+from typing import Any, Awaitable, Callable
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+
+from config import OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_MAX_RETRIES
+from db.database import after_unit_of_work
+from utils.metrics import current_timing
+
+INTERACTIVE = 0
+BROADCAST = 10
+
+# Методы AsyncTeleBot, которые отправляют что-то в чат; первый аргумент - chat_id
+CHAT_METHODS = frozenset({
+    "send_message", "send_photo", "send_document", "send_audio", "send_video", "send_animation",
+    "send_voice", "send_sticker", "send_media_group", "send_location", "send_contact", "send_poll",
+    "send_chat_action", "forward_message", "copy_message",
+    "edit_message_text", "edit_message_reply_markup", "edit_message_caption", "edit_message_media",
+    "delete_message", "delete_messages",
+})
+# Не привязаны к чату, но тоже расходуют глобальный лимит
+GLOBAL_METHODS = frozenset({"answer_callback_query"})
+
+# Bucket чата, который простаивает дольше этого времени, удаляется
+IDLE_BUCKET_TTL = 60.0
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = min(self.tokens, 0)
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "call", "future", "attempts", "enqueued_at")
+
+    def __init__(self, priority: int, seq: int, chat_id: int | str | None, call: Callable[[], Awaitable[Any]]):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Chat:
+    __slots__ = ("bucket", "jobs", "busy", "last_used")
+
+    def __init__(self, bucket: TokenBucket | None):
+        self.bucket = bucket
+        self.jobs: list[_Job] = []  # heap
+        self.busy = False
+        self.last_used = time.monotonic()
+
+
+class OutboundQueue:
+    """
+    Scheduler: a chat is "ready" when it has jobs, no request in flight and a token.
+    The best job among ready chats is sent when the global bucket allows it.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        chat_burst: float = OUTBOUND_CHAT_BURST,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+        logger: Logger = None,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.logger = logger
+
+        self._seq = itertools.count()
+        self._chats: dict[int | str | None, _Chat] = {}
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _chat(self, chat_id) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            # Запросы без чата (chat_id=None) ограничены только глобальным лимитом и идут параллельно
+            bucket = None if chat_id is None else TokenBucket(self.chat_rate, self.chat_burst)
+            chat = self._chats[chat_id] = _Chat(bucket)
+        return chat
+
+    def submit(self, chat_id, call: Callable[[], Awaitable[Any]], priority: int = INTERACTIVE) -> asyncio.Future:
+        job = _Job(priority, next(self._seq), chat_id, call)
+        heapq.heappush(self._chat(chat_id).jobs, job)
+        if self._worker is None or self._worker.done():
+            # Отправитель не должен наследовать контекст обработчика, который его запустил
+            self._worker = contextvars.Context().run(asyncio.create_task, self._run())
+        self._wakeup.set()
+        return job.future
+
+    async def call(self, chat_id, call: Callable[[], Awaitable[Any]], priority: int = INTERACTIVE) -> Any:
+        return await self.submit(chat_id, call, priority)
+
+    def _pick(self, now: float) -> tuple[_Chat | None, float]:
+        """Return the ready chat with the best head job, or the time until one becomes ready."""
+        best: _Chat | None = None
+        next_delay = float("inf")
+        idle = []
+        for chat_id, chat in self._chats.items():
+            if not chat.jobs:
+                if not chat.busy and now - chat.last_used > IDLE_BUCKET_TTL:
+                    idle.append(chat_id)
+                continue
+            if chat.busy:
+                continue
+            delay = chat.bucket.delay(now) if chat.bucket is not None else 0.0
+            if delay > 0:
+                next_delay = min(next_delay, delay)
+            elif best is None or chat.jobs[0] < best.jobs[0]:
+                best = chat
+        for chat_id in idle:
+            del self._chats[chat_id]
+        return best, next_delay
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            chat, next_delay = self._pick(now)
+            if chat is None:
+                if next_delay == float("inf") and not self._in_flight and not any(c.jobs for c in self._chats.values()):
+                    return
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=None if next_delay == float("inf") else next_delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            global_delay = self.global_bucket.delay(now)
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            job = heapq.heappop(chat.jobs)
+            self.global_bucket.take(now)
+            if chat.bucket is not None:
+                chat.bucket.take(now)
+                chat.busy = True
+            self._in_flight.add(asyncio.create_task(self._execute(chat, job)))
+
+    async def _execute(self, chat: _Chat, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except ApiTelegramException as e:
+            retry_after = (e.result_json.get("parameters") or {}).get("retry_after")
+            if e.error_code == 429 and retry_after is not None and job.attempts <= self.max_retries:
+                self.retried += 1
+                if self.logger:
+                    self.logger.warning(f"Telegram 429 for chat {job.chat_id}, retrying in {retry_after} s")
+                until = time.monotonic() + float(retry_after)
+                (chat.bucket or self.global_bucket).block(until)
+                heapq.heappush(chat.jobs, job)
+            else:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            # Убираем задачу здесь, а не в done_callback, чтобы _run сразу видел, что запросов в полёте нет
+            self._in_flight.discard(asyncio.current_task())
+            chat.busy = False
+            chat.last_used = time.monotonic()
+            self._wakeup.set()
+
+    async def drain(self) -> None:
+        while self._worker is not None and not self._worker.done():
+            await asyncio.shield(self._worker)
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(chat.jobs) for chat in self._chats.values()),
+            "in_flight": len(self._in_flight),
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+class RateLimitedBot:
+    """
+    Proxy over AsyncTeleBot: chat methods go through OutboundQueue, everything else
+    (handlers registration, states, get_file ...) is forwarded as is.
+    """
+
+    def __init__(self, bot: AsyncTeleBot, queue: OutboundQueue, priority: int = INTERACTIVE):
+        self._bot = bot
+        self._queue = queue
+        self._priority = priority
+
+    @property
+    def bot(self) -> AsyncTeleBot:
+        return self._bot
+
+    @property
+    def outbound(self) -> OutboundQueue:
+        return self._queue
+
+    def with_priority(self, priority: int) -> "RateLimitedBot":
+        """`bot.with_priority(BROADCAST).send_message(...)` for mass mailings."""
+        return RateLimitedBot(self._bot, self._queue, priority)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._bot, name)
+        if name not in CHAT_METHODS and name not in GLOBAL_METHODS:
+            return attr
+
+        async def send(*args, **kwargs):
+            chat_id = None
+            if name in CHAT_METHODS:
+                # У edit_message_* первым позиционным идёт не chat_id, поэтому сначала kwargs
+                chat_id = kwargs["chat_id"] if "chat_id" in kwargs else (args[0] if args else None)
+            timing = current_timing.get()
+            if timing is None:
+                return await self._queue.call(chat_id, lambda: attr(*args, **kwargs), self._priority)
+            started = time.perf_counter()
+            try:
+                return await self._queue.call(chat_id, lambda: attr(*args, **kwargs), self._priority)
+            finally:
+                timing.api += time.perf_counter() - started
+                timing.api_calls += 1
+
+        async def limited(*args, **kwargs):
+            # Данные, о которых сообщаем пользователю, должны быть закоммичены до отправки,
+            # но транзакция не должна ждать сеть: внутри unit of work запрос уходит после коммита
+            # и обработчик получает None вместо результата
+            return await after_unit_of_work(lambda: send(*args, **kwargs))
+
+        return limited
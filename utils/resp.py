@@ -0,0 +1,144 @@
+"""
+Минимальный асинхронный клиент протокола Redis (RESP2) без внешних зависимостей.
+
+Одно соединение, команды конвейеризуются: запрос пишется сразу, ответы
+разбираются фоновой задачей по порядку и раздаются ожидающим future.
+"""
+import asyncio
+from collections import deque
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply (-ERR ...) from the server."""
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            value = arg
+        elif isinstance(arg, str):
+            value = arg.encode("utf-8")
+        else:
+            value = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode("utf-8")
+    if prefix == b"-":
+        return RespError(payload.decode("utf-8"))
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f"Protocol error: unexpected reply {line!r}")
+
+
+class RespClient:
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._pending: deque[asyncio.Future] = deque()
+        self._reader_task: asyncio.Task | None = None
+        self._connect_lock = asyncio.Lock()
+        # Соединение открыто и AUTH/SELECT подтверждены: до этого команды ждут в _connect
+        self._ready = False
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            if self._ready:
+                return
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._reader, self._writer = reader, writer
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+            try:
+                if self.password:
+                    await self._send("AUTH", self.password)
+                if self.db:
+                    await self._send("SELECT", self.db)
+            except BaseException:
+                # Неверный пароль или номер базы: команды не должны уйти в чужую базу
+                await self.close()
+                raise
+            self._ready = True
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, RespError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self._disconnect(ConnectionError(f"Connection to {self.host}:{self.port} lost: {e}"))
+        except asyncio.CancelledError:
+            self._disconnect(ConnectionError("Client closed"))
+            raise
+
+    def _disconnect(self, error: Exception) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._ready = False
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    def _send(self, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._writer.write(encode_command(*args))
+        self._pending.append(future)
+        return future
+
+    async def execute(self, *args):
+        if not self._ready:
+            await self._connect()
+        return await self._send(*args)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes | str, ex: int | None = None) -> None:
+        if ex is None:
+            await self.execute("SET", key, value)
+        else:
+            await self.execute("SET", key, value, "EX", ex)
+
+    async def delete(self, *keys: str) -> int:
+        return await self.execute("DEL", *keys)
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        self._disconnect(ConnectionError("Client closed"))
@@ -0,0 +1,83 @@
+"""
+Заранее собранные клавиатуры ответов.
+
+PreparedMarkup сериализует клавиатуру в JSON один раз: telebot принимает его
+вместо InlineKeyboardMarkup и берёт готовую строку (to_json), respond()
+сравнивает клавиатуры по закэшированному to_dict. Статические меню собираются при
+импорте, клавиатуры выбора предметов кэшируются по битовой маске выбранных
+предметов (subject_registry.mask) и версии каталога.
+"""
+from __future__ import annotations
+
+import json
+from functools import lru_cache
+from typing import Iterable
+
+from telebot import types
+
+from utils.callbacks import (
+    CallbackAction, SUBJECTS, TOGGLE_SUBJECT, DESIRED_SCORE_MENU, ADD_SCORE_MENU,
+    PROFILE, PROFILE_STATS, PROFILE_ACHIEVEMENTS, PROFILE_PROGRESS,
+)
+from utils.subjects import subject_registry
+
+SUBJECT_KEYBOARD_CACHE_SIZE = 1024
+
+
+class PreparedMarkup(types.JsonSerializable, types.Dictionaryable):
+    """
+    Immutable keyboard with its dict and JSON computed once.
+    """
+    __slots__ = ("_dict", "_json")
+
+    def __init__(self, markup: types.InlineKeyboardMarkup):
+        self._dict = markup.to_dict()
+        self._json = json.dumps(self._dict)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Iterable[types.InlineKeyboardButton]]) -> PreparedMarkup:
+        markup = types.InlineKeyboardMarkup()
+        for row in rows:
+            markup.row(*row)
+        return cls(markup)
+
+    def to_dict(self) -> dict:
+        return self._dict
+
+    def to_json(self) -> str:
+        return self._json
+
+
+MAIN_MENU = PreparedMarkup.from_rows([
+    [SUBJECTS.button("📚 Выбрать предметы"), ADD_SCORE_MENU.button("➕ Добавить балл")],
+    [DESIRED_SCORE_MENU.button("🎯 Установить цель"), PROFILE.button("📊 Профиль")],
+])
+
+PROFILE_MENU = PreparedMarkup.from_rows([
+    [PROFILE_STATS.button("📊 Статистика"), PROFILE_ACHIEVEMENTS.button("🏆 Достижения")],
+    [PROFILE_PROGRESS.button("📈 Прогресс"), PROFILE.button("🔄 Обновить")],
+])
+
+
+@lru_cache(maxsize=SUBJECT_KEYBOARD_CACHE_SIZE)
+def _subjects_grid(mask: int, version: int) -> PreparedMarkup:
+    buttons = [
+        TOGGLE_SUBJECT.button(f"✅ {subject.name}" if mask >> bit & 1 else subject.name, subject.id)
+        for bit, subject in enumerate(subject_registry)
+    ]
+    return PreparedMarkup.from_rows(buttons[i:i + 2] for i in range(0, len(buttons), 2))
+
+
+def subjects_grid(selected_ids: Iterable[str]) -> PreparedMarkup:
+    """Two-column grid of all subjects, selected ones marked with ✅."""
+    return _subjects_grid(subject_registry.mask(selected_ids), subject_registry.version)
+
+
+@lru_cache(maxsize=SUBJECT_KEYBOARD_CACHE_SIZE)
+def _subject_choice(action: CallbackAction, mask: int, version: int) -> PreparedMarkup:
+    return PreparedMarkup.from_rows([action.button(subject.name, subject.id)] for subject in subject_registry.from_mask(mask))
+
+
+def subject_choice(action: CallbackAction, subject_ids: Iterable[str]) -> PreparedMarkup:
+    """One button per subject, in registry order, each sending `action` with the subject id."""
+    return _subject_choice(action, subject_registry.mask(subject_ids), subject_registry.version)
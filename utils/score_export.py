@@ -0,0 +1,95 @@
+import csv
+import datetime
+import io
+import json
+from typing import AsyncIterator, BinaryIO, Iterable, Sequence
+
+from sqlalchemy import Row
+
+from db.models import UserSubjectAssociation
+from utils.subjects import subject_registry
+
+EXPORT_FORMATS = ("csv", "jsonl")
+# Колонки совместимы с /import: строки с kind=goal при импорте пропускаются
+EXPORT_COLUMNS = ("kind", "subject_id", "subject_name", "score", "exam_date", "created_at")
+ADMIN_EXPORT_COLUMNS = ("kind", "user_id", "subject_id", "subject_name", "score", "exam_date", "created_at")
+
+
+def parse_export_format(text: str | None) -> str:
+    """
+    `/export jsonl` -> "jsonl", anything else -> "csv".
+    """
+    parts = (text or "").split()
+    if len(parts) > 1 and parts[1].lower() in EXPORT_FORMATS:
+        return parts[1].lower()
+    return "csv"
+
+
+def _serialize(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _score_record(row: Row) -> dict:
+    return {
+        "kind": "score",
+        "user_id": row.user_id,
+        "subject_id": row.subject_id,
+        "subject_name": row.subject_name,
+        "score": row.score,
+        "exam_date": _serialize(row.exam_date),
+        "created_at": _serialize(row.created_at),
+    }
+
+
+def _goal_record(goal: UserSubjectAssociation) -> dict:
+    return {
+        "kind": "goal",
+        "user_id": goal.user_id,
+        "subject_id": goal.subject_id,
+        "subject_name": subject_registry.name(goal.subject_id),
+        "score": goal.desired_score,
+        "exam_date": None,
+        "created_at": None,
+    }
+
+
+def _encode(records: Iterable[dict], export_format: str, columns: Sequence[str]) -> bytes:
+    if export_format == "jsonl":
+        return "".join(
+            json.dumps({column: record[column] for column in columns}, ensure_ascii=False) + "\n"
+            for record in records
+        ).encode("utf-8")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([
+        ["" if record[column] is None else record[column] for column in columns]
+        for record in records
+    ])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def write_scores_export(
+    out: BinaryIO,
+    export_format: str,
+    chunks: AsyncIterator[Sequence[Row]],
+    goals: Iterable[UserSubjectAssociation] = (),
+    include_user_id: bool = False,
+) -> int:
+    """
+    Write goals and then score chunks into `out` one chunk at a time.
+    Returns the number of exported scores.
+    """
+    columns = ADMIN_EXPORT_COLUMNS if include_user_id else EXPORT_COLUMNS
+    if export_format == "csv":
+        out.write(b"\xef\xbb\xbf" + ",".join(columns).encode("utf-8") + b"\r\n")
+
+    out.write(_encode((_goal_record(goal) for goal in goals), export_format, columns))
+
+    count = 0
+    async for chunk in chunks:
+        out.write(_encode((_score_record(row) for row in chunk), export_format, columns))
+        count += len(chunk)
+    return count
@@ -0,0 +1,116 @@
+import csv
+import datetime
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from utils.subjects import subject_registry
+
+HEADER_ALIASES = {
+    "subject": ("subject", "subject_id", "предмет"),
+    "score": ("score", "балл", "баллы"),
+    "exam_date": ("exam_date", "date", "дата"),
+    "kind": ("kind", "тип"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d.%m.%y")
+
+
+@dataclass(frozen=True, slots=True)
+class ImportedScore:
+    line: int
+    subject_id: str
+    subject_name: str
+    score: int
+    exam_date: datetime.date | None
+
+
+@dataclass(frozen=True, slots=True)
+class RejectedRow:
+    line: int
+    reason: str
+
+
+def detect_delimiter(first_line: str) -> str:
+    for delimiter in ("\t", ";", ","):
+        if delimiter in first_line:
+            return delimiter
+    return ","
+
+
+def _parse_date(value: str) -> datetime.date | None:
+    value = value.strip()
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"не удалось разобрать дату {value!r}")
+
+
+def _columns_from_header(row: list[str]) -> dict[str, int] | None:
+    names = [cell.strip().casefold() for cell in row]
+    columns = {}
+    for column, aliases in HEADER_ALIASES.items():
+        for i, name in enumerate(names):
+            if name in aliases:
+                columns[column] = i
+                break
+    if "subject" in columns and "score" in columns:
+        return columns
+    return None
+
+
+def _parse_row(line: int, row: list[str], columns: dict[str, int]) -> ImportedScore | RejectedRow:
+    def cell(column: str) -> str:
+        index = columns.get(column)
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    subject = subject_registry.find(cell("subject"))
+    if subject is None:
+        return RejectedRow(line, f"неизвестный предмет {cell('subject')!r}")
+
+    try:
+        score = int(cell("score"))
+    except ValueError:
+        return RejectedRow(line, f"балл {cell('score')!r} не является числом")
+    if not 0 <= score <= subject.max_score:
+        return RejectedRow(line, f"балл {score} вне диапазона 0..{subject.max_score}")
+
+    try:
+        exam_date = _parse_date(cell("exam_date"))
+    except ValueError as e:
+        return RejectedRow(line, str(e))
+
+    return ImportedScore(line, subject.id, subject.name, score, exam_date)
+
+
+def iter_score_rows(lines: Iterable[str]) -> Iterator[ImportedScore | RejectedRow]:
+    """
+    Lazily parse CSV/TSV lines into scores. The delimiter is detected from the first line.
+    A header row (subject, score, exam_date) is optional; without it columns are positional.
+    Rows with a `kind` column other than "score" (e.g. goals from /export) are skipped.
+    """
+    lines = iter(lines)
+    first_line = next(lines, None)
+    if first_line is None:
+        return
+
+    def all_lines() -> Iterator[str]:
+        yield first_line
+        yield from lines
+
+    reader = csv.reader(all_lines(), delimiter=detect_delimiter(first_line))
+    columns = {"subject": 0, "score": 1, "exam_date": 2}
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if reader.line_num == 1:
+            header_columns = _columns_from_header(row)
+            if header_columns is not None:
+                columns = header_columns
+                continue
+        kind_index = columns.get("kind")
+        if kind_index is not None and kind_index < len(row) and row[kind_index].strip() not in ("", "score"):
+            continue
+        yield _parse_row(reader.line_num, row, columns)
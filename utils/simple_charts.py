@@ -1,28 +1,13 @@
 # Этот кусок кода был написан DeepSeek, за качество не отвечаю
 
 import matplotlib.pyplot as plt
+import asyncio
 import io
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from datetime import datetime
 
-SUBJECT_COLORS = {
-    "math_profile": "#FF6B6B",  # Красный
-    "math_basic": "#4ECDC4",     # Бирюзовый
-    "russian": "#45B7D1",        # Голубой
-    "physics": "#96CEB4",        # Светло-зеленый
-    "chemistry": "#FFEAA7",      # Желтый
-    "biology": "#DDA0DD",        # Фиолетовый
-    "informatics": "#98D8C8",    # Мятный
-    "history": "#F7DC6F",        # Золотой
-    "social": "#BB8FCE",         # Лавандовый
-    "geography": "#82E0AA",      # Зеленый
-    "literature": "#F1948A",     # Коралловый
-    "english": "#85C1E9",        # Небесный
-    "german": "#F8C471",         # Оранжевый
-    "french": "#D7BDE2",         # Сиреневый
-    "spanish": "#76D7C4",        # Бирюза
-    "chinese": "#F9E79F",        # Бежевый
-}
+from utils.subjects import subject_registry, DEFAULT_COLOR
 
 def generate_simple_progress_chart(scores_data: Dict[str, List[tuple]]) -> io.BytesIO:
     fig, ax = plt.subplots(figsize=(14, 8))
@@ -38,7 +23,8 @@ def generate_simple_progress_chart(scores_data: Dict[str, List[tuple]]) -> io.By
         dates = [d[0] for d in data]
         scores = [d[1] for d in data]
         
-        color = SUBJECT_COLORS.get(subject_id, "#000000")
+        subject = subject_registry.get(subject_id)
+        color = subject.color if subject else DEFAULT_COLOR
         
         line, = ax.plot(dates, scores, 
                        marker='o', 
@@ -46,8 +32,7 @@ def generate_simple_progress_chart(scores_data: Dict[str, List[tuple]]) -> io.By
                        markersize=6,
                        color=color)
         
-        from utils.subjects import EGE_SUBJECTS_DICT
-        subject_name = EGE_SUBJECTS_DICT.get(subject_id, subject_id)
+        subject_name = subject.name if subject else subject_id
         legend_handles.append(line)
         legend_labels.append(subject_name)
     
@@ -71,4 +56,15 @@ def generate_simple_progress_chart(scores_data: Dict[str, List[tuple]]) -> io.By
     plt.close(fig)
     buf.seek(0)
     
-    return buf
\ No newline at end of file
+    return buf
+
+
+# Отрисовка занимает сотни миллисекунд CPU и останавливала бы цикл событий вместе со всеми
+# обработчиками (в том числе держащими блокировку записи SQLite). pyplot хранит глобальное
+# состояние, поэтому графики рисуются по одному в отдельном потоке
+_chart_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="charts")
+
+
+async def render_simple_progress_chart(scores_data: Dict[str, List[tuple]]) -> io.BytesIO:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_chart_executor, generate_simple_progress_chart, scores_data)
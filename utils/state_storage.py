@@ -0,0 +1,268 @@
+"""
+Хранилища FSM-состояний, общие для нескольких процессов бота.
+
+Состояние и данные диалога (например, выбранный предмет) лежат одной записью
+под ключом telebot, так что их можно записать за один запрос (set_state_with_data).
+Записи живут STATE_TTL секунд с последней записи.
+
+- DatabaseStateStorage: таблица conversation_states; внутри unit of work пишет в
+  транзакцию обработчика, просроченные записи удаляются фоновой задачей пачками.
+- RedisStateStorage: JSON под ключом с EX, протокол Redis (utils.resp).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import AsyncIterator
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from telebot.asyncio_storage import StateMemoryStorage
+from telebot.asyncio_storage.base_storage import StateStorageBase, StateDataContext
+
+from config import STATE_BACKEND, REDIS_URL, STATE_TTL, STATE_EXPIRY_INTERVAL
+from utils.resp import RespClient
+
+EXPIRY_BATCH_SIZE = 500
+
+
+class KeyValueStateStorage(StateStorageBase, ABC):
+    """
+    StateStorageBase on top of three primitives: _load, _store and _delete of a
+    {"state": ..., "data": {...}} record.
+    """
+
+    def __init__(self, ttl: int = STATE_TTL, prefix: str = "telebot", separator: str = ":"):
+        super().__init__()
+        self.ttl = ttl
+        self.prefix = prefix
+        self.separator = separator
+
+    @abstractmethod
+    async def _load(self, key: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    async def _store(self, key: str, record: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def _delete(self, key: str) -> bool:
+        ...
+
+    def start(self) -> None:
+        """Start background tasks (if any); called once the event loop is running."""
+
+    async def close(self) -> None:
+        pass
+
+    def _key(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None) -> str:
+        return self._get_key(
+            chat_id, user_id, self.prefix, self.separator,
+            business_connection_id, message_thread_id, bot_id,
+        )
+
+    async def set_state_with_data(self, chat_id, user_id, state, data: dict,
+                                  business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        """Replace the state and its data with a single write."""
+        if hasattr(state, "name"):
+            state = state.name
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        await self._store(key, {"state": state, "data": dict(data)})
+        return True
+
+    async def set_state(self, chat_id, user_id, state,
+                        business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        if hasattr(state, "name"):
+            state = state.name
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = await self._load(key) or {"state": None, "data": {}}
+        record["state"] = state
+        await self._store(key, record)
+        return True
+
+    async def get_state(self, chat_id, user_id,
+                        business_connection_id=None, message_thread_id=None, bot_id=None) -> str | None:
+        record = await self._load(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record["state"] if record else None
+
+    async def delete_state(self, chat_id, user_id,
+                           business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        return await self._delete(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+
+    async def set_data(self, chat_id, user_id, key, value,
+                       business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        record_key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = await self._load(record_key)
+        if record is None:
+            raise RuntimeError(f"{type(self).__name__}: key {record_key} does not exist.")
+        record["data"][key] = value
+        await self._store(record_key, record)
+        return True
+
+    async def get_data(self, chat_id, user_id,
+                       business_connection_id=None, message_thread_id=None, bot_id=None) -> dict:
+        record = await self._load(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record["data"] if record else {}
+
+    async def reset_data(self, chat_id, user_id,
+                         business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = await self._load(key)
+        if record is None:
+            return False
+        record["data"] = {}
+        await self._store(key, record)
+        return True
+
+    def get_interactive_data(self, chat_id, user_id,
+                             business_connection_id=None, message_thread_id=None, bot_id=None):
+        return StateDataContext(
+            self, chat_id=chat_id, user_id=user_id,
+            business_connection_id=business_connection_id,
+            message_thread_id=message_thread_id, bot_id=bot_id,
+        )
+
+    async def save(self, chat_id, user_id, data,
+                   business_connection_id=None, message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = await self._load(key)
+        if record is None:
+            return False
+        record["data"] = data
+        await self._store(key, record)
+        return True
+
+
+class DatabaseStateStorage(KeyValueStateStorage):
+    def __init__(self, ttl: int = STATE_TTL, expiry_interval: float = STATE_EXPIRY_INTERVAL,
+                 logger: Logger = None, **kwargs):
+        super().__init__(ttl=ttl, **kwargs)
+        self.expiry_interval = expiry_interval
+        self.logger = logger
+        self._expiry_task: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        from db.database import AsyncSessionLocal, current_unit_of_work
+
+        # В обработчике пишем в его транзакцию: отдельное соединение к SQLite ждало бы её блокировку
+        session = current_unit_of_work.get()
+        if session is not None:
+            yield session
+            return
+        async with AsyncSessionLocal() as session:
+            yield session
+            if session.in_transaction():
+                await session.commit()
+
+    async def _load(self, key: str) -> dict | None:
+        from db.models import ConversationState
+
+        query = select(ConversationState.state, ConversationState.data).where(
+            ConversationState.key == key,
+            ConversationState.expires_at > time.time(),
+        )
+        async with self._session() as session:
+            row = (await session.execute(query)).first()
+        if row is None:
+            return None
+        return {"state": row.state, "data": dict(row.data or {})}
+
+    async def _store(self, key: str, record: dict) -> None:
+        from db.crud import _dialect_insert
+        from db.models import ConversationState
+
+        async with self._session() as session:
+            query = _dialect_insert(session, ConversationState).values(
+                key=key, state=record["state"], data=record["data"], expires_at=time.time() + self.ttl
+            )
+            query = query.on_conflict_do_update(
+                index_elements=[ConversationState.key],
+                set_={
+                    "state": query.excluded.state,
+                    "data": query.excluded.data,
+                    "expires_at": query.excluded.expires_at,
+                },
+            )
+            await session.execute(query)
+
+    async def _delete(self, key: str) -> bool:
+        from db.models import ConversationState
+
+        query = delete(ConversationState).where(ConversationState.key == key).returning(ConversationState.key)
+        async with self._session() as session:
+            return (await session.execute(query)).first() is not None
+
+    async def expire(self, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+        """
+        Delete expired records in batches of `batch_size`, one short transaction per batch.
+        """
+        from db.database import AsyncSessionLocal
+        from db.models import ConversationState
+
+        removed = 0
+        while True:
+            batch = select(ConversationState.key).where(
+                ConversationState.expires_at <= time.time()
+            ).limit(batch_size).scalar_subquery()
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(delete(ConversationState).where(ConversationState.key.in_(batch)))
+                await session.commit()
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                return removed
+            await asyncio.sleep(0)
+
+    async def _expire_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.expiry_interval)
+            try:
+                removed = await self.expire()
+                if removed and self.logger:
+                    self.logger.info(f"Expired {removed} conversation states")
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Failed to expire conversation states: {e}")
+
+    def start(self) -> None:
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(self._expire_forever())
+
+    async def close(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+
+
+class RedisStateStorage(KeyValueStateStorage):
+    """Records are JSON strings with EX=ttl; expiry is left to the server."""
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = STATE_TTL, **kwargs):
+        super().__init__(ttl=ttl, **kwargs)
+        self.client = RespClient(url)
+
+    async def _load(self, key: str) -> dict | None:
+        value = await self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def _store(self, key: str, record: dict) -> None:
+        await self.client.set(key, json.dumps(record, ensure_ascii=False), ex=self.ttl)
+
+    async def _delete(self, key: str) -> bool:
+        return await self.client.delete(key) > 0
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_state_storage(backend: str = STATE_BACKEND, logger: Logger = None) -> StateStorageBase:
+    if backend == "db":
+        return DatabaseStateStorage(logger=logger)
+    if backend == "redis":
+        return RedisStateStorage()
+    return StateMemoryStorage()
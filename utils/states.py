@@ -3,4 +3,6 @@ from telebot.states import State, StatesGroup
 
 class SpecialStates(StatesGroup):
     AWAITING_USER_DESIRED_SCORE = State()
-    WAITING_FOR_SCORE_INPUT = State()
\ No newline at end of file
+    WAITING_FOR_SCORE_INPUT = State()
+    AWAITING_IMPORT_FILE = State()
+    WAITING_FOR_SCORE_EDIT = State()
@@ -1,3 +1,7 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping
+
 EGE_SUBJECTS_DICT = {
     "math_profile": "Математика (профиль)",
     "math_basic": "Математика (базовая)",
@@ -17,3 +21,106 @@ EGE_SUBJECTS_DICT = {
     "chinese": "Китайский язык"
 }
 
+SUBJECT_COLORS = {
+    "math_profile": "#FF6B6B",  # Красный
+    "math_basic": "#4ECDC4",     # Бирюзовый
+    "russian": "#45B7D1",        # Голубой
+    "physics": "#96CEB4",        # Светло-зеленый
+    "chemistry": "#FFEAA7",      # Желтый
+    "biology": "#DDA0DD",        # Фиолетовый
+    "informatics": "#98D8C8",    # Мятный
+    "history": "#F7DC6F",        # Золотой
+    "social": "#BB8FCE",         # Лавандовый
+    "geography": "#82E0AA",      # Зеленый
+    "literature": "#F1948A",     # Коралловый
+    "english": "#85C1E9",        # Небесный
+    "german": "#F8C471",         # Оранжевый
+    "french": "#D7BDE2",         # Сиреневый
+    "spanish": "#76D7C4",        # Бирюза
+    "chinese": "#F9E79F",        # Бежевый
+}
+
+DEFAULT_MAX_SCORE = 100
+DEFAULT_COLOR = "#000000"
+
+
+@dataclass(frozen=True, slots=True)
+class SubjectInfo:
+    id: str
+    name: str
+    max_score: int = DEFAULT_MAX_SCORE
+    color: str = DEFAULT_COLOR
+
+
+class SubjectRegistry:
+    """
+    In-memory каталог предметов. Записи неизменяемые, сам каталог подменяется целиком
+    один раз при старте (см. crud.load_subject_registry), после этого только читается.
+    """
+
+    def __init__(self, subjects: Iterable[SubjectInfo]):
+        self.version = 0
+        self._set(subjects)
+
+    def _set(self, subjects: Iterable[SubjectInfo]) -> None:
+        self._subjects: Mapping[str, SubjectInfo] = MappingProxyType({s.id: s for s in subjects})
+        self._bits: Mapping[str, int] = MappingProxyType({subject_id: 1 << i for i, subject_id in enumerate(self._subjects)})
+
+    @classmethod
+    def from_static(cls) -> "SubjectRegistry":
+        return cls(
+            SubjectInfo(id=subject_id, name=name, color=SUBJECT_COLORS.get(subject_id, DEFAULT_COLOR))
+            for subject_id, name in EGE_SUBJECTS_DICT.items()
+        )
+
+    def load(self, subjects: Iterable[SubjectInfo]) -> None:
+        self._set(subjects)
+        self.version += 1
+
+    def get(self, subject_id: str) -> SubjectInfo | None:
+        return self._subjects.get(subject_id)
+
+    def name(self, subject_id: str) -> str | None:
+        subject = self._subjects.get(subject_id)
+        return subject.name if subject else None
+
+    def find(self, value: str) -> SubjectInfo | None:
+        """
+        Look up a subject by id or by its name, case-insensitive.
+        """
+        value = value.strip()
+        subject = self._subjects.get(value)
+        if subject is not None:
+            return subject
+        value = value.casefold()
+        for subject in self._subjects.values():
+            if subject.id.casefold() == value or subject.name.casefold() == value:
+                return subject
+        return None
+
+    def mask(self, subject_ids: Iterable[str]) -> int:
+        """
+        Bitmask of `subject_ids` by position in the registry; unknown ids are ignored.
+        """
+        mask = 0
+        for subject_id in subject_ids:
+            mask |= self._bits.get(subject_id, 0)
+        return mask
+
+    def from_mask(self, mask: int) -> list[SubjectInfo]:
+        return [self._subjects[subject_id] for subject_id, bit in self._bits.items() if mask & bit]
+
+    def ids(self) -> list[str]:
+        return list(self._subjects)
+
+    def __contains__(self, subject_id: object) -> bool:
+        return subject_id in self._subjects
+
+    def __iter__(self) -> Iterator[SubjectInfo]:
+        return iter(self._subjects.values())
+
+    def __len__(self) -> int:
+        return len(self._subjects)
+
+
+subject_registry = SubjectRegistry.from_static()
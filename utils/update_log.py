@@ -0,0 +1,56 @@
+"""
+Запись входящих обновлений в JSONL для повторного прогона (benchmarks.loadtest --replay).
+
+Строка файла: {"t": секунды от начала записи, "update": сырое обновление Bot API}.
+Включается UPDATE_LOG_PATH: при polling оборачивается asyncio_helper.get_updates
+(им пользуются и main.py, и супервизор), при webhook запись делает WebhookServer.
+В файл попадают настоящие id и тексты пользователей - храните его как личные данные.
+"""
+from __future__ import annotations
+
+import json
+import time
+from typing import Iterator
+
+from telebot import asyncio_helper
+
+
+class UpdateRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._started = time.monotonic()
+        # Построчная буферизация: запись не теряется, если процесс убит
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, update: dict) -> None:
+        line = json.dumps({"t": round(time.monotonic() - self._started, 4), "update": update}, ensure_ascii=False)
+        self._file.write(line + "\n")
+        self.recorded += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def record_polled_updates(recorder: UpdateRecorder) -> None:
+    """Record every update fetched through asyncio_helper.get_updates."""
+    get_updates = asyncio_helper.get_updates
+
+    async def recording_get_updates(token, offset=None, *args, **kwargs):
+        updates = await get_updates(token, offset, *args, **kwargs)
+        if offset is not None and offset < 0:
+            return updates  # skip_pending: эти обновления бот отбрасывает
+        for update in updates:
+            recorder.record(update)
+        return updates
+
+    asyncio_helper.get_updates = recording_get_updates
+
+
+def read_update_log(path: str) -> Iterator[tuple[float, dict]]:
+    """Yield (seconds since the start of recording, raw update) in file order."""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry["t"], entry["update"]
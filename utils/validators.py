@@ -28,6 +28,12 @@ def validate_user_data_update(data: dict) -> dict:
     user = UserUpdate(**data)
     return user.model_dump(exclude_unset=True)
 
+def user_fingerprint(data: dict) -> tuple:
+    """
+    Cheap fingerprint of raw user data over the UserCreate fields, no validation involved.
+    """
+    return tuple(data.get(field) for field in UserCreate.model_fields)
+
 
 
 class TelegramEvent:
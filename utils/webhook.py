@@ -0,0 +1,139 @@
+"""
+Приём обновлений Telegram через webhook на встроенном aiohttp-сервере.
+
+Telegram ждёт ответа на каждый POST и не присылает следующее обновление,
+пока не получит его, поэтому обработка запускается отдельной задачей,
+а сервер отвечает 200 сразу после проверки секрета и разбора JSON.
+С диспетчером ответ задерживается только пока его очереди заполнены,
+так Telegram сам притормаживает отправку.
+Супервизор передаёт forward и получает сырые обновления без разбора в объекты.
+"""
+import asyncio
+import hmac
+import json
+from logging import Logger
+from typing import Awaitable, Callable
+
+from aiohttp import web
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from utils.dispatcher import UpdateDispatcher
+from utils.update_log import UpdateRecorder
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        bot: AsyncTeleBot,
+        secret: str,
+        path: str = "/webhook",
+        dispatcher: UpdateDispatcher | None = None,
+        forward: Callable[[dict], Awaitable[None]] | None = None,
+        recorder: UpdateRecorder | None = None,
+        logger: Logger = None,
+    ):
+        self.bot = bot
+        self.recorder = recorder
+        self.dispatcher = dispatcher
+        self.forward = forward
+        self.secret = secret
+        self.path = path
+        self.logger = logger
+        self._tasks: set[asyncio.Task] = set()
+        self._runner: web.AppRunner | None = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.on_shutdown.append(self._drain)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return web.Response(status=403)
+
+        try:
+            payload = json.loads(await request.read())
+            if not isinstance(payload, dict) or "update_id" not in payload:
+                return web.Response(status=400)
+            if self.recorder is not None:
+                self.recorder.record(payload)
+            if self.forward is not None:
+                await self.forward(payload)
+                return web.Response()
+            update = types.Update.de_json(payload)
+        except (ValueError, TypeError, KeyError):
+            return web.Response(status=400)
+
+        if self.dispatcher is not None:
+            await self.dispatcher.submit(update)
+            return web.Response()
+
+        # Не ждём обработчиков: Telegram получает ответ сразу
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: types.Update) -> None:
+        try:
+            await self.bot.process_new_updates([update])
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Failed to process update {update.update_id}: {e}")
+
+    async def _drain(self, app: web.Application = None) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.dispatcher is not None:
+            await self.dispatcher.drain()
+
+    async def start(self, host: str, port: int) -> None:
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        if self.logger:
+            self.logger.info(f"Webhook server listening on {host}:{port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run_webhook(
+    bot: AsyncTeleBot,
+    url: str,
+    secret: str,
+    host: str,
+    port: int,
+    path: str = "/webhook",
+    dispatcher: UpdateDispatcher | None = None,
+    forward: Callable[[dict], Awaitable[None]] | None = None,
+    recorder: UpdateRecorder | None = None,
+    logger: Logger = None,
+) -> None:
+    """
+    Register the webhook with Telegram and serve updates until cancelled.
+    """
+    server = WebhookServer(bot, secret, path=path, dispatcher=dispatcher, forward=forward, recorder=recorder, logger=logger)
+    await server.start(host, port)
+    try:
+        await bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret,
+            allowed_updates=[],
+            drop_pending_updates=True,
+        )
+        await asyncio.Event().wait()
+    finally:
+        try:
+            await bot.remove_webhook()
+        except Exception as e:
+            if logger:
+                logger.error(f"Failed to remove webhook: {e}")
+        await server.stop()